@@ -4,19 +4,27 @@ napari-mobilesam 插件演示脚本
 此脚本演示如何在代码中使用 napari-mobilesam 插件进行图像分割。
 """
 
-# 在导入任何PyTorch相关库之前设置环境变量，禁用MPS后端
 import os
-# 禁用PyTorch MPS后端，以避免段错误
-os.environ["PYTORCH_ENABLE_MPS_FALLBACK"] = "1"  # 强制回退到CPU
-
 import numpy as np
 import napari
 from skimage import data
 from napari_mobilesam import MobileSamWidget
 
+# 解码后的示例图像缓存路径
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "napari-mobilesam", "astronaut.npy")
+
+
+def _cached_demo_image():
+    """首次运行时将解码后的示例图像保存为.npy，之后以内存映射方式加载，跳过PNG解码"""
+    if not os.path.exists(CACHE_PATH):
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        np.save(CACHE_PATH, data.astronaut())
+    return np.load(CACHE_PATH, mmap_mode='r')
+
+
 print("加载示例图像...")
 # 加载示例图像
-image = data.astronaut()
+image = _cached_demo_image()
 
 print("创建napari查看器...")
 # 创建 napari 查看器
@@ -27,8 +35,8 @@ print("添加图像图层...")
 viewer.add_image(image, name='astronaut')
 
 print("创建MobileSAM widget...")
-# 创建 MobileSAM widget
-mobilesam_widget = MobileSamWidget(viewer)
+# 创建 MobileSAM widget，显式使用CPU后端
+mobilesam_widget = MobileSamWidget(viewer, device='cpu')
 
 print("添加widget到viewer...")
 # 将 widget 添加到 viewer
@@ -45,7 +53,7 @@ print("2. 点击 '设置当前图像' 按钮来选择图像")
 print("3. 使用 'Shapes' 图层添加点或矩形标注")
 print("4. 点击 '执行分割预测' 按钮进行预测")
 print("5. 选择最佳掩码，并可以添加到 Labels 图层或保存")
-print("\n注意: 当前使用CPU后端运行，以避免与MPS相关的崩溃问题")
+print("\n注意: 当前使用CPU后端运行，运行 scripts/export_onnx.py 导出模型后将自动使用 ONNX Runtime 加速")
 
 if __name__ == '__main__':
     napari.run() 
\ No newline at end of file
@@ -1,4 +1,5 @@
 import numpy as np
+import pytest
 from napari_mobilesam import MobileSamWidget
 
 
@@ -29,6 +30,10 @@ def test_shapes_to_points():
     assert np.array_equal(points[0], np.array([10, 20]))
     assert np.array_equal(points[1], np.array([30, 40]))
     assert np.array_equal(labels, np.array([1, 1]))
+    
+    # 测试默认标签
+    points, labels = shapes_to_points(shapes, None)
+    assert np.array_equal(labels, np.ones(2))
 
 
 def test_shapes_to_box():
@@ -61,7 +66,14 @@ def test_mask_to_binary():
     
     # 验证结果
     assert binary.shape == (2, 2)
+    assert binary.dtype == np.uint8
     assert np.array_equal(binary, np.array([[0, 1], [1, 0]]))
+    
+    # 测试写入预分配的缓冲区
+    buffer = np.empty((2, 2), dtype=np.uint8)
+    result = mask_to_binary(mask, threshold=0.5, out=buffer)
+    assert result is buffer
+    assert np.array_equal(buffer, np.array([[0, 1], [1, 0]]))
 
 
 def test_generate_unique_name():
@@ -78,4 +90,275 @@ def test_generate_unique_name():
     
     # 测试自定义前缀
     custom_name = generate_unique_name("test")
-    assert custom_name.startswith("test_") 
\ No newline at end of file
+    assert custom_name.startswith("test_") 
+
+def test_paint_label():
+    """测试paint_label函数"""
+    from napari_mobilesam.utils import paint_label
+    
+    # 创建模拟的掩码和标签数据，标签2的旧区域应被清除
+    mask = np.array([[1, 0], [0, 1]], dtype=np.uint8)
+    labels = np.array([[0, 2], [1, 0]], dtype=np.int32)
+    
+    # 测试写入
+    result = paint_label(mask, labels, 2, threshold=0)
+    
+    # 验证结果
+    assert result is labels
+    assert np.array_equal(labels, np.array([[2, 0], [1, 2]]))
+
+
+def test_shape_batch():
+    """测试ShapeBatch结构数组表示"""
+    from napari_mobilesam.utils import ShapeBatch, shapes_to_points, shapes_to_box
+    
+    # 创建模拟的shapes数据
+    shapes = [
+        {'data': np.array([[10, 20]]), 'shape_type': 'point'},
+        {'data': np.array([[10, 10], [10, 20], [20, 20], [20, 10]]), 'shape_type': 'rectangle'},
+        {'data': np.array([[30, 40]]), 'shape_type': 'point'},
+    ]
+    
+    # 测试转换
+    batch = ShapeBatch.from_dicts(shapes)
+    
+    # 验证结果
+    assert len(batch) == 3
+    assert batch.coords.shape == (3, 4, 2)
+    assert np.array_equal(batch.lengths, np.array([1, 4, 1]))
+    assert np.array_equal(batch.kind, np.array([0, 1, 0]))
+    
+    # 结构数组与字典列表的转换结果一致
+    points, labels = shapes_to_points(batch, [1, 0])
+    assert np.array_equal(points, np.array([[10, 20], [30, 40]]))
+    assert np.array_equal(labels, np.array([1, 0]))
+    assert np.array_equal(shapes_to_box(batch), shapes_to_box(shapes))
+
+
+def test_image_hash():
+    """测试image_hash函数"""
+    from napari_mobilesam.utils import image_hash
+    
+    # 创建模拟的图像数据
+    image = np.arange(12, dtype=np.uint8).reshape(3, 4)
+    
+    # 相同数据哈希相同，形状或数值不同时哈希不同
+    assert image_hash(image) == image_hash(image.copy())
+    assert image_hash(image) != image_hash(image.reshape(4, 3))
+    assert image_hash(image) != image_hash(image + 1)
+
+
+def test_normalize_pad():
+    """测试normalize_pad函数"""
+    from napari_mobilesam.utils import normalize_pad
+    
+    # 创建模拟的图像数据和含旧数据的缓冲区
+    image = np.full((2, 3, 3), 110, dtype=np.uint8)
+    mean = np.array([100, 100, 100], dtype=np.float32)
+    std = np.array([10, 5, 2], dtype=np.float32)
+    out = np.full((4, 4, 3), 7, dtype=np.float32)
+    
+    # 测试转换
+    result = normalize_pad(image, mean, std, out)
+    
+    # 验证结果：左上角为归一化值，其余区域为0
+    assert result is out
+    assert np.allclose(out[:2, :3], [1.0, 2.0, 5.0])
+    assert np.all(out[2:] == 0)
+    assert np.all(out[:2, 3:] == 0)
+
+
+def test_read_image(tmp_path):
+    """测试read_image函数"""
+    import cv2
+    from napari_mobilesam.utils import read_image
+    
+    # 创建模拟的RGB图像并以PNG保存（OpenCV按BGR顺序写入）
+    image = np.zeros((4, 5, 3), dtype=np.uint8)
+    image[..., 0] = 255
+    path = str(tmp_path / "红色.png")
+    cv2.imencode(".png", image[..., ::-1])[1].tofile(path)
+    
+    # 验证结果：通道顺序为RGB
+    result = read_image(path)
+    assert result.shape == (4, 5, 3)
+    assert np.array_equal(result, image)
+
+
+def test_save_masks(tmp_path):
+    """测试save_masks函数"""
+    from napari_mobilesam.utils import save_masks, load_mask
+    
+    # 创建模拟的掩码和分数数据，宽度不是8的倍数以覆盖按位打包的填充
+    masks = np.zeros((2, 3, 11))
+    masks[0, :, 9] = 0.9
+    masks[1, 1, :] = 0.7
+    scores = np.array([0.8, 0.6])
+    
+    # 测试保存
+    paths = save_masks(masks, scores, str(tmp_path), image_name="cell.png", base_name="m")
+    
+    # 验证结果
+    assert len(paths) == 2
+    assert paths[0].endswith("cell_m_000.npz")
+    for path, mask in zip(paths, masks):
+        loaded = load_mask(path)
+        assert loaded.dtype == np.uint8
+        assert np.array_equal(loaded, (mask > 0.5).astype(np.uint8))
+
+
+def test_batch_process_masks(tmp_path):
+    """测试batch_process_masks函数"""
+    from napari_mobilesam.utils import batch_process_masks, load_mask
+    
+    masks_list = [np.array([[[0.9, 0.1]]]), np.array([[[0.1, 0.9]], [[0.8, 0.8]]])]
+    scores_list = [np.array([0.5]), np.array([0.7, 0.6])]
+    
+    result = batch_process_masks(masks_list, scores_list, str(tmp_path), image_names=["a.png"])
+    
+    # 未提供名称的图像使用序号作为键
+    assert list(result) == ["a.png", "image_001"]
+    assert len(result["a.png"]) == 1 and len(result["image_001"]) == 2
+    assert np.array_equal(load_mask(result["a.png"][0]), np.array([[1, 0]], dtype=np.uint8))
+    assert np.array_equal(load_mask(result["image_001"][1]), np.array([[1, 1]], dtype=np.uint8))
+
+
+def test_write_json(tmp_path):
+    """测试write_json函数"""
+    import json
+    from napari_mobilesam.utils import write_json
+    
+    # 创建包含中文、整数键和NumPy数值的模拟数据
+    data = {"labels": {1: {"name": "细胞", "color": np.array([0.5, 1.0])}}, "score": np.float32(0.25)}
+    path = tmp_path / "labels.json"
+    
+    # 测试写入
+    write_json(str(path), data)
+    
+    # 验证结果
+    loaded = json.loads(path.read_text(encoding="utf-8"))
+    assert loaded == {"labels": {"1": {"name": "细胞", "color": [0.5, 1.0]}}, "score": 0.25}
+
+
+def test_mask_bbox():
+    """测试mask_bbox函数"""
+    from napari_mobilesam.utils import mask_bbox
+    
+    # 创建模拟的掩码数据
+    mask = np.zeros((5, 6), dtype=np.uint8)
+    mask[1:3, 2:5] = 1
+    
+    # 验证结果
+    bbox = mask_bbox(mask)
+    assert bbox == (slice(1, 3), slice(2, 5))
+    assert np.all(mask[bbox] == 1)
+    assert mask_bbox(np.zeros((5, 6), dtype=np.uint8)) is None
+
+
+def test_read_image_tiff_memmap(tmp_path, monkeypatch):
+    """测试read_image以内存映射方式打开大型TIFF"""
+    tifffile = pytest.importorskip("tifffile")
+    from napari_mobilesam import utils
+    
+    # 创建模拟的RGB图像，并降低内存映射阈值
+    image = np.arange(4 * 5 * 3, dtype=np.uint8).reshape(4, 5, 3)
+    path = str(tmp_path / "stack.tif")
+    tifffile.imwrite(path, image)
+    monkeypatch.setattr(utils, "TIFF_MEMMAP_MIN_BYTES", 0)
+    
+    # 验证结果：返回内存映射数组且数据一致
+    result = utils.read_image(path)
+    assert isinstance(result, np.memmap)
+    assert np.array_equal(result, image)
+
+
+def test_read_image_tiff_stack(tmp_path):
+    """测试read_image读取多页TIFF时保留全部页"""
+    tifffile = pytest.importorskip("tifffile")
+    from napari_mobilesam.utils import read_image
+    
+    # 创建模拟的5页Z栈，小于内存映射阈值
+    stack = np.arange(5 * 64 * 64, dtype=np.uint16).reshape(5, 64, 64)
+    path = str(tmp_path / "stack.tif")
+    tifffile.imwrite(path, stack)
+    
+    # 验证结果：返回完整的栈而不是第一页
+    result = read_image(path)
+    assert result.shape == (5, 64, 64)
+    assert np.array_equal(result, stack)
+
+
+def test_pack_masks():
+    """测试pack_masks和unpack_masks函数"""
+    from napari_mobilesam.utils import pack_masks, unpack_masks
+    
+    # 创建模拟的概率掩码，宽度不是8的倍数
+    rng = np.random.default_rng(0)
+    masks = rng.random((3, 5, 11))
+    
+    # 测试打包
+    packed, shape = pack_masks(masks)
+    assert packed.shape == (3, 5, 2)
+    
+    # 验证结果：解包后与二值化结果一致
+    unpacked = unpack_masks(packed, shape)
+    assert unpacked.dtype == np.bool_
+    assert np.array_equal(unpacked, masks > 0.5)
+
+
+def test_mask_bundle(tmp_path):
+    """测试save_mask_bundle和load_mask_bundle函数"""
+    from napari_mobilesam.utils import save_mask_bundle, load_mask_bundle
+    
+    # 创建模拟的概率掩码和分数，宽度不是8的倍数
+    rng = np.random.default_rng(0)
+    masks = rng.random((3, 6, 13))
+    scores = np.array([0.9, 0.5, 0.25])
+    path = str(tmp_path / "cell_mask.blp")
+    
+    # 测试保存
+    save_mask_bundle(masks, scores, path, names=["a", "b", "c"])
+    
+    # 验证结果：读取后与二值化结果一致
+    loaded, loaded_scores, header = load_mask_bundle(path)
+    assert np.array_equal(loaded, masks > 0.5)
+    assert np.allclose(loaded_scores, scores)
+    assert header["names"] == ["a", "b", "c"]
+
+
+def test_shape_colors():
+    """测试shape_colors函数"""
+    from napari_mobilesam.utils import shape_colors
+    
+    # 创建模拟数据：点、矩形、点、点，最后一个点缺少类型
+    is_point = np.array([True, False, True, True])
+    point_types = np.array([1, 0])
+    
+    # 测试转换
+    face, edge = shape_colors(is_point, point_types)
+    
+    # 验证结果
+    assert face.shape == (4, 4)
+    assert np.allclose(face, [[0, 1, 0, 0.5], [0, 0, 1, 0.3], [1, 0, 0, 0.5], [0, 1, 0, 0.5]])
+    assert np.allclose(edge, [[0, 1, 0, 1.0], [0, 0, 1, 1.0], [1, 0, 0, 1.0], [0, 1, 0, 1.0]])
+
+
+def test_to_rgb_uint8():
+    """测试to_rgb_uint8函数"""
+    from napari_mobilesam.utils import to_rgb_uint8
+    
+    # 灰度图扩展为三通道
+    gray = np.array([[0, 128], [255, 7]], dtype=np.uint8)
+    result = to_rgb_uint8(gray)
+    assert result.shape == (2, 2, 3) and result.dtype == np.uint8
+    assert np.array_equal(result[..., 1], gray)
+    
+    # 0-1范围的浮点RGBA图像缩放到0-255并去掉alpha通道
+    rgba = np.full((2, 2, 4), 0.5, dtype=np.float32)
+    result = to_rgb_uint8(rgba)
+    assert result.shape == (2, 2, 3) and result.flags.c_contiguous
+    assert np.all(result == 127)
+    
+    # 已是连续的RGB uint8图像时直接返回
+    rgb = np.zeros((2, 2, 3), dtype=np.uint8)
+    assert to_rgb_uint8(rgb) is rgb
@@ -1,12 +1,15 @@
 from typing import List, Optional, Dict, Tuple, Any, Union, Callable
 import os
+import logging
 import numpy as np
 import threading
 from pathlib import Path
-import time
-import json
-import colorsys
+import hashlib
+import contextlib
+import bisect
+from collections import OrderedDict
 import cv2
+from skimage.color import hsv2rgb
 
 from qtpy.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, 
@@ -15,46 +18,533 @@ from qtpy.QtWidgets import (
     QRadioButton, QButtonGroup, QToolButton, QDialog, QTextBrowser,
     QGridLayout, QScrollArea
 )
-from qtpy.QtCore import Qt, Signal, Slot
+from qtpy.QtCore import Qt, Signal, Slot, QTimer, QSignalBlocker
 from qtpy.QtGui import QColor
 
 import napari
 from napari.layers import Image, Shapes, Labels
 from napari.utils.notifications import show_info, show_warning, show_error
+from napari.qt.threading import create_worker
 from napari.types import LayerDataTuple
-import torch
 
-from .mobilesam_wrapper import MobileSamWrapper
+from .onnx_wrapper import MobileSamOnnxWrapper, onnx_available, ENCODER_FILENAMES
 from .utils import (
-    shapes_to_points, shapes_to_box, mask_to_binary, 
-    generate_unique_name, save_masks, batch_process_masks
+    shapes_to_points, shapes_to_box, mask_to_binary, paint_label, mask_bbox, ShapeBatch,
+    SHAPE_POINT, SHAPE_RECTANGLE, generate_unique_name, save_masks, batch_process_masks,
+    read_image, write_json, pack_masks, unpack_masks, save_mask_bundle, shape_colors, IS_MAC_ARM64
 )
 
+logger = logging.getLogger(__name__)
+
+def _build_label_color_lut(size: int = 256) -> np.ndarray:
+    """按黄金分割比例的色相序列生成分布均匀的RGBA颜色表"""
+    golden_ratio_conjugate = 0.618033988749895
+    hsv = np.empty((size, 1, 3))
+    hsv[:, 0, 0] = (np.arange(size) * golden_ratio_conjugate) % 1.0
+    # 固定饱和度和明度，只变化色相
+    hsv[:, 0, 1] = 0.8
+    hsv[:, 0, 2] = 0.95
+    lut = np.ones((size, 4))
+    lut[:, :3] = hsv2rgb(hsv)[:, 0]
+    return lut
+
+
+# 标签颜色表，标签ID按低8位直接查表
+_LABEL_COLOR_LUT = _build_label_color_lut()
+
+# 文件夹浏览时预先编码的后续图片数量
+PREFETCH_COUNT = 3
+
+# 已解码图片的LRU缓存容量，覆盖前后相邻图片的来回浏览
+DECODE_CACHE_SIZE = 8
+
+# 文件夹浏览支持的图片格式
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp'})
+
+# 插件界面样式表，匹配napari深色主题，按钮的强调色通过objectName选择
+_STYLE = """
+QWidget {
+    font-family: 'Helvetica Neue', 'Arial', sans-serif;
+    font-size: 12px;
+    color: #f0f0f0;
+    background-color: #2d2d2d;
+}
+QPushButton {
+    background-color: #3d3d3d;
+    border: 1px solid #5d5d5d;
+    border-radius: 4px;
+    padding: 4px 8px;
+    min-height: 24px;
+    color: #f0f0f0;
+    font-weight: medium;
+}
+QPushButton:hover {
+    background-color: #4d4d4d;
+    border: 1px solid #7d7d7d;
+}
+QPushButton:pressed {
+    background-color: #2a2a2a;
+}
+QPushButton:disabled {
+    color: #6d6d6d;
+    background-color: #353535;
+    border: 1px solid #454545;
+}
+QComboBox {
+    border: 1px solid #5d5d5d;
+    border-radius: 4px;
+    padding: 3px 8px;
+    min-height: 24px;
+    background-color: #3d3d3d;
+    color: #f0f0f0;
+    selection-background-color: #00a6ff;
+}
+QComboBox::drop-down {
+    subcontrol-origin: padding;
+    subcontrol-position: top right;
+    width: 20px;
+    border-left: 1px solid #5d5d5d;
+    border-top-right-radius: 4px;
+    border-bottom-right-radius: 4px;
+}
+QComboBox:on {
+    background-color: #404040;
+}
+QComboBox QAbstractItemView {
+    background-color: #3d3d3d;
+    selection-background-color: #00a6ff;
+    selection-color: #ffffff;
+}
+QGroupBox {
+    font-weight: bold;
+    font-size: 12px;
+    border: 1px solid #5d5d5d;
+    border-radius: 6px;
+    margin-top: 14px;
+    padding-top: 8px;
+    background-color: #333333;
+}
+QGroupBox::title {
+    subcontrol-origin: margin;
+    subcontrol-position: top left;
+    left: 10px;
+    top: -7px;
+    padding: 0 5px;
+    background-color: #333333;
+    color: #00a6ff;
+}
+QCheckBox {
+    spacing: 6px;
+    color: #f0f0f0;
+    font-weight: medium;
+}
+QCheckBox::indicator {
+    width: 16px;
+    height: 16px;
+    border-radius: 3px;
+    border: 1px solid #5d5d5d;
+    background-color: #3d3d3d;
+}
+QCheckBox::indicator:checked {
+    background-color: #00a6ff;
+    border: 1px solid #00a6ff;
+}
+QCheckBox::indicator:unchecked:hover {
+    border: 1px solid #00a6ff;
+}
+QLineEdit {
+    border: 1px solid #5d5d5d;
+    border-radius: 4px;
+    padding: 3px 8px;
+    background-color: #3d3d3d;
+    color: #f0f0f0;
+    selection-background-color: #00a6ff;
+}
+QLineEdit:focus {
+    border: 1px solid #00a6ff;
+}
+QProgressBar {
+    border: none;
+    border-radius: 3px;
+    background-color: #3d3d3d;
+    height: 5px;
+    text-align: center;
+}
+QProgressBar::chunk {
+    background-color: #00a6ff;
+    border-radius: 3px;
+}
+QTabWidget::pane {
+    border: 1px solid #5d5d5d;
+    border-radius: 4px;
+    top: -1px;
+    background-color: #2d2d2d;
+}
+QTabBar::tab {
+    background-color: #2d2d2d;
+    border: 1px solid #5d5d5d;
+    border-bottom: none;
+    padding: 5px 10px;
+    margin-right: 2px;
+    border-top-left-radius: 4px;
+    border-top-right-radius: 4px;
+    color: #c0c0c0;
+}
+QTabBar::tab:selected {
+    background-color: #333333;
+    color: #00a6ff;
+    font-weight: bold;
+    border-bottom: none;
+}
+QTabBar::tab:!selected {
+    margin-top: 2px;
+}
+QRadioButton {
+    spacing: 6px;
+    color: #f0f0f0;
+    font-weight: medium;
+}
+QRadioButton::indicator {
+    width: 16px;
+    height: 16px;
+    border-radius: 8px;
+    border: 1px solid #5d5d5d;
+    background-color: #3d3d3d;
+}
+QRadioButton::indicator:checked {
+    background-color: #00a6ff;
+    border: 1px solid #00a6ff;
+    width: 10px;
+    height: 10px;
+    margin: 3px;
+}
+QRadioButton::indicator:unchecked:hover {
+    border: 1px solid #00a6ff;
+}
+QLabel {
+    color: #f0f0f0;
+}
+QLabel[labelType="heading"] {
+    font-weight: bold;
+    font-size: 12px;
+    color: #00a6ff;
+}
+QLabel[labelType="info"] {
+    color: #a0a0a0;
+    font-size: 11px;
+}
+QLabel[labelType="highlight"] {
+    color: #00a6ff;
+    font-weight: bold;
+}
+QLabel[labelType="value"] {
+    color: #ffffff;
+    font-weight: bold;
+    background-color: #3d3d3d;
+    border-radius: 3px;
+    padding: 2px 6px;
+}
+QToolButton {
+    background-color: #3d3d3d;
+    border: 1px solid #5d5d5d;
+    border-radius: 4px;
+    padding: 3px;
+}
+QToolButton:hover {
+    background-color: #4d4d4d;
+    border: 1px solid #00a6ff;
+}
+QSpinBox, QDoubleSpinBox {
+    border: 1px solid #5d5d5d;
+    border-radius: 4px;
+    padding: 3px;
+    background-color: #3d3d3d;
+    color: #f0f0f0;
+}
+QSpinBox::up-button, QDoubleSpinBox::up-button,
+QSpinBox::down-button, QDoubleSpinBox::down-button {
+    background-color: #3d3d3d;
+    width: 16px;
+    border-left: 1px solid #5d5d5d;
+}
+QSpinBox::up-button:hover, QDoubleSpinBox::up-button:hover,
+QSpinBox::down-button:hover, QDoubleSpinBox::down-button:hover {
+    background-color: #4d4d4d;
+}
+QPushButton#predict_btn {
+    background-color: #00a6ff;
+    color: white;
+    font-weight: medium;
+    border: none;
+    border-radius: 4px;
+    padding: 4px 10px;
+    min-height: 24px;
+}
+QPushButton#predict_btn:hover {
+    background-color: #0088cc;
+}
+QPushButton#predict_btn:pressed {
+    background-color: #0077b3;
+}
+QPushButton#predict_btn:disabled {
+    background-color: #5a5a5a;
+    color: #a0a0a0;
+}
+QPushButton#add_to_labels_btn {
+    background-color: #4caf50;
+    color: white;
+    font-weight: medium;
+    border: none;
+    border-radius: 4px;
+    padding: 4px 8px;
+}
+QPushButton#add_to_labels_btn:hover {
+    background-color: #43a047;
+}
+QPushButton#add_to_labels_btn:pressed {
+    background-color: #388e3c;
+}
+QPushButton#add_to_labels_btn:disabled {
+    background-color: #5a5a5a;
+    color: #a0a0a0;
+}
+QPushButton#clear_labels_btn {
+    background-color: #f44336;
+    color: white;
+    font-weight: medium;
+    border: none;
+    border-radius: 4px;
+    padding: 4px 8px;
+}
+QPushButton#clear_labels_btn:hover {
+    background-color: #e53935;
+}
+QPushButton#clear_labels_btn:pressed {
+    background-color: #d32f2f;
+}
+QPushButton#clear_labels_btn:disabled {
+    background-color: #5a5a5a;
+    color: #a0a0a0;
+}
+QPushButton#set_image_btn {
+    background-color: #00a6ff;
+    color: white;
+    font-weight: medium;
+    border: none;
+    border-radius: 4px;
+    padding: 4px 8px;
+}
+QPushButton#set_image_btn:hover {
+    background-color: #0088cc;
+}
+QPushButton#set_image_btn:pressed {
+    background-color: #0077b3;
+}
+QPushButton#set_image_btn:disabled {
+    background-color: #5a5a5a;
+    color: #a0a0a0;
+}
+"""
+
+# 点类型状态标签的样式表，切换点类型时直接复用
+_POINT_TYPE_FG_STYLE = """
+    color: #4caf50;  /* 绿色 */
+    font-weight: medium;
+    font-size: 12px;
+    background-color: #3d3d3d;
+    border-radius: 3px;
+    padding: 3px 6px;
+"""
+_POINT_TYPE_BG_STYLE = """
+    color: #f44336;  /* 红色 */
+    font-weight: medium;
+    font-size: 12px;
+    background-color: #3d3d3d;
+    border-radius: 3px;
+    padding: 3px 6px;
+"""
+
+# 点大小标签的样式表
+_POINT_SIZE_STYLE = """
+    font-weight: medium;
+    font-size: 12px;
+    color: #ffffff;
+    background-color: #00a6ff;
+    border-radius: 3px;
+    padding: 2px 5px;
+"""
+
+# 多掩码说明对话框的样式表和内容
+_MULTIMASK_HELP_STYLE = """
+QDialog {
+    background-color: #f2f2f7;
+    border-radius: 14px;
+}
+QLabel {
+    color: #000000;
+    font-weight: 600;
+    font-size: 16px;
+}
+QTextBrowser {
+    background-color: #ffffff;
+    border: none;
+    border-radius: 10px;
+    padding: 8px;
+    font-family: 'SF Pro Display', '-apple-system', 'Helvetica Neue', sans-serif;
+    font-size: 14px;
+}
+QPushButton {
+    background-color: #007aff;
+    color: white;
+    border: none;
+    border-radius: 10px;
+    padding: 8px 20px;
+    font-weight: 600;
+    min-height: 36px;
+}
+QPushButton:hover {
+    background-color: #0062cc;
+}
+"""
+_MULTIMASK_HELP_HTML = """
+<style>
+    body {
+        font-family: 'SF Pro Display', '-apple-system', 'Helvetica Neue', sans-serif;
+        line-height: 1.5;
+        color: #000000;
+    }
+    h3 {
+        color: #007aff;
+        font-weight: 600;
+        margin-top: 16px;
+        margin-bottom: 8px;
+    }
+    p {
+        margin: 8px 0;
+    }
+    ul, ol {
+        margin-top: 8px;
+        margin-bottom: 8px;
+    }
+    li {
+        margin-bottom: 4px;
+    }
+    a {
+        color: #007aff;
+        text-decoration: none;
+    }
+</style>
+
+<h3>多掩码生成机制</h3>
+<p>当启用"生成多个掩码候选"选项时，MobileSAM会为每个标注生成多个可能的掩码，这是通过在模型内部使用不同的解码器参数实现的。主要的多掩码生成过程包括：</p>
+<ol>
+    <li><b>潜在掩码解码</b>：模型内部会从图像编码和提示编码中生成一组潜在掩码表示</li>
+    <li><b>多重阈值解码</b>：使用不同的稳定性阈值对潜在掩码进行解码，产生多个候选掩码</li>
+    <li><b>多级IoU预测</b>：针对每个候选掩码，预测其与真实掩码的IoU（交并比）得分</li>
+</ol>
+
+<h3>得分依据</h3>
+<p>掩码得分是模型内部的预测质量指标，主要反映这个掩码与"正确掩码"的匹配程度。得分越高表示模型对这个掩码的预测越有信心。具体而言：</p>
+<ul>
+    <li><b>IoU预测值</b>：是模型预测的掩码与真实掩码可能的交并比。范围为0-1，越接近1表示质量越高</li>
+    <li><b>稳定性得分</b>：评估掩码在轻微的阈值变化下的稳定性</li>
+    <li><b>与提示的一致性</b>：评估掩码与用户输入的点或框的一致程度</li>
+</ul>
+
+<h3>选择掩码的建议</h3>
+<p>虽然系统默认选择得分最高的掩码，但您也可以：</p>
+<ul>
+    <li>通过下拉菜单查看所有候选掩码</li>
+    <li>选择更符合您预期的掩码，即使其得分不是最高</li>
+    <li>如果最高得分的掩码不令人满意，可以添加更多的标注点（特别是负点/背景点）来优化结果</li>
+</ul>
+
+<p>参考：<a href="https://github.com/ChaoningZhang/MobileSAM">MobileSAM 项目</a> | <a href="https://arxiv.org/abs/2304.02643">Segment Anything 论文</a></p>
+"""
+
+
+@contextlib.contextmanager
+def _signals_blocked(*objects):
+    """在一组Qt对象上屏蔽信号，退出时恢复，避免批量更新逐个触发处理函数"""
+    blockers = [QSignalBlocker(obj) for obj in objects]
+    try:
+        yield
+    finally:
+        for blocker in blockers:
+            blocker.unblock()
+
+
+# 滚轮调整点大小的节流间隔（毫秒），间隔内的滚动累积后一次应用
+WHEEL_THROTTLE_MS = 16
+
+# 空格键预测的节流间隔（毫秒），间隔内的重复按键被忽略
+PREDICT_KEY_THROTTLE_MS = 300
+
+# 自动预测的防抖延迟（毫秒），标注停止变化这么久后才执行预测
+AUTO_PREDICT_DELAY_POINTS_MS = 100
+AUTO_PREDICT_DELAY_BOX_MS = 1000
+
+# 点类型特征更新的防抖延迟（毫秒），连续的数据变化合并为一次更新
+SHAPE_FEATURE_DELAY_MS = 30
+
+# 批处理队列每处理这么多项更新一次进度条
+QUEUE_PROGRESS_STEP = 4
+
+# 按提示缓存的预测结果数量，每条包含原图大小的掩码，因此保持较小
+PREDICT_CACHE_SIZE = 8
+
+# 交互式推理的CUDA缓存分配器配置，减少小块分配造成的显存碎片，需在首次使用CUDA前设置
+CUDA_ALLOC_CONF = "expandable_segments:True,roundup_power2_divisions:4,max_split_size_mb:128"
+
+# 优化显存时PyTorch可使用的显存比例，为napari渲染保留余量
+CUDA_MEMORY_FRACTION = 0.85
+
 class MobileSamWidget(QWidget):
     """MobileSAM napari插件小部件"""
     
+    # 调整掩码边界使用的3x3结构元素
+    _morph_kernel = np.ones((3, 3), np.uint8)
+    
     # 信号定义
-    progress_signal = Signal(int)
-    finished_signal = Signal()
-    error_signal = Signal(str)
     point_type_changed_signal = Signal(int)  # 添加点击类型变更信号
     
-    def __init__(self, napari_viewer):
+    def __init__(self, napari_viewer, device=None):
+        """
+        参数:
+            napari_viewer: napari查看器
+            device: 推理设备，可选值: "cpu", "cuda", "mps"，若为None则使用界面默认选择
+        """
         super().__init__()
         self.viewer = napari_viewer
         
         # 初始化模型
         self.model = None
-        self.model_thread = None
+        self.model_worker = None  # 后台加载模型的线程
         self.model_loaded = False
+        self.image_worker = None  # 后台计算图像嵌入的线程
+        self.predict_worker = None  # 后台执行掩码预测的线程
+        self._latest_prompt = None  # 预测期间最新的提示，完成后只预测这一次
+        self._predict_cache = {}  # 提示哈希到预测结果的映射，设置新图像时清空
+        self._annot_layer = None  # 缓存的"标注"Shapes图层，图层增删或改名时更新
+        self._labels_layer = None  # 缓存的"分割标签"Labels图层，图层增删或改名时更新
+        self._pending_image_layer = None  # 编码期间再次设置的图像图层
+        self._prefetch_index = None  # 待预编码后续图片的文件夹索引
+        self._decoded_images = OrderedDict()  # 已解码图片的LRU缓存，路径到图像数组的映射
+        self.decode_worker = None  # 后台解码图片的线程
         
         # 初始化变量
         self.current_image = None
         self.current_layer = None
+        self.current_scale = None  # 多尺度图像编码层级相对图层的缩放，None表示原尺度
         self.prediction_mode = "点标注"  # 默认为点标注模式
-        self.result_masks = []
-        self.result_scores = []
+        self.result_masks = np.empty((0, 0, 0), dtype=np.bool_)  # 候选掩码，形状为(K,H,W)的连续数组
+        self.result_scores = np.empty(0, dtype=np.float32)
         self.selected_mask_idx = 0
+        self._displayed_mask_key = None  # 当前显示的(结果数组id, 掩码索引)，重复选择时跳过重绘
+        self._binary_buf = None  # 二值掩码缓冲区，形状不变时复用
+        self._morph_buf = None  # 边界调整结果缓冲区，形状不变时复用
+        self._last_prompt_key = None  # 缓存的标注数据对应的图层和形状数量
+        self._last_prompt = None  # 缓存的ShapeBatch，图层数据变化时失效
         
         # 文件夹导入相关变量
         self.image_folder_path = ""
@@ -69,17 +559,53 @@ class MobileSamWidget(QWidget):
         # 点大小设置
         self.point_size = 10
         
-        # 批处理相关变量
-        self.processing_queue = []
+        # 批处理相关变量，界面线程追加，后台线程整体取走
+        self._queue_lock = threading.Lock()
+        self._queue = []
+        self.queue_worker = None
+        
+        # 滚轮事件节流，累积的点大小变化由定时器统一应用
+        self._pending_wheel_delta = 0
+        self._wheel_timer = QTimer(self)
+        self._wheel_timer.setSingleShot(True)
+        self._wheel_timer.setInterval(WHEEL_THROTTLE_MS)
+        self._wheel_timer.timeout.connect(self._flush_wheel)
+        
+        # 空格键预测节流，计时期间的按键直接忽略
+        self._predict_key_timer = QTimer(self)
+        self._predict_key_timer.setSingleShot(True)
+        self._predict_key_timer.setInterval(PREDICT_KEY_THROTTLE_MS)
+        
+        # 自动预测防抖，每次标注变化重新计时，只有最后一次变化后执行预测
+        self._predict_layer = None
+        self._predict_timer = QTimer(self)
+        self._predict_timer.setSingleShot(True)
+        self._predict_timer.timeout.connect(self._delayed_prediction)
+        
+        # 点类型特征更新防抖，连续添加点时只在最后一次变化后统计一次
+        self._feature_layer = None
+        self._feature_timer = QTimer(self)
+        self._feature_timer.setSingleShot(True)
+        self._feature_timer.setInterval(SHAPE_FEATURE_DELAY_MS)
+        self._feature_timer.timeout.connect(self._flush_feature_update)
         
         # 添加标签管理相关变量
         self.label_names = {}  # 标签ID到名称的映射
         self.label_colors = {}  # 标签ID到颜色的映射
         self.next_label_id = 1  # 下一个可用的标签ID
+        self._label_name_index = []  # 标签名称下拉框前部已排序的名称
+        
+        # 多掩码说明对话框，首次打开时创建
+        self._help_dialog = None
         
         # 初始化UI
         self._init_ui()
         
+        # 应用指定的推理设备
+        if device is not None:
+            device_names = {"cpu": "CPU", "mps": "MPS", "cuda": "CUDA"}
+            self.device_combo.setCurrentText(device_names.get(device, "自动"))
+        
         # 连接信号
         self._connect_signals()
         
@@ -91,217 +617,8 @@ class MobileSamWidget(QWidget):
     
     def _init_ui(self):
         """初始化用户界面，使用与napari匹配的深色主题风格"""
-        # 设置全局样式 - 匹配napari深色主题
-        self.setStyleSheet("""
-            QWidget {
-                font-family: 'Helvetica Neue', 'Arial', sans-serif;
-                font-size: 12px;
-                color: #f0f0f0;
-                background-color: #2d2d2d;
-            }
-            QPushButton {
-                background-color: #3d3d3d;
-                border: 1px solid #5d5d5d;
-                border-radius: 4px;
-                padding: 4px 8px;
-                min-height: 24px;
-                color: #f0f0f0;
-                font-weight: medium;
-            }
-            QPushButton:hover {
-                background-color: #4d4d4d;
-                border: 1px solid #7d7d7d;
-            }
-            QPushButton:pressed {
-                background-color: #2a2a2a;
-            }
-            QPushButton:disabled {
-                color: #6d6d6d;
-                background-color: #353535;
-                border: 1px solid #454545;
-            }
-            QComboBox {
-                border: 1px solid #5d5d5d;
-                border-radius: 4px;
-                padding: 3px 8px;
-                min-height: 24px;
-                background-color: #3d3d3d;
-                color: #f0f0f0;
-                selection-background-color: #00a6ff;
-            }
-            QComboBox::drop-down {
-                subcontrol-origin: padding;
-                subcontrol-position: top right;
-                width: 20px;
-                border-left: 1px solid #5d5d5d;
-                border-top-right-radius: 4px;
-                border-bottom-right-radius: 4px;
-            }
-            QComboBox:on {
-                background-color: #404040;
-            }
-            QComboBox QAbstractItemView {
-                background-color: #3d3d3d;
-                selection-background-color: #00a6ff;
-                selection-color: #ffffff;
-            }
-            QGroupBox {
-                font-weight: bold;
-                font-size: 12px;
-                border: 1px solid #5d5d5d;
-                border-radius: 6px;
-                margin-top: 14px;
-                padding-top: 8px;
-                background-color: #333333;
-            }
-            QGroupBox::title {
-                subcontrol-origin: margin;
-                subcontrol-position: top left;
-                left: 10px;
-                top: -7px;
-                padding: 0 5px;
-                background-color: #333333;
-                color: #00a6ff;
-            }
-            QCheckBox {
-                spacing: 6px;
-                color: #f0f0f0;
-                font-weight: medium;
-            }
-            QCheckBox::indicator {
-                width: 16px;
-                height: 16px;
-                border-radius: 3px;
-                border: 1px solid #5d5d5d;
-                background-color: #3d3d3d;
-            }
-            QCheckBox::indicator:checked {
-                background-color: #00a6ff;
-                border: 1px solid #00a6ff;
-            }
-            QCheckBox::indicator:unchecked:hover {
-                border: 1px solid #00a6ff;
-            }
-            QLineEdit {
-                border: 1px solid #5d5d5d;
-                border-radius: 4px;
-                padding: 3px 8px;
-                background-color: #3d3d3d;
-                color: #f0f0f0;
-                selection-background-color: #00a6ff;
-            }
-            QLineEdit:focus {
-                border: 1px solid #00a6ff;
-            }
-            QProgressBar {
-                border: none;
-                border-radius: 3px;
-                background-color: #3d3d3d;
-                height: 5px;
-                text-align: center;
-            }
-            QProgressBar::chunk {
-                background-color: #00a6ff;
-                border-radius: 3px;
-            }
-            QTabWidget::pane {
-                border: 1px solid #5d5d5d;
-                border-radius: 4px;
-                top: -1px;
-                background-color: #2d2d2d;
-            }
-            QTabBar::tab {
-                background-color: #2d2d2d;
-                border: 1px solid #5d5d5d;
-                border-bottom: none;
-                padding: 5px 10px;
-                margin-right: 2px;
-                border-top-left-radius: 4px;
-                border-top-right-radius: 4px;
-                color: #c0c0c0;
-            }
-            QTabBar::tab:selected {
-                background-color: #333333;
-                color: #00a6ff;
-                font-weight: bold;
-                border-bottom: none;
-            }
-            QTabBar::tab:!selected {
-                margin-top: 2px;
-            }
-            QRadioButton {
-                spacing: 6px;
-                color: #f0f0f0;
-                font-weight: medium;
-            }
-            QRadioButton::indicator {
-                width: 16px;
-                height: 16px;
-                border-radius: 8px;
-                border: 1px solid #5d5d5d;
-                background-color: #3d3d3d;
-            }
-            QRadioButton::indicator:checked {
-                background-color: #00a6ff;
-                border: 1px solid #00a6ff;
-                width: 10px;
-                height: 10px;
-                margin: 3px;
-            }
-            QRadioButton::indicator:unchecked:hover {
-                border: 1px solid #00a6ff;
-            }
-            QLabel {
-                color: #f0f0f0;
-            }
-            QLabel[labelType="heading"] {
-                font-weight: bold;
-                font-size: 12px;
-                color: #00a6ff;
-            }
-            QLabel[labelType="info"] {
-                color: #a0a0a0;
-                font-size: 11px;
-            }
-            QLabel[labelType="highlight"] {
-                color: #00a6ff;
-                font-weight: bold;
-            }
-            QLabel[labelType="value"] {
-                color: #ffffff;
-                font-weight: bold;
-                background-color: #3d3d3d;
-                border-radius: 3px;
-                padding: 2px 6px;
-            }
-            QToolButton {
-                background-color: #3d3d3d;
-                border: 1px solid #5d5d5d;
-                border-radius: 4px;
-                padding: 3px;
-            }
-            QToolButton:hover {
-                background-color: #4d4d4d;
-                border: 1px solid #00a6ff;
-            }
-            QSpinBox, QDoubleSpinBox {
-                border: 1px solid #5d5d5d;
-                border-radius: 4px;
-                padding: 3px;
-                background-color: #3d3d3d;
-                color: #f0f0f0;
-            }
-            QSpinBox::up-button, QDoubleSpinBox::up-button,
-            QSpinBox::down-button, QDoubleSpinBox::down-button {
-                background-color: #3d3d3d;
-                width: 16px;
-                border-left: 1px solid #5d5d5d;
-            }
-            QSpinBox::up-button:hover, QDoubleSpinBox::up-button:hover,
-            QSpinBox::down-button:hover, QDoubleSpinBox::down-button:hover {
-                background-color: #4d4d4d;
-            }
-        """)
+        # 设置全局样式 - 匹配napari深色主题，样式表只在模块导入时构建一次
+        self.setStyleSheet(_STYLE)
         
         # 主布局设置
         layout = QVBoxLayout()
@@ -344,8 +661,25 @@ class MobileSamWidget(QWidget):
         # 设置默认选择为CPU，避免在Mac上使用MPS导致崩溃
         self.device_combo.setCurrentText("CPU")
         device_layout.addWidget(self.device_combo)
+        
+        # 添加精度选择下拉框
+        precision_label = QLabel("精度:")
+        device_layout.addWidget(precision_label)
+        
+        self.precision_combo = QComboBox()
+        self.precision_combo.addItems(["自动", "FP32", "FP16", "BF16"])
+        self.precision_combo.setToolTip("图像编码器的计算精度，CUDA上默认使用FP16，出现异常时可切换为FP32")
+        device_layout.addWidget(self.precision_combo)
         model_layout.addLayout(device_layout)
         
+        # 显存优化选项
+        self.optimize_memory_check = QCheckBox("优化显存")
+        self.optimize_memory_check.setChecked(True)
+        self.optimize_memory_check.setToolTip(
+            "CUDA上减少显存碎片并限制PyTorch显存占用，需在首次使用CUDA前启用才能生效"
+        )
+        model_layout.addWidget(self.optimize_memory_check)
+        
         # 进度条和按钮
         progress_layout = QHBoxLayout()
         progress_layout.setSpacing(8)
@@ -419,6 +753,7 @@ class MobileSamWidget(QWidget):
         self.refresh_image_btn.setFixedWidth(70)
         
         self.set_image_btn = QPushButton("设置")
+        self.set_image_btn.setObjectName("set_image_btn")  # 样式表中的强调色按钮
         self.set_image_btn.setFixedWidth(70)
         
         image_nav_layout.addLayout(nav_layout)
@@ -482,14 +817,7 @@ class MobileSamWidget(QWidget):
         size_label = QLabel("点大小:")
         
         self.point_size_value = QLabel(f"{self.point_size}")
-        self.point_size_value.setStyleSheet("""
-            font-weight: medium;
-            font-size: 12px;
-            color: #ffffff;
-            background-color: #00a6ff;
-            border-radius: 3px;
-            padding: 2px 5px;
-        """)  # 使用蓝色背景
+        self.point_size_value.setStyleSheet(_POINT_SIZE_STYLE)  # 使用蓝色背景
         
         ctrl_scroll_label = QLabel("(Ctrl+滚轮)")
         ctrl_scroll_label.setStyleSheet("color: #a0a0a0; font-size: 12px;")  # 浅灰色
@@ -519,6 +847,7 @@ class MobileSamWidget(QWidget):
         
         self.multimask_check = QCheckBox("多掩码候选")
         self.multimask_check.setChecked(True)
+        self.multimask_check.setToolTip("输出3个候选掩码；取消勾选时只输出单个掩码，放大和拷回的数据更少，预测更快")
         
         self.multimask_help_btn = QToolButton()
         self.multimask_help_btn.setText("?")
@@ -530,6 +859,7 @@ class MobileSamWidget(QWidget):
         
         # 预测按钮
         self.predict_btn = QPushButton("执行预测")
+        self.predict_btn.setObjectName("predict_btn")  # 样式表中的强调色按钮
         self.predict_btn.setEnabled(False)  # 初始禁用
         
         mask_predict_layout.addLayout(multimask_layout)
@@ -621,6 +951,7 @@ class MobileSamWidget(QWidget):
         add_save_layout.setColumnStretch(1, 1)
         
         self.add_to_labels_btn = QPushButton("添加到标签")
+        self.add_to_labels_btn.setObjectName("add_to_labels_btn")  # 样式表中的强调色按钮
         self.add_to_labels_btn.setEnabled(False)
         
         self.save_current_btn = QPushButton("保存掩码")
@@ -643,6 +974,7 @@ class MobileSamWidget(QWidget):
         self.export_labels_btn.setEnabled(False)
         
         self.clear_labels_btn = QPushButton("清除标签")
+        self.clear_labels_btn.setObjectName("clear_labels_btn")  # 样式表中的强调色按钮
         self.clear_labels_btn.setEnabled(False)
         
         label_manage_layout.addWidget(self.export_labels_btn)
@@ -720,8 +1052,13 @@ class MobileSamWidget(QWidget):
         self.auto_naming_check = QCheckBox("使用图像名称")
         self.auto_naming_check.setChecked(True)
         
+        # 保存所有掩码时打包为单个压缩文件
+        self.bundle_export_check = QCheckBox("打包导出 (.blp)")
+        self.bundle_export_check.setToolTip("保存所有掩码时按位打包压缩为单个.blp文件")
+        
         prefix_auto_layout.addLayout(prefix_layout)
         prefix_auto_layout.addWidget(self.auto_naming_check)
+        prefix_auto_layout.addWidget(self.bundle_export_check)
         
         batch_setting_layout.addLayout(prefix_auto_layout)
         
@@ -767,97 +1104,6 @@ class MobileSamWidget(QWidget):
         layout.addWidget(tabs)
         self.setLayout(layout)
         
-        # 将关键功能按钮添加特殊样式
-        
-        # 执行预测按钮 - 使用强调色
-        self.predict_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #00a6ff;
-                color: white;
-                font-weight: medium;
-                border: none;
-                border-radius: 4px;
-                padding: 4px 10px;
-                min-height: 24px;
-            }
-            QPushButton:hover {
-                background-color: #0088cc;
-            }
-            QPushButton:pressed {
-                background-color: #0077b3;
-            }
-            QPushButton:disabled {
-                background-color: #5a5a5a;
-                color: #a0a0a0;
-            }
-        """)
-        
-        # 添加到标签按钮 - 使用绿色
-        self.add_to_labels_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #4caf50;
-                color: white;
-                font-weight: medium;
-                border: none;
-                border-radius: 4px;
-                padding: 4px 8px;
-            }
-            QPushButton:hover {
-                background-color: #43a047;
-            }
-            QPushButton:pressed {
-                background-color: #388e3c;
-            }
-            QPushButton:disabled {
-                background-color: #5a5a5a;
-                color: #a0a0a0;
-            }
-        """)
-        
-        # 清除标签按钮 - 使用红色
-        self.clear_labels_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #f44336;
-                color: white;
-                font-weight: medium;
-                border: none;
-                border-radius: 4px;
-                padding: 4px 8px;
-            }
-            QPushButton:hover {
-                background-color: #e53935;
-            }
-            QPushButton:pressed {
-                background-color: #d32f2f;
-            }
-            QPushButton:disabled {
-                background-color: #5a5a5a;
-                color: #a0a0a0;
-            }
-        """)
-        
-        # 设置图像按钮 - 使用强调色
-        self.set_image_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #00a6ff;
-                color: white;
-                font-weight: medium;
-                border: none;
-                border-radius: 4px;
-                padding: 4px 8px;
-            }
-            QPushButton:hover {
-                background-color: #0088cc;
-            }
-            QPushButton:pressed {
-                background-color: #0077b3;
-            }
-            QPushButton:disabled {
-                background-color: #5a5a5a;
-                color: #a0a0a0;
-            }
-        """)
-        
         # 状态栏显示快捷键信息
         self.viewer.status = "快捷键: [Shift+点击]背景点 | [点击]前景点 | [空格]预测 | [F/B]切换前景/背景 | [Ctrl+滚轮]调整点大小"
     
@@ -896,14 +1142,12 @@ class MobileSamWidget(QWidget):
         self.add_to_queue_btn.clicked.connect(self._add_to_queue)
         self.process_queue_btn.clicked.connect(self._process_queue)
         
-        # 异步信号
-        self.progress_signal.connect(self._update_progress)
-        self.finished_signal.connect(self._model_loading_finished)
-        self.error_signal.connect(self._handle_error)
-        
         # Viewer事件
         self.viewer.layers.events.inserted.connect(self._on_layer_change)
         self.viewer.layers.events.removed.connect(self._on_layer_change)
+        for layer in self.viewer.layers:
+            layer.events.name.connect(self._resolve_plugin_layers)
+        self._resolve_plugin_layers()
         
         # 监听Shapes图层的变化，用于自动预测
         self._connect_shapes_layer_events()
@@ -921,7 +1165,7 @@ class MobileSamWidget(QWidget):
             # 添加快捷键，使用try-except避免版本兼容性问题
             try:
                 # 添加空格键作为预测快捷键
-                self.viewer.bind_key(" ", self._run_prediction)
+                self.viewer.bind_key(" ", self._on_predict_key)
                 
                 # 添加F和B键作为前景点和背景点快捷键
                 self.viewer.bind_key("f", self._set_positive_point)
@@ -964,32 +1208,13 @@ class MobileSamWidget(QWidget):
                 elif hasattr(event, 'delta') and not isinstance(event.delta, (list, tuple)):
                     delta = event.delta
                 
-                # 根据滚轮方向调整点大小
-                if delta > 0:  # 向上滚动，增大点
-                    self.point_size = min(50, self.point_size + 2)
-                else:  # 向下滚动，减小点
-                    self.point_size = max(1, self.point_size - 2)
+                # 根据滚轮方向累积点大小变化，向上滚动增大点，向下滚动减小点
+                self._pending_wheel_delta += 2 if delta > 0 else -2
                 
-                # 更新点大小显示
-                self.point_size_value.setText(f"{self.point_size}")
-                self.point_size_value.setStyleSheet(f"""
-                    font-weight: medium;
-                    font-size: 12px;
-                    color: #ffffff;
-                    background-color: #00a6ff;
-                    border-radius: 3px;
-                    padding: 2px 5px;
-                """)
-                
-                # 找到shapes图层并应用新的点大小
-                for layer in self.viewer.layers:
-                    if isinstance(layer, Shapes) and layer.name == "标注":
-                        layer.size = self.point_size
-                        layer.refresh()
-                        break
-                
-                # 在状态栏显示点大小
-                self.viewer.status = f"点大小已调整为: {self.point_size}"
+                # 首次滚动立即应用，之后每个节流间隔最多应用一次
+                if not self._wheel_timer.isActive():
+                    self._flush_wheel()
+                    self._wheel_timer.start()
                 
                 # 标记事件已处理
                 if hasattr(event, 'handled'):
@@ -999,19 +1224,51 @@ class MobileSamWidget(QWidget):
             show_warning(f"处理鼠标滚轮事件失败: {str(e)}")
         return False
     
+    def _flush_wheel(self):
+        """应用累积的滚轮点大小变化，并只刷新一次界面和标注图层"""
+        if self._pending_wheel_delta == 0:
+            return
+        self.point_size = int(np.clip(self.point_size + self._pending_wheel_delta, 1, 50))
+        self._pending_wheel_delta = 0
+        
+        # 更新点大小显示，样式创建时已设置，只需更新文本
+        self.point_size_value.setText(f"{self.point_size}")
+        
+        # 应用新的点大小到标注图层
+        layer = self._annot_layer
+        if layer is not None:
+            layer.size = self.point_size
+            layer.refresh()
+        
+        # 在状态栏显示点大小
+        self.viewer.status = f"点大小已调整为: {self.point_size}"
+    
+    def _on_predict_key(self, viewer=None):
+        """空格键触发预测，节流间隔内的重复按键只预测一次"""
+        if self._predict_key_timer.isActive():
+            return
+        self._predict_key_timer.start()
+        self._run_prediction()
+    
     def _on_key_press(self, event):
         """处理键盘按下事件"""
         try:
+            # 按住按键时系统产生的自动重复事件不重复处理
+            native = getattr(event, 'native', None)
+            if native is not None and hasattr(native, 'isAutoRepeat') and native.isAutoRepeat():
+                return
+            
             # 尝试获取按键，兼容不同版本的事件格式
             key = None
             if hasattr(event, 'key'):
                 key = event.key
             
-            # 检测Shift键
+            # 检测Shift键，已按下时不重复切换
             if key == "Shift":
-                self.shift_pressed = True
-                self.point_type = 0  # 切换为背景点
-                self.point_type_changed_signal.emit(0)
+                if not self.shift_pressed:
+                    self.shift_pressed = True
+                    self.point_type = 0  # 切换为背景点
+                    self.point_type_changed_signal.emit(0)
             
             # 检测Ctrl键
             elif key in ["Control", "Meta"]:  # 兼容Mac的Command键
@@ -1022,16 +1279,22 @@ class MobileSamWidget(QWidget):
     def _on_key_release(self, event):
         """处理键盘释放事件"""
         try:
+            # Linux上按住按键会产生成对的自动重复按下/释放事件，同样忽略
+            native = getattr(event, 'native', None)
+            if native is not None and hasattr(native, 'isAutoRepeat') and native.isAutoRepeat():
+                return
+            
             # 尝试获取按键，兼容不同版本的事件格式
             key = None
             if hasattr(event, 'key'):
                 key = event.key
             
-            # 检测Shift键释放
+            # 检测Shift键释放，只有按下过才切换回前景点
             if key == "Shift":
-                self.shift_pressed = False
-                self.point_type = 1  # 切换回前景点
-                self.point_type_changed_signal.emit(1)
+                if self.shift_pressed:
+                    self.shift_pressed = False
+                    self.point_type = 1  # 切换回前景点
+                    self.point_type_changed_signal.emit(1)
             
             # 检测Ctrl键释放
             elif key in ["Control", "Meta"]:  # 兼容Mac的Command键
@@ -1040,145 +1303,169 @@ class MobileSamWidget(QWidget):
             pass  # 静默处理按键错误
     
     def _update_point_type_display(self, point_type):
-        """更新点类型显示"""
-        if point_type == 1:
-            self.point_type_status.setText("前景点")
-            self.point_type_status.setStyleSheet("""
-                color: #4caf50;  /* 绿色 */
-                font-weight: medium;
-                font-size: 12px;
-                background-color: #3d3d3d;
-                border-radius: 3px;
-                padding: 3px 6px;
-            """)
-            self.positive_point_radio.setChecked(True)
-            
-            # 在状态栏显示当前模式
-            self.viewer.status = "前景点标注模式 | 按Shift切换到背景点 | F/B键快速切换"
-            
-            # 显示提示
-            if hasattr(self, '_last_point_type') and self._last_point_type != point_type:
-                show_info("已切换到前景点模式")
-        else:
-            self.point_type_status.setText("背景点")
-            self.point_type_status.setStyleSheet("""
-                color: #f44336;  /* 红色 */
-                font-weight: medium;
-                font-size: 12px;
-                background-color: #3d3d3d;
-                border-radius: 3px;
-                padding: 3px 6px;
-            """)
-            self.negative_point_radio.setChecked(True)
+        """更新点类型显示，点类型未变化时只同步标注图层颜色"""
+        previous = getattr(self, '_last_point_type', None)
+        if previous != point_type:
+            # 调用方已设置self.point_type，单选按钮只需同步状态，不再触发toggled处理
+            with _signals_blocked(self.positive_point_radio, self.negative_point_radio):
+                if point_type == 1:
+                    self.point_type_status.setText("前景点")
+                    self.point_type_status.setStyleSheet(_POINT_TYPE_FG_STYLE)
+                    self.positive_point_radio.setChecked(True)
+                else:
+                    self.point_type_status.setText("背景点")
+                    self.point_type_status.setStyleSheet(_POINT_TYPE_BG_STYLE)
+                    self.negative_point_radio.setChecked(True)
             
             # 在状态栏显示当前模式
-            self.viewer.status = "背景点标注模式 | 释放Shift切换到前景点 | F/B键快速切换"
+            if point_type == 1:
+                self.viewer.status = "前景点标注模式 | 按Shift切换到背景点 | F/B键快速切换"
+            else:
+                self.viewer.status = "背景点标注模式 | 释放Shift切换到前景点 | F/B键快速切换"
             
             # 显示提示
-            if hasattr(self, '_last_point_type') and self._last_point_type != point_type:
-                show_info("已切换到背景点模式")
+            if previous is not None:
+                show_info("已切换到前景点模式" if point_type == 1 else "已切换到背景点模式")
         
         # 记录上一次的点类型，用于状态变化检测
         self._last_point_type = point_type
         
-        # 找到shapes图层并更新默认颜色
-        for layer in self.viewer.layers:
-            if isinstance(layer, Shapes) and layer.name == "标注":
-                # 更新下一个点的颜色
-                if point_type == 1:
-                    layer.current_edge_color = [0.3, 0.8, 0.3, 1]  # 绿色边缘
-                    if hasattr(layer, 'current_face_color'):
-                        layer.current_face_color = [0.3, 0.8, 0.3, 0.5]  # 绿色填充
-                else:
-                    layer.current_edge_color = [0.95, 0.3, 0.2, 1]  # 红色边缘
-                    if hasattr(layer, 'current_face_color'):
-                        layer.current_face_color = [0.95, 0.3, 0.2, 0.5]  # 红色填充
-                break
+        # 更新标注图层下一个点的默认颜色
+        layer = self._annot_layer
+        if layer is not None:
+            if point_type == 1:
+                layer.current_edge_color = [0.3, 0.8, 0.3, 1]  # 绿色边缘
+                if hasattr(layer, 'current_face_color'):
+                    layer.current_face_color = [0.3, 0.8, 0.3, 0.5]  # 绿色填充
+            else:
+                layer.current_edge_color = [0.95, 0.3, 0.2, 1]  # 红色边缘
+                if hasattr(layer, 'current_face_color'):
+                    layer.current_face_color = [0.95, 0.3, 0.2, 0.5]  # 红色填充
     
     def _load_model_async(self):
         """异步加载模型"""
-        if self.model_thread is not None and self.model_thread.is_alive():
+        self._start_model_loading(None, "状态: 正在加载模型...")
+    
+    def _start_model_loading(self, custom_path, status_text):
+        """
+        在后台线程加载模型，进度和结果通过worker信号回到界面线程
+        
+        参数:
+            custom_path: 自定义模型路径，为None时加载默认模型
+            status_text: 加载期间显示的状态文本
+        """
+        if self.model_worker is not None:
             # 已经在加载中
             return
         
+        # 获取选择的设备
+        device = None
+        device_text = self.device_combo.currentText()
+        if device_text == "CPU":
+            device = "cpu"
+        elif device_text == "MPS":
+            device = "mps"
+            # 添加警告信息
+            logger.warning("警告：选择了MPS后端，在Mac M系列芯片上可能导致崩溃")
+        elif device_text == "CUDA":
+            device = "cuda"
+        
+        # 获取选择的精度，自动时由模型封装决定
+        precision = {"FP32": "fp32", "FP16": "fp16", "BF16": "bf16"}.get(
+            self.precision_combo.currentText()
+        )
+        
         # 禁用按钮并更新状态
         self.load_model_btn.setEnabled(False)
         self.load_custom_model_btn.setEnabled(False)
-        self.model_status_label.setText("状态: 正在加载模型...")
+        self.model_status_label.setText(status_text)
         self.progress_bar.setValue(0)
         
-        # 启动线程
-        self.model_thread = threading.Thread(target=self._load_model_thread)
-        self.model_thread.daemon = True
-        self.model_thread.start()
+        # 控件状态在界面线程读取，后台线程只接收普通参数
+        # 加载失败由_handle_error提示，不再在界面线程重新抛出异常
+        self.model_worker = create_worker(
+            self._load_model_job, custom_path, device, precision,
+            self.optimize_memory_check.isChecked(), _ignore_errors=True
+        )
+        self.model_worker.yielded.connect(self._update_progress)
+        self.model_worker.returned.connect(self._model_loading_finished)
+        self.model_worker.errored.connect(self._handle_error)
+        self.model_worker.finished.connect(self._model_worker_finished)
+        self.model_worker.start()
     
-    def _load_model_thread(self, custom_path=None):
-        """模型加载线程函数"""
-        try:
-            # 模拟加载进度
-            for i in range(0, 90, 10):
-                time.sleep(0.2)  # 模拟加载时间
-                self.progress_signal.emit(i)
-            
-            # 获取选择的设备
-            device = None
-            device_text = self.device_combo.currentText()
-            if device_text == "CPU":
-                device = "cpu"
-            elif device_text == "MPS":
-                device = "mps"
-                # 添加警告信息
-                print("警告：选择了MPS后端，在Mac M系列芯片上可能导致崩溃")
-            elif device_text == "CUDA":
-                device = "cuda"
-            elif device_text == "自动":
-                device = None
-            
-            # 尝试加载模型
-            try:
-                self.model = MobileSamWrapper(model_path=custom_path, force_device=device)
-            except Exception as e:
-                # 如果使用指定设备失败，尝试使用CPU
-                print(f"使用{device}后端加载模型失败: {str(e)}")
-                print("尝试使用CPU后端加载模型...")
-                self.model = MobileSamWrapper(model_path=custom_path, force_device="cpu")
-            
-            # 完成加载
-            self.progress_signal.emit(100)
-            self.finished_signal.emit()
+    def _load_model_job(self, custom_path, device, precision, optimize_memory):
+        """
+        加载模型并在各阶段产出进度（后台线程）
+        
+        参数:
+            custom_path: 自定义模型路径，为None时加载默认模型
+            device: 推理设备，为None时自动选择
+            precision: 推理精度，为None时由模型封装决定
+            optimize_memory: 是否配置CUDA缓存分配器并限制显存占用
             
+        返回:
+            model: 加载完成的模型封装
+        """
+        yield 0
+        
+        # PyTorch导入耗时较长，在后台线程中导入，不影响插件界面的创建
+        import torch
+        
+        # 创建CUDA上下文前配置缓存分配器
+        if optimize_memory and not torch.cuda.is_initialized():
+            os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", CUDA_ALLOC_CONF)
+        
+        # 读取权重的同时在另一线程初始化CUDA上下文，模型移到显存时无需再等待初始化
+        if device in (None, "cuda") and torch.cuda.is_available() and not torch.cuda.is_initialized():
+            threading.Thread(target=torch.cuda.init, daemon=True).start()
+        yield 10
+        
+        # 尝试加载模型
+        try:
+            model = self._create_model(custom_path, device, precision)
         except Exception as e:
-            self.error_signal.emit(str(e))
+            # 如果使用指定设备失败，尝试使用CPU
+            logger.warning(f"使用{device}后端加载模型失败: {str(e)}")
+            logger.warning("尝试使用CPU后端加载模型...")
+            model = self._create_model(custom_path, "cpu", precision)
+        yield 90
+        
+        # 限制PyTorch显存占用，与napari渲染共享GPU
+        if optimize_memory and not isinstance(model, MobileSamOnnxWrapper) and model.device == "cuda":
+            torch.cuda.set_per_process_memory_fraction(CUDA_MEMORY_FRACTION)
+        yield 100
+        
+        return model
+    
+    def _create_model(self, custom_path, device, precision=None):
+        """创建模型封装，已导出ONNX模型时优先使用ONNX Runtime后端"""
+        if custom_path is None and onnx_available():
+            # ONNX编码器没有BF16版本，此时按默认规则选择
+            onnx_precision = precision if precision in ENCODER_FILENAMES else None
+            return MobileSamOnnxWrapper(force_device=device, precision=onnx_precision)
+        
+        # 只有使用PyTorch后端时才导入mobile_sam
+        from .mobilesam_wrapper import MobileSamWrapper
+        return MobileSamWrapper(model_path=custom_path, force_device=device, precision=precision)
     
     def _load_custom_model(self):
         """加载自定义模型"""
         # 打开文件对话框
-        file_dialog = QFileDialog()
-        file_path, _ = file_dialog.getOpenFileName(
+        file_path, _ = QFileDialog.getOpenFileName(
             self, "选择MobileSAM模型文件", "", "PyTorch模型 (*.pt *.pth)"
         )
         
         if file_path:
             # 异步加载自定义模型
-            self.load_model_btn.setEnabled(False)
-            self.load_custom_model_btn.setEnabled(False)
-            self.model_status_label.setText("状态: 正在加载自定义模型...")
-            self.progress_bar.setValue(0)
-            
-            # 启动线程
-            self.model_thread = threading.Thread(
-                target=self._load_model_thread, 
-                args=(file_path,)
-            )
-            self.model_thread.daemon = True
-            self.model_thread.start()
+            self._start_model_loading(file_path, "状态: 正在加载自定义模型...")
     
     def _update_progress(self, value):
         """更新进度条"""
         self.progress_bar.setValue(value)
     
-    def _model_loading_finished(self):
+    def _model_loading_finished(self, model):
         """模型加载完成"""
+        self.model = model
         self.model_loaded = True
         self.model_status_label.setText(f"状态: 模型已加载 (设备: {self.model.device})")
         self.model_status_label.setStyleSheet("""
@@ -1205,13 +1492,13 @@ class MobileSamWidget(QWidget):
         self.viewer.status = f"模型加载完成，使用{self.model.device.upper()}设备{device_msg} | 请选择图像并添加点标注或框选"
         
         # 如果检测到Mac M系列芯片且用户选择了MPS，显示额外警告
-        try:
-            import platform
-            if platform.system() == "Darwin" and platform.machine() == "arm64" and self.model.device == "mps":
-                show_warning("您正在Mac M系列芯片上使用MPS后端，这可能导致程序崩溃。\n"
-                            "如果遇到问题，请在设备选项中选择CPU并重新加载模型。")
-        except:
-            pass
+        if IS_MAC_ARM64 and self.model.device == "mps":
+            show_warning("您正在Mac M系列芯片上使用MPS后端，这可能导致程序崩溃。\n"
+                        "如果遇到问题，请在设备选项中选择CPU并重新加载模型。")
+    
+    def _model_worker_finished(self):
+        """模型加载线程结束，允许再次加载"""
+        self.model_worker = None
     
     def _handle_error(self, error_msg):
         """处理错误信息"""
@@ -1232,34 +1519,55 @@ class MobileSamWidget(QWidget):
     
     def _refresh_image_layers(self):
         """刷新图像图层列表"""
-        # 清空当前列表
-        self.image_combo.clear()
+        current_name = self.image_combo.currentText()
         
         # 获取所有Image类型的图层
         image_layers = [layer.name for layer in self.viewer.layers if isinstance(layer, Image)]
         
-        if image_layers:
-            # 添加到下拉列表
-            self.image_combo.addItems(image_layers)
-        else:
+        # 重建列表期间屏蔽信号，并保留原来选中的图层
+        blocker = QSignalBlocker(self.image_combo)
+        try:
+            # 清空当前列表
+            self.image_combo.clear()
+            
+            if image_layers:
+                # 添加到下拉列表
+                self.image_combo.addItems(image_layers)
+                if current_name in image_layers:
+                    self.image_combo.setCurrentText(current_name)
+        finally:
+            blocker.unblock()
+        
+        if not image_layers:
             # 未找到图像图层
             show_warning("未找到图像图层，请先添加图像")
     
+    def _resolve_plugin_layers(self, event=None):
+        """重新查找插件使用的"标注"和"分割标签"图层，事件处理中直接使用缓存的引用"""
+        self._annot_layer = None
+        self._labels_layer = None
+        for layer in self.viewer.layers:
+            if isinstance(layer, Shapes) and layer.name == "标注" and self._annot_layer is None:
+                self._annot_layer = layer
+            elif isinstance(layer, Labels) and layer.name == "分割标签" and self._labels_layer is None:
+                self._labels_layer = layer
+    
     def _on_layer_change(self, event):
         """当图层变化时更新图层列表和标签名称"""
+        # 新图层改名时也需要更新缓存的插件图层
+        if event.type == "inserted":
+            event.value.events.name.connect(self._resolve_plugin_layers)
+        self._resolve_plugin_layers()
+        
         self._refresh_image_layers()
         
         # 检查并更新标签信息
-        if "分割标签" in self.viewer.layers:
-            labels_layer = self.viewer.layers["分割标签"]
+        labels_layer = self._labels_layer
+        if labels_layer is not None:
             if hasattr(labels_layer, 'metadata'):
                 if 'label_names' in labels_layer.metadata:
-                    self.label_names = labels_layer.metadata['label_names']
+                    self._sync_label_names(labels_layer.metadata['label_names'])
                     self._update_label_name_combo()
-                    
-                    # 更新下一个ID
-                    if self.label_names:
-                        self.next_label_id = max(self.label_names.keys()) + 1
                 
                 if 'label_colors' in labels_layer.metadata:
                     self.label_colors = labels_layer.metadata['label_colors']
@@ -1290,44 +1598,202 @@ class MobileSamWidget(QWidget):
             show_error(f"图层 '{selected_layer_name}' 不是图像类型")
             return
         
-        # 获取图像数据
-        image_data = selected_layer.data
+        # 上一次编码或预测尚未完成时，记录最新的图层，完成后再处理
+        if self.image_worker is not None or self.predict_worker is not None:
+            self._pending_image_layer = selected_layer
+            return
         
-        # 设置当前图像
-        try:
-            # 显示加载提示
-            self.viewer.status = "正在处理图像，请稍候..."
-            
-            # 设置图像到模型
-            self.model.set_image(image_data)
-            
-            # 更新状态
-            self.current_image = image_data
-            self.current_layer = selected_layer
-            
-            # 启用预测按钮
-            self.predict_btn.setEnabled(True)
-            
-            show_info(f"已设置图像 '{selected_layer_name}'")
-            
-            # 在状态栏显示提示
-            self.viewer.status = "图像已设置 | 添加点标注或框选，按空格键执行预测"
+        # 获取图像数据，多尺度图层只使用编码所需的层级
+        image_data, scale = self._encoder_level(selected_layer)
+        
+        # 显示加载提示，编码期间禁用预测
+        self.viewer.status = "正在处理图像，请稍候..."
+        self.current_image = None
+        self.predict_btn.setEnabled(False)
+        
+        # 在后台线程读取数据并计算图像嵌入，避免阻塞界面
+        self.image_worker = create_worker(self._encode_image, image_data, _ignore_errors=True)
+        self.image_worker.yielded.connect(self._image_set_progress)
+        self.image_worker.returned.connect(
+            lambda image: self._image_set_finished(image, selected_layer, scale)
+        )
+        self.image_worker.errored.connect(self._image_set_failed)
+        self.image_worker.finished.connect(self._image_worker_finished)
+        self.image_worker.start()
+    
+    def _encode_image(self, image_data):
+        """
+        读取图像数据并计算图像嵌入，产出当前阶段的提示文本（后台线程）
+        
+        参数:
+            image_data: 图像数据，可以是延迟加载的数组
             
-        except Exception as e:
-            # 显示详细错误信息
-            error_msg = f"设置图像失败: {str(e)}"
-            show_error(error_msg)
+        返回:
+            image: 编码所用的图像数组
+        """
+        yield "正在读取图像数据..."
+        image = np.asarray(image_data)
+        yield "正在计算图像嵌入..."
+        self.model.set_image(image)
+        return image
+    
+    def _image_set_progress(self, message):
+        """在状态栏显示图像编码的当前阶段（主线程）"""
+        self.viewer.status = message
+    
+    def _image_set_finished(self, image_data, selected_layer, scale=None):
+        """图像嵌入计算完成后更新状态（主线程）"""
+        # 更新状态
+        self.current_image = image_data
+        self.current_layer = selected_layer
+        self.current_scale = scale
+        self._predict_cache.clear()
+        
+        # 插件图层与编码所用的层级对齐
+        for name in ("标注", "MobileSAM掩码", "掩码预览"):
+            if name in self.viewer.layers:
+                layer = self.viewer.layers[name]
+                layer.scale = self._layer_scale(layer.ndim) or (1.0,) * layer.ndim
+        
+        # 启用预测按钮
+        self.predict_btn.setEnabled(True)
+        
+        show_info(f"已设置图像 '{selected_layer.name}'")
+        
+        # 在状态栏显示提示
+        self.viewer.status = "图像已设置 | 添加点标注或框选，按空格键执行预测"
+    
+    def _encoder_level(self, layer):
+        """
+        获取用于计算图像嵌入的数据
+        
+        参数:
+            layer: 图像图层
             
-            # 检查是否为MPS错误
-            error_str = str(e).lower()
-            if "mps" in error_str or "metal" in error_str or "gpu" in error_str:
-                # 提示用户切换到CPU
-                show_warning("检测到可能是MPS后端问题，请尝试在设备选项中选择'CPU'并重新加载模型")
-                # 自动切换到CPU
-                self.device_combo.setCurrentText("CPU")
+        返回:
+            image_data: 图像数据，多尺度图层为长边不小于编码器输入尺寸的最小层级，
+                可能为延迟加载的数组，由后台线程读取
+            scale: 该层级相对图层的缩放，非多尺度图层为None
+        """
+        if not layer.multiscale:
+            return layer.data, None
+        
+        levels = layer.data
+        index = 0
+        for i, level in enumerate(levels):
+            if max(level.shape[:2]) >= 1024:
+                index = i
+        factor = levels[0].shape[0] / levels[index].shape[0]
+        scale = tuple(float(s) * factor for s in layer.scale[-2:])
+        return levels[index], scale
+    
+    def _layer_scale(self, ndim):
+        """插件新建图层的缩放，与编码所用的层级对齐"""
+        if self.current_scale is None:
+            return None
+        return (1.0,) * (ndim - 2) + tuple(self.current_scale)
+    
+    def _image_set_failed(self, e):
+        """图像嵌入计算失败时提示用户（主线程）"""
+        # 显示详细错误信息
+        error_msg = f"设置图像失败: {str(e)}"
+        show_error(error_msg)
+        
+        # 检查是否为MPS错误
+        error_str = str(e).lower()
+        if "mps" in error_str or "metal" in error_str or "gpu" in error_str:
+            # 提示用户切换到CPU
+            show_warning("检测到可能是MPS后端问题，请尝试在设备选项中选择'CPU'并重新加载模型")
+            # 自动切换到CPU
+            self.device_combo.setCurrentText("CPU")
+        
+        # 更新状态
+        self.viewer.status = "图像设置失败，请重试"
+    
+    def _image_worker_finished(self):
+        """后台线程结束后处理编码期间排队的图像和提示，空闲时预编码文件夹中的后续图片"""
+        self.image_worker = None
+        if self._start_pending_image():
+            return
+        # 交互预测优先于预编码，预测线程运行时预编码推迟到其结束后开始
+        latest, self._latest_prompt = self._latest_prompt, None
+        if latest is not None and self.current_image is not None:
+            self._start_prediction(*latest)
+        self._start_prefetch()
+    
+    def _start_prefetch(self):
+        """模型空闲时预编码文件夹中的后续图片（主线程）"""
+        if self.image_worker is not None or self.predict_worker is not None:
+            return
+        if self._prefetch_index is not None and self.model_loaded:
+            index, self._prefetch_index = self._prefetch_index, None
+            # 已解码的图片在界面线程取出后传入，后台线程不访问缓存
+            cached = {path: self._decoded_images[path] for path in self._prefetch_paths(index)
+                      if path in self._decoded_images}
+            # 与设置图像共用同一个后台线程槽，保证模型不会被并发调用
+            # 预编码失败只记录日志，不再经superqt重新抛出到异常钩子
+            self.image_worker = create_worker(
+                self._prefetch_images, index, cached, _ignore_errors=True
+            )
+            self.image_worker.returned.connect(self._prefetch_finished)
+            self.image_worker.errored.connect(lambda e: logger.warning(f"预编码图片失败: {str(e)}"))
+            self.image_worker.finished.connect(self._image_worker_finished)
+            self.image_worker.start()
+    
+    def _start_pending_image(self):
+        """设置排队等待的图像图层，没有排队的图层时返回False"""
+        pending_layer, self._pending_image_layer = self._pending_image_layer, None
+        if pending_layer is None or pending_layer not in self.viewer.layers:
+            return False
+        self.image_combo.setCurrentText(pending_layer.name)
+        self._set_current_image()
+        return True
+    
+    def _prefetch_paths(self, index):
+        """需要预先读取的图片路径：前一张和之后的若干张"""
+        paths = self.image_files[index + 1:index + 1 + PREFETCH_COUNT]
+        if index > 0:
+            paths.append(self.image_files[index - 1])
+        return paths
+    
+    def _prefetch_images(self, index, cached):
+        """
+        读取相邻图片并批量计算之后若干张的嵌入（后台线程）
+        
+        参数:
+            index: 当前图片的文件夹索引
+            cached: 已解码图片的路径到图像数组的映射，这些图片不再读取
             
-            # 更新状态
-            self.viewer.status = "图像设置失败，请重试"
+        返回:
+            images: 本次新解码图片的路径到图像数组的映射
+        """
+        images = {}
+        for path in self._prefetch_paths(index):
+            if path in cached:
+                continue
+            # 单个文件无法读取时跳过，不影响其余图片的预编码
+            try:
+                images[path] = read_image(path)
+            except Exception as e:
+                logger.warning(f"预读取图片失败: {path}: {str(e)}")
+        following = self.image_files[index + 1:index + 1 + PREFETCH_COUNT]
+        batch = [cached[path] if path in cached else images[path] for path in following
+                 if path in cached or path in images]
+        if batch:
+            self.model.set_image_batch(batch)
+        return images
+    
+    def _prefetch_finished(self, images):
+        """缓存预读时解码的图片，切换到这些图片时无需再次读取（主线程）"""
+        for path, image in images.items():
+            self._cache_decoded_image(path, image)
+    
+    def _cache_decoded_image(self, path, image):
+        """将解码后的图片放入LRU缓存，超出容量时淘汰最久未使用的图片"""
+        self._decoded_images[path] = image
+        self._decoded_images.move_to_end(path)
+        while len(self._decoded_images) > DECODE_CACHE_SIZE:
+            self._decoded_images.popitem(last=False)
     
     def _update_prediction_mode(self, mode):
         """更新预测模式"""
@@ -1351,6 +1817,9 @@ class MobileSamWidget(QWidget):
             show_warning("请先加载模型并设置图像")
             return
         
+        # 先应用等待中的点类型特征更新，确保新添加的点类型正确
+        self._flush_feature_update()
+        
         # 检查Shapes图层
         shapes_layers = [layer for layer in self.viewer.layers if isinstance(layer, Shapes)]
         if not shapes_layers:
@@ -1358,6 +1827,7 @@ class MobileSamWidget(QWidget):
             shapes_layer = self.viewer.add_shapes(
                 name="标注", 
                 ndim=self.current_image.ndim,
+                scale=self._layer_scale(self.current_image.ndim),
                 face_color='transparent',
                 edge_color='green',
                 symbol='o',
@@ -1370,183 +1840,230 @@ class MobileSamWidget(QWidget):
             # 更新点大小
             shapes_layer.size = self.point_size
         
-        # 获取标注数据
-        shapes_data = shapes_layer.data
-        shapes_types = shapes_layer.shape_type
-        
-        if len(shapes_data) == 0:
+        if len(shapes_layer.data) == 0:
             show_warning("未找到标注数据，请先添加点或框标注")
             return
         
-        # 转换shape数据为所需格式
-        shapes_metadata = [
-            {'shape_type': shape_type} 
-            for shape_type in shapes_types
-        ]
+        # 获取结构数组形式的标注数据
+        shapes = self._get_shape_batch(shapes_layer)
         
-        shapes = []
-        for i, (data, metadata) in enumerate(zip(shapes_data, shapes_metadata)):
-            shapes.append({
-                'data': data,
-                'shape_type': metadata['shape_type']
-            })
-        
-        try:
-            # 根据模式执行预测
-            if self.prediction_mode == "点标注":
-                # 进行点标注模式的预测
-                self._predict_with_points(shapes, shapes_layer)
-            elif self.prediction_mode == "框选标注":
-                # 进行框选标注模式的预测
-                self._predict_with_box_and_points(shapes, shapes_layer)
-            
-        except Exception as e:
-            show_error(f"预测失败: {str(e)}")
+        # 根据模式准备提示
+        if self.prediction_mode == "点标注":
+            # 进行点标注模式的预测
+            prompt = self._points_prompt(shapes, shapes_layer)
+        elif self.prediction_mode == "框选标注":
+            # 进行框选标注模式的预测
+            prompt = self._box_and_points_prompt(shapes, shapes_layer)
+        else:
+            prompt = None
         
-        # 预测结束后
-        self.viewer.status = "预测完成 | 使用掩码下拉框选择结果 | 按住Shift+点击添加背景点优化"
+        if prompt is not None:
+            self._start_prediction(prompt, shapes_layer)
     
-    def _predict_with_points(self, shapes, shapes_layer):
-        """使用点标注进行预测"""
-        # 获取点标注和它们的类型
-        # 使用shapes_layer的feature属性获取点类型
-        point_types = []
-        if hasattr(shapes_layer, 'features') and 'point_type' in shapes_layer.features:
-            point_types = shapes_layer.features['point_type'].tolist()
+    def _start_prediction(self, prompt, shapes_layer):
+        """
+        在后台线程执行预测，预测期间到达的提示只保留最新的一个，完成后再预测
         
-        # 如果没有点类型特征，则为每个点使用当前设置的点类型
-        if not point_types or len(point_types) != len([s for s in shapes if s['shape_type'] == 'point']):
-            point_types = []
-            # 只处理点形状
-            for s in shapes:
-                if s['shape_type'] == 'point':
-                    # 默认使用当前选择的点类型
-                    point_types.append(self.point_type)
+        参数:
+            prompt: (预测函数, 关键字参数, 点类型)元组
+            shapes_layer: 提示所在的Shapes图层
+        """
+        # 设置图像或预编码期间同样排队，保证模型不会被并发调用
+        if self.predict_worker is not None or self.image_worker is not None:
+            self._latest_prompt = (prompt, shapes_layer)
+            return
         
-        # 获取点和标签
-        points, labels = shapes_to_points(shapes, point_types)
+        predict_fn, kwargs, point_types = prompt
+        image = self.current_image
         
-        if len(points) == 0:
-            show_warning("未找到点标注")
+        # 相同的提示直接显示缓存的结果，跳过解码器
+        key = self._prompt_key(predict_fn, kwargs)
+        if key in self._predict_cache:
+            self._prediction_finished(self._predict_cache[key], image, shapes_layer, point_types)
             return
         
-        # 执行预测
-        multimask = self.multimask_check.isChecked()
-        masks, scores, best_idx = self.model.predict_from_points(
-            points=points,
-            labels=labels,
-            multimask_output=multimask
+        self.predict_worker = create_worker(predict_fn, _ignore_errors=True, **kwargs)
+        self.predict_worker.returned.connect(
+            lambda result: self._cache_prediction(key, result, image)
+        )
+        self.predict_worker.returned.connect(
+            lambda result: self._prediction_finished(result, image, shapes_layer, point_types)
         )
+        self.predict_worker.errored.connect(lambda e: show_error(f"预测失败: {str(e)}"))
+        self.predict_worker.finished.connect(self._predict_worker_finished)
+        self.predict_worker.start()
+    
+    @staticmethod
+    def _prompt_key(predict_fn, kwargs):
+        """根据预测函数和提示参数计算缓存键"""
+        hasher = hashlib.blake2b(predict_fn.__name__.encode(), digest_size=16)
+        for name in sorted(kwargs):
+            value = np.ascontiguousarray(kwargs[name])
+            hasher.update(f"{name}{value.dtype}{value.shape}".encode())
+            hasher.update(value.data)
+        return hasher.digest()
+    
+    def _cache_prediction(self, key, result, image):
+        """缓存预测结果，超出容量时淘汰最早的条目（主线程）"""
+        if image is not self.current_image:
+            return
+        self._predict_cache[key] = result
+        while len(self._predict_cache) > PREDICT_CACHE_SIZE:
+            self._predict_cache.pop(next(iter(self._predict_cache)))
+    
+    def _predict_worker_finished(self):
+        """预测线程结束后执行排队的最新提示或设置排队的图像，空闲时开始预编码（主线程）"""
+        self.predict_worker = None
+        latest, self._latest_prompt = self._latest_prompt, None
+        if self._start_pending_image():
+            return
+        if latest is not None and self.current_image is not None:
+            self._start_prediction(*latest)
+        self._start_prefetch()
+    
+    def _prediction_finished(self, result, image, shapes_layer, point_types):
+        """显示预测结果并记录点类型（主线程）"""
+        # 预测期间切换了图像时丢弃结果
+        if image is not self.current_image:
+            return
+        
+        masks, scores, best_idx = result
         
-        # 保存结果
-        self.result_masks = masks
+        # 保存结果，候选掩码保持为一个连续数组，按索引取出的掩码都是视图
+        self.result_masks = np.ascontiguousarray(masks)
         self.result_scores = scores
         self.selected_mask_idx = best_idx
+        self._displayed_mask_key = None
         
         # 更新UI
         self._update_mask_list()
         
-        # 显示最佳掩码
-        self._display_mask(masks[best_idx])
+        # 显示最佳掩码，列表更新时已显示则直接返回
+        self._update_selected_mask(best_idx)
         
         # 更新shapes_layer的feature属性，记录点类型
-        # 确保shapes_layer有features属性
-        if not hasattr(shapes_layer, 'features'):
-            shapes_layer.features = {}
-        
-        # 更新point_type特征
-        point_shapes = [s for s in shapes if s['shape_type'] == 'point']
-        if point_shapes:
+        if point_types is not None and len(point_types):
+            # 确保shapes_layer有features属性
+            if not hasattr(shapes_layer, 'features'):
+                shapes_layer.features = {}
+            
             # 使用numpy数组保存点类型
             shapes_layer.features['point_type'] = np.array(point_types)
+        
+        # 预测结束后
+        self.viewer.status = "预测完成 | 使用掩码下拉框选择结果 | 按住Shift+点击添加背景点优化"
     
-    def _predict_with_box_and_points(self, shapes, shapes_layer):
-        """使用框选和点标注相结合进行预测"""
-        # 分离框和点
-        box_shapes = [s for s in shapes if s['shape_type'] == 'rectangle']
-        point_shapes = [s for s in shapes if s['shape_type'] == 'point']
+    def _get_shape_batch(self, shapes_layer) -> ShapeBatch:
+        """
+        获取Shapes图层的ShapeBatch表示，图层数据未变化时复用上次的结果
         
+        参数:
+            shapes_layer: napari的Shapes图层
+            
+        返回:
+            batch: ShapeBatch对象
+        """
+        data = shapes_layer.data
+        key = (id(shapes_layer), len(data), tuple(np.asarray(data[-1])[-1]))
+        if self._last_prompt is None or self._last_prompt_key != key:
+            self._last_prompt = ShapeBatch.from_napari(shapes_layer)
+            self._last_prompt_key = key
+        return self._last_prompt
+    
+    def _get_point_types(self, shapes_layer, num_points: int) -> np.ndarray:
+        """
+        获取点标注的类型，缺少或数量不匹配时全部使用当前设置的点类型
+        
+        参数:
+            shapes_layer: napari的Shapes图层
+            num_points: 点标注的数量
+            
+        返回:
+            point_types: 点类型数组，形状为(num_points,)
+        """
+        if hasattr(shapes_layer, 'features') and 'point_type' in shapes_layer.features:
+            point_types = np.asarray(shapes_layer.features['point_type'])
+            if len(point_types) == num_points and num_points > 0:
+                return point_types
+        return np.full(num_points, self.point_type, dtype=np.int32)
+    
+    def _points_prompt(self, shapes, shapes_layer):
+        """准备点标注的预测提示，没有点标注时返回None"""
+        # 获取点标注和它们的类型
+        # 使用shapes_layer的feature属性获取点类型
+        point_types = self._get_point_types(
+            shapes_layer, np.count_nonzero(shapes.kind == SHAPE_POINT)
+        )
+        
+        # 获取点和标签
+        points, labels = shapes_to_points(shapes, point_types)
+        
+        if len(points) == 0:
+            show_warning("未找到点标注")
+            return None
+        
+        kwargs = dict(
+            points=points,
+            labels=labels,
+            multimask_output=self.multimask_check.isChecked()
+        )
+        return self.model.predict_from_points, kwargs, point_types
+    
+    def _box_and_points_prompt(self, shapes, shapes_layer):
+        """准备框选和点标注相结合的预测提示，没有有效框选时返回None"""
         # 检查是否有框
-        if not box_shapes:
+        if not np.any(shapes.kind == SHAPE_RECTANGLE):
             show_warning("未找到框选标注")
-            return
+            return None
         
         # 获取框选
-        box = shapes_to_box(box_shapes)
+        box = shapes_to_box(shapes)
         
         if box.size == 0:
             show_warning("框选格式无效")
-            return
+            return None
         
         # 检查是否有点标注用于优化掩码
-        has_points = len(point_shapes) > 0
+        num_points = np.count_nonzero(shapes.kind == SHAPE_POINT)
+        has_points = num_points > 0
         
         if has_points:
             # 获取点标注和它们的类型
-            point_types = []
-            if hasattr(shapes_layer, 'features') and 'point_type' in shapes_layer.features:
-                # 提取与点对应的类型
-                all_point_indices = [i for i, t in enumerate(shapes_layer.shape_type) if t == 'point']
-                if len(all_point_indices) <= len(shapes_layer.features['point_type']):
-                    point_types = shapes_layer.features['point_type'].tolist()
-            
-            # 如果没有点类型特征，则为每个点使用当前设置的点类型
-            if not point_types or len(point_types) != len(point_shapes):
-                point_types = []
-                for _ in point_shapes:
-                    # 默认使用当前选择的点类型
-                    point_types.append(self.point_type)
+            point_types = self._get_point_types(shapes_layer, num_points)
             
             # 获取点和标签
-            points, labels = shapes_to_points(point_shapes, point_types)
+            points, labels = shapes_to_points(shapes, point_types)
             
-            # 执行带点的框选预测
-            multimask = self.multimask_check.isChecked()
-            masks, scores, best_idx = self.model.predict_from_box_and_points(
+            # 带点的框选预测
+            kwargs = dict(
                 box=box,
                 points=points,
                 labels=labels,
-                multimask_output=multimask
+                multimask_output=self.multimask_check.isChecked()
             )
-        else:
-            # 执行纯框选预测
-            multimask = self.multimask_check.isChecked()
-            masks, scores, best_idx = self.model.predict_from_box(
-                box=box,
-                multimask_output=multimask
-            )
-        
-        # 保存结果
-        self.result_masks = masks
-        self.result_scores = scores
-        self.selected_mask_idx = best_idx
-        
-        # 更新UI
-        self._update_mask_list()
+            return self.model.predict_from_box_and_points, kwargs, point_types
         
-        # 显示最佳掩码
-        self._display_mask(masks[best_idx])
-        
-        # 更新shapes_layer的feature属性，记录点类型
-        if has_points:
-            # 确保shapes_layer有features属性
-            if not hasattr(shapes_layer, 'features'):
-                shapes_layer.features = {}
-            
-            # 更新point_type特征
-            shapes_layer.features['point_type'] = np.array(point_types)
+        # 纯框选预测
+        kwargs = dict(box=box, multimask_output=self.multimask_check.isChecked())
+        return self.model.predict_from_box, kwargs, None
     
     def _update_mask_list(self):
-        """更新掩码列表"""
-        # 清空当前列表
-        self.mask_combo.clear()
-        
-        # 添加所有掩码到列表
-        for i, score in enumerate(self.result_scores):
-            self.mask_combo.addItem(f"掩码 {i+1} (得分: {score:.3f})")
-        
-        # 选择最佳掩码
-        self.mask_combo.setCurrentIndex(self.selected_mask_idx)
+        """更新掩码列表，由调用方显示选中的掩码"""
+        # 重建列表期间屏蔽信号，避免逐项触发掩码重绘
+        blocker = QSignalBlocker(self.mask_combo)
+        try:
+            # 清空当前列表
+            self.mask_combo.clear()
+            
+            # 添加所有掩码到列表
+            self.mask_combo.addItems(
+                [f"掩码 {i+1} (得分: {score:.3f})" for i, score in enumerate(self.result_scores)]
+            )
+            
+            # 选择最佳掩码
+            self.mask_combo.setCurrentIndex(self.selected_mask_idx)
+        finally:
+            blocker.unblock()
         
         # 启用控件
         self.mask_combo.setEnabled(True)
@@ -1567,6 +2084,12 @@ class MobileSamWidget(QWidget):
             index >= len(self.result_masks)):
             return
         
+        # 同一结果的同一掩码已经显示时跳过，避免重复上传纹理
+        key = (id(self.result_masks), index)
+        if key == self._displayed_mask_key and "MobileSAM掩码" in self.viewer.layers:
+            return
+        self._displayed_mask_key = key
+        
         # 更新选中的掩码索引
         self.selected_mask_idx = index
         
@@ -1576,8 +2099,24 @@ class MobileSamWidget(QWidget):
         # 更新预览图层(如果存在)
         if "掩码预览" in self.viewer.layers and self.result_masks is not None:
             mask = self.result_masks[index]
-            binary_mask = mask_to_binary(mask)
-            self.viewer.layers["掩码预览"].data = binary_mask.astype(np.uint8) * 255
+            binary_mask = self._mask_to_binary(mask)
+            self._update_preview_layer(binary_mask)
+    
+    def _update_preview_layer(self, binary_mask):
+        """将二值掩码写入预览图层，形状相同时原地更新避免重新分配"""
+        preview_layer = self.viewer.layers["掩码预览"]
+        data = preview_layer.data
+        if isinstance(data, np.ndarray) and data.shape == binary_mask.shape and data.dtype == np.uint8:
+            np.multiply(binary_mask, 255, out=data)
+            preview_layer.refresh()
+        else:
+            preview_layer.data = binary_mask * 255
+    
+    def _mask_to_binary(self, mask):
+        """二值化掩码，复用预分配的uint8缓冲区"""
+        if self._binary_buf is None or self._binary_buf.shape != mask.shape:
+            self._binary_buf = np.empty(mask.shape, dtype=np.uint8)
+        return mask_to_binary(mask, out=self._binary_buf)
     
     def _display_mask(self, mask):
         """显示掩码"""
@@ -1591,6 +2130,7 @@ class MobileSamWidget(QWidget):
             self.viewer.add_image(
                 mask,
                 name=mask_layer_name,
+                scale=self._layer_scale(mask.ndim),
                 colormap="red",
                 opacity=0.5,
                 blending="additive"
@@ -1606,7 +2146,7 @@ class MobileSamWidget(QWidget):
         mask = self.result_masks[self.selected_mask_idx]
         
         # 转换为二值掩码
-        binary_mask = mask_to_binary(mask)
+        binary_mask = self._mask_to_binary(mask)
         
         # 获取标签名称
         label_name = self.label_name_combo.currentText().strip()
@@ -1615,14 +2155,14 @@ class MobileSamWidget(QWidget):
         
         # 检查是否已有Labels图层
         labels_layer_name = "分割标签"
-        if labels_layer_name in self.viewer.layers:
+        if self._labels_layer is not None:
             # 获取现有的Labels图层
-            labels_layer = self.viewer.layers[labels_layer_name]
+            labels_layer = self._labels_layer
             
             # 获取新的标签ID
             if hasattr(labels_layer, 'metadata') and 'label_names' in labels_layer.metadata:
                 # 从图层的元数据中恢复标签名称映射
-                self.label_names = labels_layer.metadata['label_names']
+                self._sync_label_names(labels_layer.metadata['label_names'])
                 
                 # 如果有颜色映射，也恢复它
                 if 'label_colors' in labels_layer.metadata:
@@ -1637,7 +2177,8 @@ class MobileSamWidget(QWidget):
                 
                 if label_id is None:
                     # 新标签，分配新ID
-                    label_id = max(self.label_names.keys(), default=0) + 1
+                    label_id = self.next_label_id
+                    self.next_label_id += 1
                     self.label_names[label_id] = label_name
                     # 生成新的颜色
                     self.label_colors[label_id] = self._generate_label_color(label_id)
@@ -1658,27 +2199,28 @@ class MobileSamWidget(QWidget):
                 
                 show_info(f"创建标签: {label_name} (ID: {label_id})")
             
-            # 更新Labels数据
-            labels_data = labels_layer.data.copy()
+            # 更新Labels数据，可写的ndarray直接原地修改，避免每次复制整张标签图
+            labels_data = labels_layer.data
+            in_place = isinstance(labels_data, np.ndarray) and labels_data.flags.writeable
+            if not in_place:
+                labels_data = np.array(labels_data)
             
             # 创建重用记录
             if not hasattr(self, 'label_mask_history'):
                 self.label_mask_history = {}
                 
             # 记录这个标签ID的当前掩码，用于重用
-            self.label_mask_history[label_id] = {
-                'mask': binary_mask.copy(),
-                'name': label_name,
-                'mask_idx': self.selected_mask_idx
-            }
+            self.label_mask_history[label_id] = self._label_history_entry(binary_mask, label_name)
             
-            # 应用掩码 - 先清除该ID的旧掩码
+            # 应用掩码 - 同时清除该ID的旧掩码
             # 这允许用户修改之前的标签
-            labels_data[labels_data == label_id] = 0
-            labels_data[binary_mask > 0] = label_id
+            paint_label(binary_mask, labels_data, label_id, threshold=0)
             
             # 更新图层
-            labels_layer.data = labels_data
+            if in_place:
+                labels_layer.refresh()
+            else:
+                labels_layer.data = labels_data
             
             # 更新元数据
             if not hasattr(labels_layer, 'metadata'):
@@ -1687,9 +2229,7 @@ class MobileSamWidget(QWidget):
             labels_layer.metadata['label_colors'] = self.label_colors
             
             # 尝试设置color
-            if hasattr(labels_layer, 'color'):
-                color_dict = {id: tuple(color) for id, color in self.label_colors.items()}
-                labels_layer.color = color_dict
+            self._push_label_colors(labels_layer)
             
             # 更新标签名称下拉框
             self._update_label_name_combo()
@@ -1709,12 +2249,13 @@ class MobileSamWidget(QWidget):
             self.next_label_id = label_id + 1
             
             # 设置标签
-            labels_data[binary_mask > 0] = label_id
+            paint_label(binary_mask, labels_data, label_id, threshold=0)
             
             # 创建图层及元数据
             labels_layer = self.viewer.add_labels(
                 labels_data,
                 name=labels_layer_name,
+                scale=self._layer_scale(labels_data.ndim),
                 metadata={
                     'label_names': self.label_names,
                     'label_colors': self.label_colors
@@ -1723,17 +2264,11 @@ class MobileSamWidget(QWidget):
             
             # 初始化标签历史记录
             self.label_mask_history = {
-                label_id: {
-                    'mask': binary_mask.copy(),
-                    'name': label_name,
-                    'mask_idx': self.selected_mask_idx
-                }
+                label_id: self._label_history_entry(binary_mask, label_name)
             }
             
             # 尝试设置颜色
-            if hasattr(labels_layer, 'color'):
-                color_dict = {id: tuple(color) for id, color in self.label_colors.items()}
-                labels_layer.color = color_dict
+            self._push_label_colors(labels_layer)
             
             # 更新标签名称下拉框
             self._update_label_name_combo()
@@ -1743,25 +2278,69 @@ class MobileSamWidget(QWidget):
         # 启用标签管理按钮
         self.export_labels_btn.setEnabled(True)
         self.clear_labels_btn.setEnabled(True)
-    
+
+    def _push_label_colors(self, labels_layer):
+        """将标签颜色写入Labels图层，与上次写入的颜色相同时跳过，避免重建颜色映射"""
+        if not hasattr(labels_layer, 'color'):
+            return
+        # 已有标签的颜色不会改变，映射对象和数量相同时无需逐项比较
+        source, count = getattr(labels_layer, '_mobilesam_colors_source', (None, 0))
+        if source is self.label_colors and count == len(self.label_colors):
+            return
+        color_dict = {id: tuple(color) for id, color in self.label_colors.items()}
+        if getattr(labels_layer, '_mobilesam_colors', None) != color_dict:
+            labels_layer.color = color_dict
+            labels_layer._mobilesam_colors = color_dict
+        labels_layer._mobilesam_colors_source = (self.label_colors, len(self.label_colors))
+
+    def _sync_label_names(self, label_names):
+        """使用图层元数据中的标签名称映射，映射被替换时才重新计算下一个可用ID"""
+        if label_names is self.label_names:
+            return
+        self.label_names = label_names
+        self.next_label_id = max(label_names.keys(), default=0) + 1
+
+    def _label_history_entry(self, binary_mask, label_name):
+        """创建标签重用记录，只保存掩码包围盒内的部分，避免复制整张掩码"""
+        bbox = mask_bbox(binary_mask)
+        return {
+            'mask': binary_mask[bbox].copy() if bbox is not None else None,
+            'bbox': bbox,
+            'name': label_name,
+            'mask_idx': self.selected_mask_idx
+        }
+
     def _update_label_name_combo(self):
-        """更新标签名称下拉框"""
-        # 暂存当前文本
-        current_text = self.label_name_combo.currentText()
-        
-        # 清空下拉框
-        self.label_name_combo.clear()
-        
-        # 添加现有标签名称
-        unique_names = sorted(set(self.label_names.values()))
-        self.label_name_combo.addItems(unique_names)
+        """更新标签名称下拉框，只插入或移除变化的名称，不重建整个列表"""
+        combo = self.label_name_combo
+        index = self._label_name_index
+        names = set(self.label_names.values())
+        if len(names) == len(index) and names.issuperset(index):
+            return
         
-        # 如果当前文本不在列表中，添加它
-        if current_text and current_text not in unique_names:
-            self.label_name_combo.addItem(current_text)
-            self.label_name_combo.setCurrentText(current_text)
-        elif current_text in unique_names:
-            self.label_name_combo.setCurrentText(current_text)
+        # 暂存当前文本
+        current_text = combo.currentText()
+        
+        # 移除已不存在的标签名称
+        for name in set(index) - names:
+            position = bisect.bisect_left(index, name)
+            del index[position]
+            combo.removeItem(position)
+        
+        # 按排序位置插入新的标签名称，用户输入的同名条目先移除
+        for name in names.difference(index):
+            duplicate = combo.findText(name)
+            if duplicate >= len(index):
+                combo.removeItem(duplicate)
+            position = bisect.bisect_left(index, name)
+            index.insert(position, name)
+            combo.insertItem(position, name)
+        
+        # 恢复当前文本，不在列表中时添加到末尾
+        if current_text and combo.findText(current_text) < 0:
+            combo.addItem(current_text)
+        if combo.currentText() != current_text:
+            combo.setCurrentText(current_text)
     
     def _save_current_mask(self):
         """保存当前掩码"""
@@ -1811,6 +2390,19 @@ class MobileSamWidget(QWidget):
         if self.auto_naming_check.isChecked() and self.current_layer:
             image_name = self.current_layer.name
         
+        # 打包导出时所有掩码写入单个压缩文件
+        if self.bundle_export_check.isChecked():
+            if image_name is not None:
+                base_name = f"{os.path.splitext(image_name)[0]}_{base_name}"
+            bundle_path = save_mask_bundle(
+                self.result_masks,
+                self.result_scores,
+                os.path.join(output_dir, f"{base_name}.blp"),
+                names=[f"{base_name}_{i:03d}" for i in range(len(self.result_masks))]
+            )
+            show_info(f"已打包保存 {len(self.result_masks)} 个掩码到: {bundle_path}")
+            return
+        
         saved_paths = save_masks(
             masks=self.result_masks,
             scores=self.result_scores,
@@ -1824,8 +2416,7 @@ class MobileSamWidget(QWidget):
     def _select_output_directory(self):
         """选择输出目录"""
         # 打开目录选择对话框
-        dir_dialog = QFileDialog()
-        dir_path = dir_dialog.getExistingDirectory(
+        dir_path = QFileDialog.getExistingDirectory(
             self, "选择输出目录", ""
         )
         
@@ -1840,8 +2431,7 @@ class MobileSamWidget(QWidget):
         
         if not output_dir:
             # 打开目录选择对话框
-            dir_dialog = QFileDialog()
-            dir_path = dir_dialog.getExistingDirectory(
+            dir_path = QFileDialog.getExistingDirectory(
                 self, "选择输出目录", ""
             )
             
@@ -1857,22 +2447,102 @@ class MobileSamWidget(QWidget):
     # 批处理相关函数
     
     def _add_to_queue(self):
-        """添加当前图像到处理队列"""
-        # TODO: 实现批处理队列
-        # 这里只是示例框架，实际的队列实现可以根据需要扩展
-        show_info("批处理功能尚未实现")
+        """添加当前图像的预测结果到处理队列"""
+        if self.result_masks is None or len(self.result_masks) == 0:
+            show_warning("没有可用的掩码结果")
+            return
+        
+        image_name = None
+        if self.auto_naming_check.isChecked() and self.current_layer:
+            image_name = self.current_layer.name
+        
+        # 按位打包保存当前结果的快照，排队期间占用1/8内存，且不受之后边界调整的影响
+        packed, shape = pack_masks(self.result_masks)
+        with self._queue_lock:
+            self._queue.append((image_name, packed, shape, self.result_scores))
+        self._update_queue_status()
         self.process_queue_btn.setEnabled(True)
     
+    def _update_queue_status(self):
+        """更新队列状态标签"""
+        with self._queue_lock:
+            count = len(self._queue)
+        self.queue_status_label.setText(f"队列状态: {count} 个图像")
+    
     def _process_queue(self):
-        """处理队列中的所有图像"""
-        # TODO: 实现批处理逻辑
-        show_info("批处理功能尚未实现")
+        """在后台线程保存队列中的所有预测结果"""
+        if self.queue_worker is not None:
+            return
+        
+        output_dir = self._get_output_directory()
+        if not output_dir:
+            return
+        
+        self.batch_progress_bar.setValue(0)
+        self.batch_progress_bar.setFormat("处理中... %p%")
+        self.process_queue_btn.setEnabled(False)
+        
+        self.queue_worker = create_worker(
+            self._save_queue, output_dir, self.prefix_edit.text() or "batch", _ignore_errors=True
+        )
+        self.queue_worker.yielded.connect(self._queue_progress)
+        self.queue_worker.returned.connect(
+            lambda count: show_info(f"已处理 {count} 个图像，结果保存到: {output_dir}")
+        )
+        self.queue_worker.errored.connect(lambda e: show_error(f"批处理失败: {str(e)}"))
+        self.queue_worker.finished.connect(self._queue_worker_finished)
+        self.queue_worker.start()
+    
+    def _save_queue(self, output_dir, prefix):
+        """
+        取走队列并保存其中的掩码，处理期间新加入的项在下一轮取走（后台线程）
+        
+        参数:
+            output_dir: 输出目录
+            prefix: 掩码文件名前缀
+            
+        返回:
+            count: 处理的图像数量
+        """
+        done = 0
+        while True:
+            # 常数时间整体取走当前队列，界面线程随后追加到新列表
+            with self._queue_lock:
+                batch, self._queue = self._queue, []
+            if not batch:
+                break
+            
+            for i, (image_name, packed, shape, scores) in enumerate(batch, 1):
+                save_masks(
+                    masks=unpack_masks(packed, shape),
+                    scores=scores,
+                    output_dir=output_dir,
+                    image_name=image_name,
+                    base_name=generate_unique_name(prefix)
+                )
+                if i % QUEUE_PROGRESS_STEP == 0 or i == len(batch):
+                    with self._queue_lock:
+                        remaining = len(batch) - i + len(self._queue)
+                    yield (done + i, done + i + remaining)
+            done += len(batch)
+        return done
+    
+    def _queue_progress(self, progress):
+        """更新批处理进度（主线程）"""
+        done, total = progress
+        self.batch_progress_bar.setValue(int(100 * done / total))
+        self._update_queue_status()
+    
+    def _queue_worker_finished(self):
+        """批处理线程结束后恢复界面（主线程）"""
+        self.queue_worker = None
+        self.batch_progress_bar.setFormat("完成 %p%")
+        self._update_queue_status()
     
     def _import_image_folder(self):
         """导入图片文件夹"""
         # 打开文件夹选择对话框
-        folder_dialog = QFileDialog()
-        folder_path = folder_dialog.getExistingDirectory(
+        folder_path = QFileDialog.getExistingDirectory(
             self, "选择图片文件夹", ""
         )
         
@@ -1891,6 +2561,11 @@ class MobileSamWidget(QWidget):
         self.folder_path_label.setText(displayed_path)
         self.folder_path_label.setToolTip(folder_path)  # 添加完整路径作为工具提示
         
+        # zarr图像金字塔以多尺度图层懒加载，只读取可见区域
+        if self._is_zarr_pyramid(folder_path):
+            self._load_zarr_pyramid(folder_path)
+            return
+        
         # 获取文件夹中的所有图片文件
         self._scan_image_folder()
         
@@ -1898,6 +2573,59 @@ class MobileSamWidget(QWidget):
         if self.image_files:
             self._load_image_by_index(0)
     
+    def _is_zarr_pyramid(self, folder_path):
+        """判断文件夹是否为zarr存储"""
+        markers = (".zgroup", ".zarray", "zarr.json")
+        return folder_path.rstrip("/\\").endswith(".zarr") or any(
+            os.path.exists(os.path.join(folder_path, marker)) for marker in markers
+        )
+    
+    def _load_zarr_pyramid(self, folder_path):
+        """以多尺度图层打开zarr图像金字塔，并设置为当前图像"""
+        # zarr为可选依赖，只在打开zarr存储时导入，不影响插件启动时间
+        try:
+            import zarr
+        except ImportError:
+            show_error("读取zarr图像需要安装zarr: pip install zarr")
+            return
+        
+        try:
+            root = zarr.open(folder_path, mode="r")
+            if isinstance(root, zarr.Array):
+                levels = [root]
+            else:
+                # 按分辨率从高到低排列金字塔层级
+                levels = sorted(
+                    (array for _, array in root.arrays()),
+                    key=lambda array: array.shape[0], reverse=True
+                )
+            if not levels:
+                show_error("zarr中未找到图像数组")
+                return
+            
+            # 金字塔不参与文件夹逐张浏览
+            self.image_files = []
+            self.current_image_index = -1
+            self._update_image_counter()
+            
+            if 'imported_image' in self.viewer.layers:
+                self.viewer.layers.remove('imported_image')
+            
+            rgb = levels[0].ndim == 3 and levels[0].shape[-1] in (3, 4)
+            self.viewer.add_image(
+                levels if len(levels) > 1 else levels[0],
+                multiscale=len(levels) > 1,
+                rgb=rgb,
+                name='imported_image'
+            )
+            
+            # 自动设置为当前图像
+            self.image_combo.setCurrentText('imported_image')
+            self._set_current_image()
+            
+        except Exception as e:
+            show_error(f"加载zarr图像失败: {str(e)}")
+    
     def _scan_image_folder(self):
         """扫描图片文件夹，获取所有图片文件"""
         self.image_files = []
@@ -1905,14 +2633,12 @@ class MobileSamWidget(QWidget):
         if not self.image_folder_path or not os.path.exists(self.image_folder_path):
             return
         
-        # 支持的图片格式
-        image_extensions = ['.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp']
-        
-        # 获取所有图片文件
-        for file in sorted(os.listdir(self.image_folder_path)):
-            file_path = os.path.join(self.image_folder_path, file)
-            if os.path.isfile(file_path) and os.path.splitext(file)[1].lower() in image_extensions:
-                self.image_files.append(file_path)
+        # 获取所有图片文件，scandir的目录项缓存了文件类型，无需逐个stat
+        with os.scandir(self.image_folder_path) as entries:
+            self.image_files = sorted(
+                entry.path for entry in entries
+                if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS and entry.is_file()
+            )
         
         # 更新计数器
         self._update_image_counter()
@@ -1934,39 +2660,85 @@ class MobileSamWidget(QWidget):
         
         # 更新当前索引
         self.current_image_index = index
+        self._update_image_counter()
         
         # 获取图片路径
         image_path = self.image_files[index]
         
+        # 已解码的图片直接显示
+        image = self._decoded_images.get(image_path)
+        if image is not None:
+            self._show_folder_image(index, image)
+            return
+        
+        # 在后台线程读取并解码图片，避免阻塞界面
+        self.viewer.status = "正在读取图片..."
+        self.decode_worker = create_worker(read_image, image_path, _ignore_errors=True)
+        self.decode_worker.returned.connect(lambda image: self._show_folder_image(index, image))
+        self.decode_worker.errored.connect(lambda e: show_error(f"加载图片失败: {str(e)}"))
+        self.decode_worker.start()
+    
+    def _show_folder_image(self, index, image):
+        """显示文件夹中已解码的图片并设置为当前图像（主线程）"""
+        # 快速切换时丢弃过期的解码结果
+        if index != self.current_image_index:
+            return
+        
+        # 缓存当前图片，返回浏览时无需再次读取
+        self._cache_decoded_image(self.image_files[index], image)
+        
         try:
-            # 读取图片
-            from skimage import io
-            image = io.imread(image_path)
-            
-            # 添加到napari查看器
-            if 'imported_image' in self.viewer.layers:
-                self.viewer.layers.remove('imported_image')
-            
-            self.viewer.add_image(image, name='imported_image')
+            # 添加到napari查看器，可复用时直接替换已有图层的数据
+            layer = self.viewer.layers['imported_image'] if 'imported_image' in self.viewer.layers else None
+            if self._can_reuse_image_layer(layer, image):
+                layer.data = image
+                layer.reset_contrast_limits_range()
+                layer.reset_contrast_limits()
+            else:
+                if layer is not None:
+                    self.viewer.layers.remove(layer)
+                self.viewer.add_image(image, name='imported_image')
             
-            # 自动设置为当前图像
+            # 自动设置为当前图像，完成后预编码后续图片
             self.image_combo.setCurrentText('imported_image')
+            self._prefetch_index = index
             self._set_current_image()
             
-            # 更新计数器
-            self._update_image_counter()
-            
             # 清除之前的标注
             self._clear_annotations()
             
         except Exception as e:
             show_error(f"加载图片失败: {str(e)}")
     
+    @staticmethod
+    def _can_reuse_image_layer(layer, image) -> bool:
+        """
+        检查已有的图像图层能否直接替换为新图片的数据
+        
+        替换数据只触发一次图层数据事件，避免移除和添加图层时图层列表、
+        画布和插件的图层处理函数各自更新一遍
+        
+        参数:
+            layer: 已有的图像图层，可以为None
+            image: 新图片数组
+            
+        返回:
+            是否可以直接替换数据
+        """
+        if not isinstance(layer, Image) or layer.multiscale:
+            return False
+        data = layer.data
+        return (
+            data.ndim == image.ndim
+            and data.dtype == image.dtype
+            and data.shape[2:] == image.shape[2:]
+        )
+    
     def _clear_annotations(self):
         """清除之前的标注"""
         # 清除Shapes图层
-        if '标注' in self.viewer.layers:
-            shapes_layer = self.viewer.layers['标注']
+        if self._annot_layer is not None:
+            shapes_layer = self._annot_layer
             shapes_layer.data = []
             # 重置特征数据
             if hasattr(shapes_layer, 'features'):
@@ -1983,9 +2755,10 @@ class MobileSamWidget(QWidget):
             self.viewer.layers.remove('掩码预览')
         
         # 重置结果
-        self.result_masks = []
-        self.result_scores = []
+        self.result_masks = np.empty((0, 0, 0), dtype=np.bool_)
+        self.result_scores = np.empty(0, dtype=np.float32)
         self.selected_mask_idx = 0
+        self._displayed_mask_key = None
         
         # 清空掩码列表
         self.mask_combo.clear()
@@ -2038,14 +2811,11 @@ class MobileSamWidget(QWidget):
         # 确保我们不会重复连接同一个图层
         if not hasattr(shapes_layer, '_mobilesam_connected'):
             # 监听数据变化事件
+            # 数据变化处理中同时更新点类型特征
             shapes_layer.events.data.connect(self._on_shapes_data_changed)
-            # 添加点事件监听
-            shapes_layer.events.data.connect(lambda e: self._update_shape_features(shapes_layer))
             shapes_layer.mouse_drag_callbacks.append(self._shapes_mouse_drag_callback)
             # 标记为已连接
             shapes_layer._mobilesam_connected = True
-            # 添加自动计时器，防止数据变化立即触发预测
-            shapes_layer._last_changed_time = time.time()
             
             # 初始化特征属性
             if not hasattr(shapes_layer, 'features'):
@@ -2062,8 +2832,19 @@ class MobileSamWidget(QWidget):
         # 鼠标释放时检查是否添加了新点
         if event.type == 'mouse_release' and event.button == 1:  # 左键点击
             # 延迟一点执行，确保shapes数据已完全更新
-            from qtpy.QtCore import QTimer
-            QTimer.singleShot(50, lambda: self._update_shape_features(layer))
+            self._schedule_feature_update(layer)
+    
+    def _schedule_feature_update(self, shapes_layer):
+        """重新开始计时，计时结束后更新图层的点类型特征"""
+        self._feature_layer = shapes_layer
+        self._feature_timer.start()
+    
+    def _flush_feature_update(self):
+        """立即执行等待中的点类型特征更新"""
+        self._feature_timer.stop()
+        shapes_layer, self._feature_layer = self._feature_layer, None
+        if shapes_layer is not None:
+            self._update_shape_features(shapes_layer)
     
     def _update_shape_features(self, shapes_layer):
         """更新shapes图层的特征属性，记录点类型"""
@@ -2075,8 +2856,7 @@ class MobileSamWidget(QWidget):
             shapes_layer.features = {}
         
         # 获取点形状的数量
-        point_shapes = [s for s, t in zip(shapes_layer.data, shapes_layer.shape_type) if t == 'point']
-        point_count = len(point_shapes)
+        point_count = np.count_nonzero(self._shape_types(shapes_layer) == 'point')
         
         # 获取当前点类型特征数组
         current_point_types = shapes_layer.features.get('point_type', np.array([], dtype=np.int32))
@@ -2109,25 +2889,23 @@ class MobileSamWidget(QWidget):
         # 获取触发事件的图层
         shapes_layer = event.source
         
-        # 更新shape特征
-        self._update_shape_features(shapes_layer)
+        # 移动或编辑已有形状时数量可能不变，直接使缓存的标注数据和形状类型失效
+        self._last_prompt = None
+        shapes_layer._mobilesam_shape_types = None
         
-        # 标记图层变化时间
-        current_time = time.time()
-        shapes_layer._last_changed_time = current_time
+        # 更新shape特征，连续的数据变化合并为一次更新
+        self._schedule_feature_update(shapes_layer)
         
         # 如果启用了自动预测，则延迟执行预测
         if self.auto_predict_check.isChecked() and self.model_loaded and self.current_image is not None:
             # 延迟执行，确保shapes已经稳定且用户完成操作
-            from qtpy.QtCore import QTimer
-            
             # 根据模式设置不同的延迟
             if self.prediction_mode == "点标注":
                 # 点标注模式下延迟短一些
-                delay = 100  # 100毫秒
+                delay = AUTO_PREDICT_DELAY_POINTS_MS
             else:
                 # 框选模式下延迟长一些，给用户调整框的时间
-                delay = 1000  # 1000毫秒，即1秒
+                delay = AUTO_PREDICT_DELAY_BOX_MS
                 
                 # 检查是否为矩形工具
                 if hasattr(shapes_layer, 'mode') and shapes_layer.mode != 'add_rectangle':
@@ -2135,23 +2913,44 @@ class MobileSamWidget(QWidget):
                     self.viewer.status = "框选标注模式需要使用矩形工具，请切换工具"
                     return
                 
-                # 检查是否有完整的矩形
-                complete_rectangles = [s for s in shapes_layer.data if 
-                                       s.shape == (4, 2) and 
-                                       shapes_layer.shape_type[shapes_layer.data.index(s)] == 'rectangle']
-                
-                if not complete_rectangles:
+                if not self._has_complete_rectangle(shapes_layer):
                     # 如果没有完整的矩形，不触发预测
                     return
             
-            # 防止重复触发，使用lambda捕获当前时间
-            QTimer.singleShot(delay, lambda t=current_time: self._delayed_prediction(t))
+            # 重新开始计时，拖动期间的连续变化只在最后一次变化后预测一次
+            self._predict_layer = shapes_layer
+            self._predict_timer.start(delay)
+    
+    @staticmethod
+    def _shape_types(shapes_layer) -> np.ndarray:
+        """
+        获取图层的形状类型数组，缓存在图层上供同一次变化触发的各个处理函数复用
+        
+        参数:
+            shapes_layer: napari的Shapes图层
+            
+        返回:
+            shape_types: 形状类型字符串数组，形状为(nshapes,)
+        """
+        shape_types = getattr(shapes_layer, '_mobilesam_shape_types', None)
+        if shape_types is None or len(shape_types) != shapes_layer.nshapes:
+            shape_types = np.asarray(shapes_layer.shape_type)
+            shapes_layer._mobilesam_shape_types = shape_types
+        return shape_types
+    
+    @classmethod
+    def _has_complete_rectangle(cls, shapes_layer):
+        """检查Shapes图层中是否有完整的矩形"""
+        rectangle_indices = np.flatnonzero(cls._shape_types(shapes_layer) == 'rectangle')
+        if len(rectangle_indices) == 0:
+            return False
+        data = shapes_layer.data
+        return any(np.shape(data[i]) == (4, 2) for i in rectangle_indices)
     
     def _select_input_directory(self):
         """选择输入目录"""
         # 打开目录选择对话框
-        dir_dialog = QFileDialog()
-        dir_path = dir_dialog.getExistingDirectory(
+        dir_path = QFileDialog.getExistingDirectory(
             self, "选择输入目录", ""
         )
         
@@ -2186,36 +2985,14 @@ class MobileSamWidget(QWidget):
         if len(point_types) == 0:
             return
         
-        # 获取点形状的索引
-        point_indices = [i for i, t in enumerate(shapes_layer.shape_type) if t == 'point']
+        # 获取点形状的掩码
+        is_point = self._shape_types(shapes_layer) == 'point'
         
-        if len(point_indices) == 0:
+        if not is_point.any():
             return
         
-        # 准备颜色列表
-        face_colors = []
-        edge_colors = []
-        
-        # 设置所有形状的默认颜色
-        for i in range(len(shapes_layer.data)):
-            if i in point_indices:
-                # 点形状，根据点类型设置颜色
-                idx = point_indices.index(i)
-                if idx < len(point_types):
-                    if point_types[idx] == 1:  # 前景点
-                        face_colors.append([0, 1, 0, 0.5])  # 绿色半透明
-                        edge_colors.append([0, 1, 0, 1])    # 绿色边缘
-                    else:  # 背景点
-                        face_colors.append([1, 0, 0, 0.5])  # 红色半透明
-                        edge_colors.append([1, 0, 0, 1])    # 红色边缘
-                else:
-                    # 默认颜色
-                    face_colors.append([0, 1, 0, 0.5])
-                    edge_colors.append([0, 1, 0, 1])
-            else:
-                # 非点形状使用默认颜色
-                face_colors.append([0, 0, 1, 0.3])  # 蓝色半透明
-                edge_colors.append([0, 0, 1, 1])    # 蓝色边缘
+        # 非点形状使用默认颜色，点形状根据点类型设置颜色
+        face_colors, edge_colors = shape_colors(is_point, point_types)
         
         # 更新shapes图层的颜色
         shapes_layer.face_color = face_colors
@@ -2223,130 +3000,40 @@ class MobileSamWidget(QWidget):
         shapes_layer.refresh()
 
     def _show_multimask_help(self):
-        """显示多掩码生成机制和得分依据的说明"""
-        help_dialog = QDialog(self)
-        help_dialog.setWindowTitle("关于多掩码生成与得分")
-        help_dialog.resize(600, 400)
-        help_dialog.setStyleSheet("""
-            QDialog {
-                background-color: #f2f2f7;
-                border-radius: 14px;
-            }
-            QLabel {
-                color: #000000;
-                font-weight: 600;
-                font-size: 16px;
-            }
-            QTextBrowser {
-                background-color: #ffffff;
-                border: none;
-                border-radius: 10px;
-                padding: 8px;
-                font-family: 'SF Pro Display', '-apple-system', 'Helvetica Neue', sans-serif;
-                font-size: 14px;
-            }
-            QPushButton {
-                background-color: #007aff;
-                color: white;
-                border: none;
-                border-radius: 10px;
-                padding: 8px 20px;
-                font-weight: 600;
-                min-height: 36px;
-            }
-            QPushButton:hover {
-                background-color: #0062cc;
-            }
-        """)
-        
-        layout = QVBoxLayout()
-        layout.setContentsMargins(20, 20, 20, 20)
-        layout.setSpacing(16)
-        
-        title_label = QLabel("多掩码生成机制与得分依据")
-        title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        title_label.setStyleSheet("font-size: 18px; margin-bottom: 10px;")
-        
-        help_text = QTextBrowser()
-        help_text.setOpenExternalLinks(True)
-        help_text.setHtml("""
-        <style>
-            body {
-                font-family: 'SF Pro Display', '-apple-system', 'Helvetica Neue', sans-serif;
-                line-height: 1.5;
-                color: #000000;
-            }
-            h3 {
-                color: #007aff;
-                font-weight: 600;
-                margin-top: 16px;
-                margin-bottom: 8px;
-            }
-            p {
-                margin: 8px 0;
-            }
-            ul, ol {
-                margin-top: 8px;
-                margin-bottom: 8px;
-            }
-            li {
-                margin-bottom: 4px;
-            }
-            a {
-                color: #007aff;
-                text-decoration: none;
-            }
-        </style>
-        
-        <h3>多掩码生成机制</h3>
-        <p>当启用"生成多个掩码候选"选项时，MobileSAM会为每个标注生成多个可能的掩码，这是通过在模型内部使用不同的解码器参数实现的。主要的多掩码生成过程包括：</p>
-        <ol>
-            <li><b>潜在掩码解码</b>：模型内部会从图像编码和提示编码中生成一组潜在掩码表示</li>
-            <li><b>多重阈值解码</b>：使用不同的稳定性阈值对潜在掩码进行解码，产生多个候选掩码</li>
-            <li><b>多级IoU预测</b>：针对每个候选掩码，预测其与真实掩码的IoU（交并比）得分</li>
-        </ol>
-        
-        <h3>得分依据</h3>
-        <p>掩码得分是模型内部的预测质量指标，主要反映这个掩码与"正确掩码"的匹配程度。得分越高表示模型对这个掩码的预测越有信心。具体而言：</p>
-        <ul>
-            <li><b>IoU预测值</b>：是模型预测的掩码与真实掩码可能的交并比。范围为0-1，越接近1表示质量越高</li>
-            <li><b>稳定性得分</b>：评估掩码在轻微的阈值变化下的稳定性</li>
-            <li><b>与提示的一致性</b>：评估掩码与用户输入的点或框的一致程度</li>
-        </ul>
-        
-        <h3>选择掩码的建议</h3>
-        <p>虽然系统默认选择得分最高的掩码，但您也可以：</p>
-        <ul>
-            <li>通过下拉菜单查看所有候选掩码</li>
-            <li>选择更符合您预期的掩码，即使其得分不是最高</li>
-            <li>如果最高得分的掩码不令人满意，可以添加更多的标注点（特别是负点/背景点）来优化结果</li>
-        </ul>
-        
-        <p>参考：<a href="https://github.com/ChaoningZhang/MobileSAM">MobileSAM 项目</a> | <a href="https://arxiv.org/abs/2304.02643">Segment Anything 论文</a></p>
-        """)
-        
-        close_btn = QPushButton("关闭")
-        close_btn.clicked.connect(help_dialog.close)
-        
-        layout.addWidget(title_label)
-        layout.addWidget(help_text)
-        layout.addWidget(close_btn)
+        """显示多掩码生成机制和得分依据的说明，对话框首次打开时创建并复用"""
+        if self._help_dialog is None:
+            help_dialog = QDialog(self)
+            help_dialog.setWindowTitle("关于多掩码生成与得分")
+            help_dialog.resize(600, 400)
+            help_dialog.setStyleSheet(_MULTIMASK_HELP_STYLE)
+            
+            layout = QVBoxLayout()
+            layout.setContentsMargins(20, 20, 20, 20)
+            layout.setSpacing(16)
+            
+            title_label = QLabel("多掩码生成机制与得分依据")
+            title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            title_label.setStyleSheet("font-size: 18px; margin-bottom: 10px;")
+            
+            help_text = QTextBrowser()
+            help_text.setOpenExternalLinks(True)
+            help_text.setHtml(_MULTIMASK_HELP_HTML)
+            
+            close_btn = QPushButton("关闭")
+            close_btn.clicked.connect(help_dialog.close)
+            
+            layout.addWidget(title_label)
+            layout.addWidget(help_text)
+            layout.addWidget(close_btn)
+            
+            help_dialog.setLayout(layout)
+            self._help_dialog = help_dialog
         
-        help_dialog.setLayout(layout)
-        help_dialog.exec_()
+        self._help_dialog.exec_()
 
     def _generate_label_color(self, label_id):
-        """生成标签的颜色"""
-        # 使用黄金分割比例来生成分布均匀的颜色
-        golden_ratio_conjugate = 0.618033988749895
-        h = (label_id * golden_ratio_conjugate) % 1.0
-        # 固定饱和度和明度，只变化色相
-        s = 0.8
-        v = 0.95
-        # 转换为RGB
-        r, g, b = colorsys.hsv_to_rgb(h, s, v)
-        # 返回RGBA格式
-        return [r, g, b, 1.0]
+        """生成标签的颜色，返回RGBA格式的列表"""
+        return _LABEL_COLOR_LUT[label_id & 0xFF].tolist()
 
     def _export_label_info(self):
         """导出标签信息到JSON文件"""
@@ -2355,18 +3042,17 @@ class MobileSamWidget(QWidget):
             return
         
         # 选择保存文件
-        file_dialog = QFileDialog()
-        file_path, _ = file_dialog.getSaveFileName(
+        file_path, _ = QFileDialog.getSaveFileName(
             self, "导出标签信息", "", "JSON文件 (*.json)"
         )
         
         if not file_path:
             return
         
-        # 准备导出数据
+        # 准备导出数据，整数键由write_json在序列化时转换为字符串
         export_data = {
             "labels": {
-                str(label_id): {
+                label_id: {
                     "name": name,
                     "color": self.label_colors.get(label_id, [0, 0, 0, 1])
                 } 
@@ -2380,8 +3066,7 @@ class MobileSamWidget(QWidget):
         
         # 导出到JSON
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, indent=2, ensure_ascii=False)
+            write_json(file_path, export_data)
             show_info(f"标签信息已导出到: {file_path}")
         except Exception as e:
             show_error(f"导出标签信息失败: {str(e)}")
@@ -2411,6 +3096,7 @@ class MobileSamWidget(QWidget):
             
             # 更新UI
             self.label_name_combo.clear()
+            self._label_name_index = []
             self.export_labels_btn.setEnabled(False)
             self.clear_labels_btn.setEnabled(False)
             
@@ -2424,7 +3110,7 @@ class MobileSamWidget(QWidget):
         
         # 获取当前掩码
         mask = self.result_masks[self.selected_mask_idx]
-        binary_mask = mask_to_binary(mask)
+        binary_mask = self._mask_to_binary(mask)
         
         # 检查是否已有预览图层
         preview_layer_name = "掩码预览"
@@ -2432,12 +3118,13 @@ class MobileSamWidget(QWidget):
         # 如果存在，更新它，否则创建新的
         if preview_layer_name in self.viewer.layers:
             # 更新现有图层
-            self.viewer.layers[preview_layer_name].data = binary_mask.astype(np.uint8) * 255
+            self._update_preview_layer(binary_mask)
         else:
             # 创建新的图层用于预览
             preview_layer = self.viewer.add_image(
-                binary_mask.astype(np.uint8) * 255,
+                binary_mask * 255,
                 name=preview_layer_name,
+                scale=self._layer_scale(binary_mask.ndim),
                 colormap="magenta",
                 opacity=0.5,
                 blending="additive"
@@ -2464,56 +3151,46 @@ class MobileSamWidget(QWidget):
         
         # 获取当前掩码
         mask = self.result_masks[self.selected_mask_idx]
-        binary_mask = mask_to_binary(mask)
-        
-        # 创建结构元素
-        kernel_size = 3
-        kernel = np.ones((kernel_size, kernel_size), np.uint8)
         
-        # 根据操作类型执行形态学操作
+        # 根据操作类型选择形态学操作
         if operation_type > 0:
-            # 扩张
-            adjusted_mask = cv2.dilate(binary_mask.astype(np.uint8), kernel, iterations=1)
-            operation_name = "扩张"
+            morph, operation_name = cv2.dilate, "扩张"
+        else:
+            morph, operation_name = cv2.erode, "收缩"
+        
+        if mask.dtype == np.bool_ and mask.flags.c_contiguous:
+            # 布尔掩码直接以0/1的uint8视图原地运算，无需二值化和写回
+            adjusted_mask = mask.view(np.uint8)
+            morph(adjusted_mask, self._morph_kernel, dst=adjusted_mask)
         else:
-            # 收缩
-            adjusted_mask = cv2.erode(binary_mask.astype(np.uint8), kernel, iterations=1)
-            operation_name = "收缩"
+            # 其他类型先二值化，结果写入复用的缓冲区后按原有数据类型写回
+            binary_mask = self._mask_to_binary(mask)
+            if self._morph_buf is None or self._morph_buf.shape != binary_mask.shape:
+                self._morph_buf = np.empty_like(binary_mask)
+            adjusted_mask = morph(binary_mask, self._morph_kernel, dst=self._morph_buf)
+            np.copyto(mask, adjusted_mask, casting="unsafe")
         
-        # 更新掩码
-        self.result_masks[self.selected_mask_idx] = adjusted_mask.astype(np.float32)
+        # 缓存中可能引用同一掩码，因此清空缓存
+        self._predict_cache.clear()
         
         # 更新显示
-        self._display_mask(self.result_masks[self.selected_mask_idx])
+        self._display_mask(mask)
         
         # 如果有预览图层，也更新它
         if "掩码预览" in self.viewer.layers:
-            self.viewer.layers["掩码预览"].data = adjusted_mask * 255
+            self._update_preview_layer(adjusted_mask)
         
         show_info(f"已{operation_name}掩码边界") 
 
-    def _delayed_prediction(self, changed_time):
-        """延迟执行预测，确保用户完成操作"""
-        # 查找Shapes图层
-        shapes_layers = [layer for layer in self.viewer.layers if isinstance(layer, Shapes)]
-        if not shapes_layers:
-            return
-            
-        shapes_layer = shapes_layers[0]
-        
-        # 检查时间戳是否匹配
-        if not hasattr(shapes_layer, '_last_changed_time') or shapes_layer._last_changed_time != changed_time:
-            # 时间戳不匹配，说明在延迟期间又发生了变化，不执行预测
+    def _delayed_prediction(self):
+        """防抖计时结束后执行预测，此时标注已停止变化"""
+        shapes_layer, self._predict_layer = self._predict_layer, None
+        if shapes_layer is None or shapes_layer not in self.viewer.layers:
             return
             
         # 在框选模式下，进行额外检查
         if self.prediction_mode == "框选标注":
-            # 检查是否有完整的矩形
-            complete_rectangles = [s for s in shapes_layer.data if 
-                                  s.shape == (4, 2) and 
-                                  shapes_layer.shape_type[shapes_layer.data.index(s)] == 'rectangle']
-            
-            if not complete_rectangles:
+            if not self._has_complete_rectangle(shapes_layer):
                 # 如果没有完整的矩形，不触发预测
                 return
                 
@@ -1,22 +1,71 @@
 import os
+import logging
+import hashlib
+import contextlib
 import torch
+import torch.nn.functional as F
 import numpy as np
 from typing import Tuple, List, Optional
-import cv2
+from collections import OrderedDict
 
-# 确保可以直接导入MobileSAM
+from .utils import to_rgb_uint8, image_hash, IS_MAC_ARM64
+
+logger = logging.getLogger(__name__)
+
+# 可选依赖：TensorRT，用于加载scripts/build_trt_engine.py构建的图像编码器引擎
+try:
+    import tensorrt as trt
+except ImportError:
+    trt = None
+
+# 图像嵌入缓存的最大条目数
+EMBED_CACHE_SIZE = 4
+
+# 界面精度选项到CUDA自动混合精度类型的映射，未指定时使用FP16
+AUTOCAST_DTYPES = {
+    None: torch.float16,
+    "fp16": torch.float16,
+    "bf16": torch.bfloat16,
+    "fp32": None,
+}
+
+# set_image_batch每次编码器前向计算的最大图像数，限制预处理输入占用的显存
+ENCODE_BATCH_SIZE = 8
+
+# 预分配的提示点缓冲区容量，超出时按需扩容
+MAX_PROMPT_POINTS = 64
+
+# CUDA上torch.compile编码器的编译模式，reduce-overhead使用CUDA Graph减少内核启动开销
+COMPILE_MODE = "reduce-overhead"
+
+# 编译后的预热次数，CUDA Graph在前几次调用时完成录制
+COMPILE_WARMUP_STEPS = 3
+
+# 自动分割每批解码的网格点数，CUDA上增大批次减少解码器调用次数
+AMG_POINTS_PER_BATCH = {"cuda": 256}
+AMG_DEFAULT_POINTS_PER_BATCH = 64
+
+# 模型权重旁的TensorRT编码器引擎文件名，存在时CUDA上优先使用
+TRT_ENGINE_NAME = "mobile_sam_vit_t.plan"
+
+# TorchScript编码器的缓存目录
+TORCHSCRIPT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "napari-mobilesam")
+
+# MobileSAM的安装地址
+MOBILESAM_PIP_URL = "git+https://github.com/ChaoningZhang/MobileSAM.git"
+
+# 导入MobileSAM，未安装时直接报错，设置环境变量MOBILESAM_AUTOINSTALL=1时才自动安装
 try:
     from mobile_sam import SamPredictor, sam_model_registry, SamAutomaticMaskGenerator
 except ImportError:
-    # 如果无法直接导入，则克隆仓库
+    if os.environ.get("MOBILESAM_AUTOINSTALL") != "1":
+        raise ImportError(f"未安装MobileSAM，请运行: pip install {MOBILESAM_PIP_URL}")
+    
     import subprocess
     import sys
     
-    print("未找到mobile_sam，正在尝试下载...")
-    subprocess.run([
-        sys.executable, "-m", "pip", "install", 
-        "git+https://github.com/ChaoningZhang/MobileSAM.git"
-    ])
+    logger.info("未找到mobile_sam，正在尝试下载...")
+    subprocess.run([sys.executable, "-m", "pip", "install", MOBILESAM_PIP_URL], check=True)
     
     from mobile_sam import SamPredictor, sam_model_registry, SamAutomaticMaskGenerator
 
@@ -35,16 +84,110 @@ def add_reset_method_to_predictor():
 # 确保有reset_image方法
 add_reset_method_to_predictor()
 
+
+class TracedImageEncoder(torch.nn.Module):
+    """TorchScript编码器的包装，保留SamPredictor和预处理需要的img_size属性"""
+    
+    def __init__(self, traced, img_size: int):
+        super().__init__()
+        self.traced = traced
+        self.img_size = img_size
+    
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.traced(x)
+
+class CompiledImageEncoder(torch.nn.Module):
+    """torch.compile编码器的包装，保留img_size属性并复制输出"""
+    
+    def __init__(self, compiled, img_size: int):
+        super().__init__()
+        self.compiled = compiled
+        self.img_size = img_size
+    
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        # CUDA Graph的输出位于复用的内存池中，下次调用会被覆盖，缓存的嵌入需要独立的副本
+        return self.compiled(x).clone()
+
+class TensorRTImageEncoder(torch.nn.Module):
+    """TensorRT引擎编码器的包装，输入输出为固定形状的FP32张量，在当前CUDA流上执行"""
+    
+    def __init__(self, engine, img_size: int):
+        super().__init__()
+        self.engine = engine
+        self.context = engine.create_execution_context()
+        self.img_size = img_size
+        names = [engine.get_tensor_name(i) for i in range(engine.num_io_tensors)]
+        self.input_name = next(
+            n for n in names if engine.get_tensor_mode(n) == trt.TensorIOMode.INPUT
+        )
+        self.output_name = next(
+            n for n in names if engine.get_tensor_mode(n) == trt.TensorIOMode.OUTPUT
+        )
+        self.output_shape = tuple(engine.get_tensor_shape(self.output_name))
+    
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        # 引擎按NCHW连续的FP32输入构建，channels_last或半精度输入需要先转换
+        x = x.float().contiguous()
+        # 每次分配新的输出，缓存的嵌入不会被下次调用覆盖
+        out = torch.empty(self.output_shape, dtype=torch.float32, device=x.device)
+        self.context.set_tensor_address(self.input_name, x.data_ptr())
+        self.context.set_tensor_address(self.output_name, out.data_ptr())
+        if not self.context.execute_async_v3(torch.cuda.current_stream(x.device).cuda_stream):
+            raise RuntimeError("TensorRT引擎执行失败")
+        return out
+
+class _FixedOutputMaskDecoder(torch.nn.Module):
+    """固定multimask_output的掩码解码器，供追踪使用"""
+    
+    def __init__(self, mask_decoder, multimask_output: bool):
+        super().__init__()
+        self.mask_decoder = mask_decoder
+        self.multimask_output = multimask_output
+    
+    def forward(self, image_embeddings, image_pe, sparse_prompt_embeddings, dense_prompt_embeddings):
+        return self.mask_decoder(
+            image_embeddings, image_pe, sparse_prompt_embeddings, dense_prompt_embeddings,
+            self.multimask_output
+        )
+
+
+class TracedMaskDecoder(torch.nn.Module):
+    """单掩码和多掩码两个TorchScript解码器的包装，接口与原掩码解码器一致"""
+    
+    def __init__(self, single, multi):
+        super().__init__()
+        self.single = single
+        self.multi = multi
+    
+    def forward(
+        self,
+        image_embeddings: torch.Tensor,
+        image_pe: torch.Tensor,
+        sparse_prompt_embeddings: torch.Tensor,
+        dense_prompt_embeddings: torch.Tensor,
+        multimask_output: bool,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        decoder = self.multi if multimask_output else self.single
+        return decoder(image_embeddings, image_pe, sparse_prompt_embeddings, dense_prompt_embeddings)
+
 class MobileSamWrapper:
     """MobileSAM模型的封装类，提供点和框预测功能"""
     
-    def __init__(self, model_path: str = None, force_device: str = None):
+    def __init__(
+        self,
+        model_path: str = None,
+        force_device: str = None,
+        precision: str = None,
+        compile_encoder: bool = True
+    ):
         """
         初始化MobileSAM模型
         
         参数:
             model_path: 模型权重路径，如未指定则使用默认路径
             force_device: 强制使用的设备，可选值: "cpu", "cuda", "mps"，若为None则自动选择
+            precision: CUDA上图像编码器的计算精度，可选值: "fp32", "fp16", "bf16"，若为None则使用FP16
+            compile_encoder: CUDA上是否使用torch.compile编译图像编码器
         """
         # 设置默认模型路径
         if model_path is None:
@@ -56,45 +199,39 @@ class MobileSamWrapper:
             # 如果找不到则使用预训练模型
             if not os.path.exists(model_path):
                 model_path = "mobile_sam"
-                print(f"未找到本地模型权重，将下载预训练模型")
+                logger.warning(f"未找到本地模型权重，将下载预训练模型")
         
         # 检测是否为Mac M系列芯片
-        is_mac_m_chip = False
-        try:
-            import platform
-            if platform.system() == "Darwin" and platform.machine() == "arm64":
-                is_mac_m_chip = True
-                if force_device == "mps":
-                    print("警告: 在Mac M系列芯片上使用MPS后端可能导致崩溃")
-                    print("如果程序崩溃，请重启程序并选择CPU后端")
-                elif force_device is None or force_device == "自动":
-                    # 如果未指定设备或选择自动，在Mac M系列上默认使用CPU
-                    force_device = "cpu"
-                    print("检测到Mac M系列芯片，默认使用CPU后端避免MPS崩溃")
-        except:
-            # 如果无法检测，则继续使用指定的设备
-            pass
+        is_mac_m_chip = IS_MAC_ARM64
+        if is_mac_m_chip:
+            if force_device == "mps":
+                logger.warning("警告: 在Mac M系列芯片上使用MPS后端可能导致崩溃")
+                logger.warning("如果程序崩溃，请重启程序并选择CPU后端")
+            elif force_device is None or force_device == "自动":
+                # 如果未指定设备或选择自动，在Mac M系列上默认使用CPU
+                force_device = "cpu"
+                logger.info("检测到Mac M系列芯片，默认使用CPU后端避免MPS崩溃")
         
         # 根据force_device参数选择设备
         if force_device is not None:
             if force_device in ["cpu", "cuda", "mps"]:
                 self.device = force_device
-                print(f"强制使用{self.device}后端进行推理")
+                logger.info(f"强制使用{self.device}后端进行推理")
             else:
-                print(f"不支持的设备类型: {force_device}，将自动选择设备")
+                logger.warning(f"不支持的设备类型: {force_device}，将自动选择设备")
                 force_device = None
         
         # 如果没有强制指定设备，则自动选择
         if force_device is None:
             if torch.backends.mps.is_available() and torch.backends.mps.is_built() and not is_mac_m_chip:
                 self.device = "mps"
-                print("使用MPS后端进行推理 - 注意：在M系列芯片上可能会出现段错误，如遇问题请切换到CPU后端")
+                logger.warning("使用MPS后端进行推理 - 注意：在M系列芯片上可能会出现段错误，如遇问题请切换到CPU后端")
             elif torch.cuda.is_available():
                 self.device = "cuda"
-                print("使用CUDA后端进行推理")
+                logger.info("使用CUDA后端进行推理")
             else:
                 self.device = "cpu"
-                print("使用CPU后端进行推理")
+                logger.info("使用CPU后端进行推理")
         
         # 加载模型
         try:
@@ -111,7 +248,7 @@ class MobileSamWrapper:
                 self.model.to(device=self.device)
             except Exception as e:
                 # 如果移到指定设备失败，使用CPU
-                print(f"无法将模型移到{self.device}设备: {str(e)}")
+                logger.warning(f"无法将模型移到{self.device}设备: {str(e)}")
                 self.device = "cpu"
                 self.model.to(device="cpu")
             
@@ -119,15 +256,15 @@ class MobileSamWrapper:
             try:
                 self.predictor = SamPredictor(self.model)
             except Exception as e:
-                print(f"初始化预测器失败: {str(e)}，尝试使用CPU")
+                logger.warning(f"初始化预测器失败: {str(e)}，尝试使用CPU")
                 self.device = "cpu"
                 self.model.to(device="cpu")
                 self.predictor = SamPredictor(self.model)
             
         except Exception as e:
             # 如果使用指定设备加载失败，尝试使用CPU
-            print(f"使用{self.device}设备加载模型失败: {str(e)}")
-            print("切换到CPU后端重试...")
+            logger.warning(f"使用{self.device}设备加载模型失败: {str(e)}")
+            logger.warning("切换到CPU后端重试...")
             self.device = "cpu"
             
             # 重新加载模型
@@ -139,10 +276,204 @@ class MobileSamWrapper:
             self.model.to(device="cpu")
             self.predictor = SamPredictor(self.model)
         
+        # MPS上先用小图检测一次编码和解码，失败时永久切换到CPU，而不是每次设置图像时在设备间移动模型
+        if self.device == "mps":
+            self._check_mps()
+        
+        # CPU和CUDA上使用channels_last内存格式，匹配oneDNN/cuDNN偏好的卷积布局
+        self.channels_last = self.device in ("cpu", "cuda")
+        if self.channels_last:
+            self.model.image_encoder.to(memory_format=torch.channels_last)
+        
+        # 原始的eager编码器，下面替换为固定形状的编码器后仍用于多张图像的批量前向计算
+        self._eager_encoder = self.model.image_encoder
+        
+        # 自动混合精度只用于CUDA上的图像编码器，CPU和MPS上以FP32运行
+        self.autocast_dtype = AUTOCAST_DTYPES.get(precision) if self.device == "cuda" else None
+        
+        # CUDA上FP32矩阵乘法和卷积使用TF32张量核心，作用于FP32精度选项和掩码解码器
+        if self.device == "cuda":
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+        
+        # CPU上使用冻结并优化的TorchScript编码器，融合Conv+BN并省去Python调度开销
+        if self.device == "cpu":
+            self._use_traced_encoder(model_path)
+        
+        # CUDA上优先使用预先构建的TensorRT引擎，否则编译图像编码器
+        # 输入固定为1024x1024，编译一次后不会重新编译
+        use_trt = self.device == "cuda" and self._use_trt_encoder(model_path)
+        if self.device == "cuda" and compile_encoder and not use_trt:
+            self._use_compiled_encoder()
+        
+        # CPU和CUDA上追踪掩码解码器，省去每次点击的Python调度开销
+        # MPS上出错时模型会切换到CPU，而冻结后的常量不会随之移动，因此保持原解码器
+        if self.device in ("cpu", "cuda"):
+            self._use_traced_decoder()
+        
         self.mask_generator = None
+        self._mask_generator_config = None  # 当前mask_generator的参数，参数变化时重新创建
         self.image_embeddings = None
         self.current_image = None
+        
+        # 按图像哈希缓存的图像嵌入，重复设置同一图像时跳过编码器
+        self._embed_cache = OrderedDict()
+        
+        # 最近一次set_image_batch的图像嵌入，按输入顺序排列，预测时可按索引选择
+        self._batch_embeddings = []
+        
+        # 预分配的提示缓冲区，每次预测原地写入，CUDA上经锁页内存异步拷贝
+        self._prompt_bufs = None
+        
+        # 缓存的提示编码器位置编码，只与嵌入尺寸和设备有关
+        self._dense_pe = None
+        
+        # 预分配的编码器输入缓冲区，每次设置图像时原地写入归一化和填充后的图像
+        self._input_buf = None
     
+    def _check_mps(self) -> None:
+        """在MPS上运行一次小图的编码和预测，失败时切换到CPU后端"""
+        try:
+            with torch.no_grad():
+                self.predictor.set_image(np.zeros((64, 64, 3), dtype=np.uint8))
+                self.predictor.predict(
+                    point_coords=np.array([[32.0, 32.0]]), point_labels=np.array([1])
+                )
+            self.predictor.reset_image()
+            logger.info("MPS后端检测通过，图像嵌入直接在MPS上计算")
+        except Exception as e:
+            logger.warning(f"MPS后端检测失败: {str(e)}，切换到CPU后端")
+            self._switch_to_cpu()
+    
+    def _switch_to_cpu(self) -> None:
+        """将模型和预测器永久切换到CPU"""
+        self.device = "cpu"
+        self.model.to("cpu")
+        self.predictor = SamPredictor(self.model)
+    
+    def _use_traced_encoder(self, model_path: str) -> None:
+        """
+        加载或生成TorchScript编码器并替换模型中的图像编码器，失败时保留原编码器
+        
+        参数:
+            model_path: 模型权重路径，用于区分不同权重的缓存文件
+        """
+        encoder = self.model.image_encoder
+        try:
+            # 权重文件或PyTorch版本变化时重新生成
+            mtime = os.path.getmtime(model_path) if os.path.exists(model_path) else 0
+            key = f"{os.path.abspath(model_path)}|{mtime}|{torch.__version__}"
+            digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+            cache_path = os.path.join(TORCHSCRIPT_CACHE_DIR, f"image_encoder_{digest}.pt")
+            
+            if os.path.exists(cache_path):
+                traced = torch.jit.load(cache_path, map_location="cpu")
+            else:
+                logger.info("正在生成TorchScript编码器，首次运行需要一些时间...")
+                example = torch.zeros(1, 3, encoder.img_size, encoder.img_size)
+                if self.channels_last:
+                    example = example.contiguous(memory_format=torch.channels_last)
+                with torch.no_grad():
+                    traced = torch.jit.freeze(torch.jit.trace(encoder.eval(), example))
+                os.makedirs(TORCHSCRIPT_CACHE_DIR, exist_ok=True)
+                torch.jit.save(traced, cache_path)
+            
+            # 优化后的图包含无法序列化的MKLDNN常量，因此在加载后再优化
+            traced = torch.jit.optimize_for_inference(traced)
+            self.model.image_encoder = TracedImageEncoder(traced, encoder.img_size)
+            logger.info("使用TorchScript编码器进行推理")
+        except Exception as e:
+            logger.warning(f"TorchScript编码器不可用，使用原始编码器: {str(e)}")
+            self.model.image_encoder = encoder
+    
+    def _use_trt_encoder(self, model_path: str) -> bool:
+        """
+        加载模型权重旁的TensorRT引擎并替换模型中的图像编码器
+        
+        参数:
+            model_path: 模型权重路径，引擎文件位于同一目录
+            
+        返回:
+            success: 是否使用了TensorRT编码器
+        """
+        if trt is None:
+            return False
+        engine_path = os.path.join(os.path.dirname(os.path.abspath(model_path)), TRT_ENGINE_NAME)
+        if not os.path.exists(engine_path):
+            return False
+        try:
+            # 引擎绑定到当前CUDA设备
+            with torch.cuda.device(self.predictor.device):
+                runtime = trt.Runtime(trt.Logger(trt.Logger.WARNING))
+                with open(engine_path, "rb") as f:
+                    engine = runtime.deserialize_cuda_engine(f.read())
+                if engine is None:
+                    raise RuntimeError("引擎与当前GPU或TensorRT版本不兼容，请重新构建")
+                self.model.image_encoder = TensorRTImageEncoder(
+                    engine, self.model.image_encoder.img_size
+                )
+            # 引擎内部已按构建时的精度运行，编码器不再需要自动混合精度
+            self.autocast_dtype = None
+            logger.info(f"使用TensorRT编码器进行推理: {engine_path}")
+            return True
+        except Exception as e:
+            logger.warning(f"TensorRT编码器不可用，使用原始编码器: {str(e)}")
+            return False
+    
+    def _use_compiled_encoder(self) -> None:
+        """使用torch.compile编译图像编码器并预热，失败时保留原编码器"""
+        encoder = self.model.image_encoder
+        if not hasattr(torch, "compile"):
+            return
+        try:
+            logger.info("正在编译图像编码器，首次运行需要一些时间...")
+            compiled = CompiledImageEncoder(
+                torch.compile(encoder.eval(), mode=COMPILE_MODE, dynamic=False), encoder.img_size
+            )
+            
+            # 以与set_image相同的输入格式和精度预热，首次预测时无需等待编译
+            example = torch.zeros(1, 3, encoder.img_size, encoder.img_size, device=self.predictor.device)
+            if self.channels_last:
+                example = example.contiguous(memory_format=torch.channels_last)
+            with torch.no_grad(), self._autocast():
+                for _ in range(COMPILE_WARMUP_STEPS):
+                    compiled(example)
+            torch.cuda.synchronize(self.predictor.device)
+            
+            self.model.image_encoder = compiled
+            logger.info("使用torch.compile编码器进行推理")
+        except Exception as e:
+            logger.warning(f"torch.compile编码器不可用，使用原始编码器: {str(e)}")
+            self.model.image_encoder = encoder
+    
+    def _use_traced_decoder(self) -> None:
+        """追踪并冻结掩码解码器，提示点数量和批大小保持动态，失败时保留原解码器"""
+        decoder = self.model.mask_decoder
+        prompt_encoder = self.model.prompt_encoder
+        try:
+            device = self.predictor.device
+            embeddings = torch.zeros(
+                1, prompt_encoder.embed_dim, *prompt_encoder.image_embedding_size, device=device
+            )
+            points = (
+                torch.zeros(1, 2, 2, device=device),
+                torch.ones(1, 2, dtype=torch.int, device=device),
+            )
+            with torch.no_grad():
+                sparse, dense = prompt_encoder(points=points, boxes=None, masks=None)
+                example = (embeddings, prompt_encoder.get_dense_pe(), sparse, dense)
+                single, multi = (
+                    torch.jit.freeze(torch.jit.trace(
+                        _FixedOutputMaskDecoder(decoder, multimask).eval(), example, check_trace=False
+                    ))
+                    for multimask in (False, True)
+                )
+            self.model.mask_decoder = TracedMaskDecoder(single, multi)
+        except Exception as e:
+            logger.warning(f"TorchScript解码器不可用，使用原始解码器: {str(e)}")
+            self.model.mask_decoder = decoder
+    
+    @torch.inference_mode()
     def set_image(self, image: np.ndarray) -> None:
         """
         设置当前图像并计算图像嵌入
@@ -154,62 +485,412 @@ class MobileSamWrapper:
             # 输入检查
             if image is None:
                 raise ValueError("输入图像不能为None")
-            
-            # 复制图像数据以避免修改原始数据
-            image = image.copy()
-            
-            # 转换图像格式
-            if image.ndim == 2:
-                # 灰度图转RGB
-                image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-            elif image.ndim == 3:
-                if image.shape[2] > 3:
-                    # 多通道图像只保留RGB通道
-                    image = image[:, :, :3]
-                # 确保数据类型为uint8
-                if image.dtype != np.uint8:
-                    if image.max() <= 1.0:
-                        image = (image * 255).astype(np.uint8)
-                    else:
-                        image = image.astype(np.uint8)
-            
-            # 在CPU上预处理图像，避免MPS错误
+
+            # 命中缓存时直接恢复图像嵌入
+            cache_key = image_hash(image)
+            if self._restore_cached_embedding(cache_key):
+                return
+
+            # 转换为RGB uint8格式
+            image = to_rgb_uint8(image)
+
+            self.current_image = image
             if self.device == "mps":
+                # 初始化时已检测MPS可用，这里出错时同样永久切换到CPU
                 try:
-                    # 计算图像嵌入前先将图像传输到CPU，然后再传回MPS
-                    # 这有助于避免某些MPS错误
-                    self.current_image = image
-                    with torch.no_grad():
-                        self.predictor.reset_image()
-                        # 在CPU上设置图像
-                        self.predictor.model.to("cpu")
-                        self.predictor.set_image(image)
-                        # 将模型移回MPS设备
-                        self.predictor.model.to(self.device)
-                        self.image_embeddings = True  # 标记已计算嵌入
+                    self.predictor.set_image(image)
                 except Exception as e:
-                    print(f"在MPS设备上设置图像时出错: {str(e)}")
-                    print("切换到CPU后端...")
-                    self.device = "cpu"
-                    self.model.to("cpu")
-                    self.predictor = SamPredictor(self.model)
+                    logger.warning(f"在MPS设备上设置图像时出错: {str(e)}")
+                    logger.warning("切换到CPU后端...")
+                    self._switch_to_cpu()
                     self.predictor.set_image(image)
-                    self.image_embeddings = True
             else:
                 # 对于CPU和CUDA后端，直接设置图像
-                self.current_image = image
-                self.predictor.set_image(image)
-                self.image_embeddings = True  # 标记已计算嵌入
+                with self._autocast():
+                    if self.channels_last:
+                        self._set_image_channels_last(image)
+                    else:
+                        self.predictor.set_image(image)
+            # 解码器使用FP32嵌入
+            self.predictor.features = self.predictor.features.float()
+            self.image_embeddings = True  # 标记已计算嵌入
+            
+            self._cache_embedding(cache_key)
             
         except Exception as e:
             self.image_embeddings = False
             raise ValueError(f"设置图像失败: {str(e)}")
     
+    def set_image_batch(self, images: List[np.ndarray]) -> None:
+        """
+        批量计算多张图像的嵌入并存入缓存，不改变当前图像，
+        之后可通过预测方法的image_index参数按输入顺序选择图像
+        
+        参数:
+            images: RGB格式的图像数组列表
+        """
+        order, embeddings = [], {}
+        keys, rgb_images, input_sizes, inputs = [], [], [], []
+        for image in images:
+            cache_key = image_hash(image)
+            order.append(cache_key)
+            if cache_key in embeddings or cache_key in keys:
+                continue
+            if cache_key in self._embed_cache:
+                embeddings[cache_key] = self._embed_cache[cache_key]
+                continue
+            image = to_rgb_uint8(image)
+            input_image_torch = self._input_tensor(image)
+            keys.append(cache_key)
+            rgb_images.append(image)
+            input_sizes.append(tuple(input_image_torch.shape[-2:]))
+            # 归一化并填充为1024x1024，不同尺寸的图像可以拼接为一批
+            inputs.append(self.model.preprocess(input_image_torch.float()))
+            if len(inputs) == ENCODE_BATCH_SIZE:
+                self._encode_batch(keys, rgb_images, input_sizes, inputs, embeddings)
+                keys, rgb_images, input_sizes, inputs = [], [], [], []
+        if inputs:
+            self._encode_batch(keys, rgb_images, input_sizes, inputs, embeddings)
+        
+        self._batch_embeddings = [embeddings[key] for key in order]
+    
+    @torch.inference_mode()
+    def _encode_batch(
+        self,
+        keys: List[int],
+        rgb_images: List[np.ndarray],
+        input_sizes: List[Tuple[int, int]],
+        inputs: List[torch.Tensor],
+        embeddings: dict
+    ) -> None:
+        """
+        一次编码器前向计算一批预处理后的图像，结果写入embeddings并存入缓存
+        
+        参数:
+            keys: 每张图像的哈希
+            rgb_images: RGB uint8图像
+            input_sizes: 缩放后的输入尺寸
+            inputs: 预处理后的(1,3,1024,1024)输入张量
+            embeddings: 输出字典，图像哈希到嵌入元组
+        """
+        batch = torch.cat(inputs).to(self.device)
+        if self.channels_last:
+            batch = batch.contiguous(memory_format=torch.channels_last)
+        
+        encoder = self.model.image_encoder
+        if len(batch) > 1 and isinstance(
+            encoder, (TracedImageEncoder, CompiledImageEncoder, TensorRTImageEncoder)
+        ):
+            # 追踪、编译或TensorRT编码器固定了批大小为1，多张图像使用eager编码器一次前向计算
+            encoder = self._eager_encoder
+        with torch.no_grad(), self._autocast():
+            features = encoder(batch)
+        
+        # 解码器使用FP32嵌入
+        features = features.float()
+        for i, cache_key in enumerate(keys):
+            embedding = (
+                rgb_images[i], features[i:i + 1], rgb_images[i].shape[:2], input_sizes[i]
+            )
+            embeddings[cache_key] = embedding
+            self._embed_cache[cache_key] = embedding
+            self._embed_cache.move_to_end(cache_key)
+        while len(self._embed_cache) > EMBED_CACHE_SIZE:
+            self._embed_cache.popitem(last=False)
+    
+    def _use_batch_image(self, image_index: Optional[int]) -> None:
+        """指定了image_index时切换到set_image_batch()中对应图像的嵌入"""
+        if image_index is None:
+            return
+        if not 0 <= image_index < len(self._batch_embeddings):
+            raise IndexError(f"图像索引超出范围: {image_index}，请先使用set_image_batch()设置图像")
+        self.set_image_embedding(self._batch_embeddings[image_index])
+    
+    def _autocast(self):
+        """返回图像编码器的自动混合精度上下文，未启用时为空上下文"""
+        if self.autocast_dtype is None:
+            return contextlib.nullcontext()
+        return torch.autocast(device_type="cuda", dtype=self.autocast_dtype)
+    
+    def get_image_embedding(self) -> tuple:
+        """
+        获取当前图像的嵌入状态，可通过set_image_embedding()恢复
+        
+        返回:
+            embedding: (图像, 特征, 原图尺寸, 输入尺寸)元组
+        """
+        if not self.image_embeddings:
+            raise ValueError("请先使用set_image()方法设置图像")
+        return (
+            self.current_image,
+            self.predictor.features,
+            self.predictor.original_size,
+            self.predictor.input_size,
+        )
+    
+    def set_image_embedding(self, embedding: tuple) -> None:
+        """
+        恢复get_image_embedding()保存的嵌入状态，跳过图像编码器
+        
+        参数:
+            embedding: get_image_embedding()返回的元组
+        """
+        image, features, original_size, input_size = embedding
+        self.current_image = image
+        self.predictor.features = features
+        self.predictor.original_size = original_size
+        self.predictor.input_size = input_size
+        self.predictor.is_image_set = True
+        self.image_embeddings = True
+    
+    def _cache_embedding(self, key: int) -> None:
+        """缓存当前预测器的图像嵌入，超出容量时淘汰最久未使用的条目"""
+        self._embed_cache[key] = self.get_image_embedding()
+        self._embed_cache.move_to_end(key)
+        while len(self._embed_cache) > EMBED_CACHE_SIZE:
+            self._embed_cache.popitem(last=False)
+    
+    def _restore_cached_embedding(self, key: int) -> bool:
+        """从缓存恢复图像嵌入，未命中时返回False"""
+        if key not in self._embed_cache:
+            return False
+        self._embed_cache.move_to_end(key)
+        self.set_image_embedding(self._embed_cache[key])
+        return True
+    
+    def _set_image_channels_last(self, image: np.ndarray) -> None:
+        """
+        以channels_last内存格式计算图像嵌入，省去HWC到CHW的连续化拷贝
+        
+        参数:
+            image: RGB格式的uint8图像数组
+        """
+        input_image_torch = self._input_tensor(image)
+        
+        # 与SamPredictor.set_torch_image相同的状态更新，编码器输入写入预分配的缓冲区
+        predictor = self.predictor
+        predictor.reset_image()
+        predictor.original_size = image.shape[:2]
+        predictor.input_size = tuple(input_image_torch.shape[-2:])
+        predictor.features = self.model.image_encoder(self._preprocess_into_buffer(input_image_torch))
+        predictor.is_image_set = True
+    
+    def _preprocess_into_buffer(self, input_image_torch: torch.Tensor) -> torch.Tensor:
+        """
+        将缩放后的图像归一化并填充写入预分配的channels_last输入缓冲区，结果与model.preprocess一致
+        
+        参数:
+            input_image_torch: 缩放后的(1,3,h,w)图像张量
+            
+        返回:
+            buf: (1,3,img_size,img_size)编码器输入张量
+        """
+        buf = self._input_buf
+        if buf is None or buf.device != input_image_torch.device:
+            img_size = self.model.image_encoder.img_size
+            buf = torch.zeros(
+                (1, 3, img_size, img_size), dtype=torch.float32, device=input_image_torch.device
+            ).contiguous(memory_format=torch.channels_last)
+            self._input_buf = buf
+        
+        h, w = input_image_torch.shape[-2:]
+        region = buf[:, :, :h, :w]
+        region.copy_(input_image_torch)
+        region.sub_(self.model.pixel_mean).div_(self.model.pixel_std)
+        # 上一张图像的尺寸可能不同，填充区域重新置零
+        buf[:, :, h:, :].zero_()
+        buf[:, :, :h, w:].zero_()
+        return buf
+    
+    def _input_tensor(self, image: np.ndarray) -> torch.Tensor:
+        """
+        将图像缩放到编码器输入尺寸并转换为设备上的(1,3,H,W)张量
+        
+        参数:
+            image: RGB格式的uint8图像数组
+        
+        返回:
+            input_image_torch: 缩放后的图像张量，归一化和填充由预测器完成
+        """
+        if self.device == "cuda":
+            # 上传原始uint8图像，在GPU上缩放，传输量为float32输入的1/4且省去CPU缩放
+            image_torch = torch.from_numpy(np.ascontiguousarray(image)).pin_memory()
+            image_torch = image_torch.to(self.device, non_blocking=True)
+            image_torch = image_torch.permute(2, 0, 1)[None, :, :, :].float()
+            # ResizeLongestSide.apply_image_torch按批和通道维计算目标尺寸，这里按图像高宽计算
+            transform = self.predictor.transform
+            target_size = transform.get_preprocess_shape(
+                image.shape[0], image.shape[1], transform.target_length
+            )
+            return F.interpolate(
+                image_torch, target_size, mode="bilinear", align_corners=False, antialias=True
+            )
+        
+        input_image = self.predictor.transform.apply_image(image)
+        input_image_torch = torch.as_tensor(input_image, device=self.device)
+        # permute后的NCHW视图在内存中本身就是NHWC排列
+        return input_image_torch.permute(2, 0, 1)[None, :, :, :]
+    
+    def _prompt_buffers(self, num_points: int) -> dict:
+        """
+        获取预分配的提示缓冲区，容量不足或设备变化时重新分配
+        
+        参数:
+            num_points: 本次预测的提示点数量
+            
+        返回:
+            bufs: 设备缓冲区及对应的主机缓冲区
+        """
+        device = self.predictor.device
+        bufs = self._prompt_bufs
+        if bufs is None or bufs["points"].shape[1] < num_points or bufs["points"].device != device:
+            capacity = max(MAX_PROMPT_POINTS, num_points)
+            bufs = {
+                "points": torch.zeros((1, capacity, 2), dtype=torch.float32, device=device),
+                "labels": torch.zeros((1, capacity), dtype=torch.int32, device=device),
+                "box": torch.zeros((1, 4), dtype=torch.float32, device=device),
+            }
+            if device.type == "cuda":
+                # 锁页内存上的主机缓冲区，支持异步拷贝到显存
+                for name in ("points", "labels", "box"):
+                    bufs[name + "_host"] = torch.zeros_like(bufs[name], device="cpu").pin_memory()
+            else:
+                for name in ("points", "labels", "box"):
+                    bufs[name + "_host"] = bufs[name]
+            self._prompt_bufs = bufs
+        return bufs
+    
+    def _copy_prompt(self, bufs: dict, name: str, values: np.ndarray, length: int) -> torch.Tensor:
+        """将提示写入主机缓冲区并拷贝到设备缓冲区，返回长度为length的视图"""
+        host = bufs[name + "_host"][0, :length]
+        host.copy_(torch.from_numpy(values))
+        device_view = bufs[name][:, :length]
+        if device_view.data_ptr() != host.data_ptr():
+            device_view[0].copy_(host, non_blocking=True)
+        return device_view
+    
+    @torch.inference_mode()
+    def _predict(
+        self,
+        points: Optional[np.ndarray],
+        labels: Optional[np.ndarray],
+        box: Optional[np.ndarray],
+        multimask_output: bool
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        使用预分配的提示缓冲区运行提示/掩码解码器
+        
+        参数:
+            points: 原图坐标系下的提示点，形状为(N,2)，可为None
+            labels: 提示点类型，形状为(N,)，可为None
+            box: 边界框，形状为(4,)，可为None
+            multimask_output: 是否输出多个掩码候选
+            
+        返回:
+            masks: 预测的掩码数组
+            scores: 每个掩码的置信度分数
+        """
+        num_points = 0 if points is None else len(points)
+        bufs = self._prompt_buffers(num_points)
+        scale = self._coord_scale()
+        
+        # 与ResizeLongestSide.apply_coords/apply_boxes相同的FP64缩放，
+        # 转换为FP32由拷贝到缓冲区时完成，输入已是目标类型时asarray不复制
+        coords_torch, labels_torch, box_torch = None, None, None
+        if num_points > 0:
+            coords = np.multiply(np.asarray(points, dtype=np.float64), scale)
+            coords_torch = self._copy_prompt(bufs, "points", coords, num_points)
+            labels_torch = self._copy_prompt(
+                bufs, "labels", np.asarray(labels, dtype=np.int32), num_points
+            )
+        if box is not None:
+            box = np.multiply(np.asarray(box, dtype=np.float64).reshape(2, 2), scale)
+            box_torch = self._copy_prompt(bufs, "box", box.reshape(4), 4)
+        
+        masks, scores = self._predict_direct(coords_torch, labels_torch, box_torch, multimask_output)
+        return self._to_host(masks[0], scores[0].float())
+    
+    def _coord_scale(self) -> np.ndarray:
+        """原图坐标到编码器输入坐标的(x,y)缩放系数"""
+        old_h, old_w = self.predictor.original_size
+        transform = self.predictor.transform
+        new_h, new_w = transform.get_preprocess_shape(old_h, old_w, transform.target_length)
+        return np.array([new_w / old_w, new_h / old_h])
+    
+    def _predict_direct(
+        self,
+        coords_torch: Optional[torch.Tensor],
+        labels_torch: Optional[torch.Tensor],
+        box_torch: Optional[torch.Tensor],
+        multimask_output: bool
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        直接以缓存的图像嵌入调用提示编码器和掩码解码器，跳过SamPredictor.predict_torch
+        
+        参数:
+            coords_torch: 编码器坐标系下的提示点张量，可为None
+            labels_torch: 提示点类型张量，可为None
+            box_torch: 编码器坐标系下的边界框张量，可为None
+            multimask_output: 是否输出多个掩码候选
+            
+        返回:
+            masks: 原图尺寸的二值掩码张量
+            scores: 每个掩码的置信度分数张量
+        """
+        predictor = self.predictor
+        if not predictor.is_image_set:
+            raise RuntimeError("请先使用set_image()方法设置图像")
+        
+        features = predictor.features
+        prompt_encoder = self.model.prompt_encoder
+        # 位置编码在每次get_dense_pe()时都会对整个嵌入网格重新计算，这里只计算一次
+        if self._dense_pe is None or self._dense_pe.device != features.device:
+            self._dense_pe = prompt_encoder.get_dense_pe()
+        
+        points = (coords_torch, labels_torch) if coords_torch is not None else None
+        sparse_embeddings, dense_embeddings = prompt_encoder(
+            points=points, boxes=box_torch, masks=None
+        )
+        low_res_masks, scores = self.model.mask_decoder(
+            image_embeddings=features,
+            image_pe=self._dense_pe,
+            sparse_prompt_embeddings=sparse_embeddings,
+            dense_prompt_embeddings=dense_embeddings,
+            multimask_output=multimask_output,
+        )
+        
+        # 放大到原图尺寸并二值化
+        masks = self.model.postprocess_masks(
+            low_res_masks, predictor.input_size, predictor.original_size
+        )
+        return masks > self.model.mask_threshold, scores
+    
+    def _to_host(self, *tensors: torch.Tensor) -> Tuple[np.ndarray, ...]:
+        """
+        将预测结果拷回主机内存，CUDA上经锁页内存异步拷贝后统一同步一次
+        
+        参数:
+            tensors: 设备上的结果张量
+            
+        返回:
+            arrays: 对应的NumPy数组
+        """
+        if self.predictor.device.type != "cuda":
+            return tuple(t.cpu().numpy() for t in tensors)
+        
+        # 锁页内存由PyTorch的主机缓存分配器复用，每次返回独立的数组
+        hosts = tuple(torch.empty(t.shape, dtype=t.dtype, pin_memory=True) for t in tensors)
+        for host, t in zip(hosts, tensors):
+            host.copy_(t, non_blocking=True)
+        torch.cuda.current_stream(self.predictor.device).synchronize()
+        return tuple(host.numpy() for host in hosts)
+    
     def predict_from_points(
         self, 
         points: np.ndarray, 
         labels: np.ndarray, 
-        multimask_output: bool = True
+        multimask_output: bool = True,
+        image_index: Optional[int] = None
     ) -> Tuple[np.ndarray, np.ndarray, float]:
         """
         根据点标注预测分割掩码
@@ -218,25 +899,19 @@ class MobileSamWrapper:
             points: 点坐标数组，形状为(N,2)
             labels: 点标注类型（1表示前景，0表示背景），形状为(N,)
             multimask_output: 是否输出多个掩码候选
+            image_index: 可选，set_image_batch()中图像的索引，指定时使用该图像的嵌入
             
         返回:
             masks: 预测的掩码数组
             scores: 每个掩码的置信度分数
             best_idx: 最佳掩码的索引
         """
+        self._use_batch_image(image_index)
         if self.image_embeddings is None:
             raise ValueError("请先使用set_image()方法设置图像")
         
-        # 确保输入数据类型和设备正确
-        input_points = points.astype(np.float32)
-        input_labels = labels.astype(np.int32)
-        
         # 预测掩码
-        masks, scores, logits = self.predictor.predict(
-            point_coords=input_points,
-            point_labels=input_labels,
-            multimask_output=multimask_output,
-        )
+        masks, scores = self._predict(points, labels, None, multimask_output)
         
         # 找出最佳掩码
         best_idx = np.argmax(scores)
@@ -246,7 +921,8 @@ class MobileSamWrapper:
     def predict_from_box(
         self, 
         box: np.ndarray, 
-        multimask_output: bool = True
+        multimask_output: bool = True,
+        image_index: Optional[int] = None
     ) -> Tuple[np.ndarray, np.ndarray, float]:
         """
         根据边界框预测分割掩码
@@ -254,29 +930,23 @@ class MobileSamWrapper:
         参数:
             box: 边界框坐标数组，形状为(4,)，格式为[x1, y1, x2, y2]
             multimask_output: 是否输出多个掩码候选
+            image_index: 可选，set_image_batch()中图像的索引，指定时使用该图像的嵌入
             
         返回:
             masks: 预测的掩码数组
             scores: 每个掩码的置信度分数
             best_idx: 最佳掩码的索引
         """
+        self._use_batch_image(image_index)
         if self.image_embeddings is None:
             raise ValueError("请先使用set_image()方法设置图像")
         
-        # 确保输入数据类型正确
-        input_box = box.astype(np.float32)
-        
         # 确保框的格式正确
-        if input_box.shape != (4,):
+        if np.shape(box) != (4,):
             raise ValueError("边界框应为形状(4,)的数组，格式为[x1, y1, x2, y2]")
         
         # 预测掩码
-        masks, scores, logits = self.predictor.predict(
-            point_coords=None,
-            point_labels=None,
-            box=input_box[None, :],  # 添加批次维度
-            multimask_output=multimask_output,
-        )
+        masks, scores = self._predict(None, None, box, multimask_output)
         
         # 找出最佳掩码
         best_idx = np.argmax(scores)
@@ -288,7 +958,8 @@ class MobileSamWrapper:
         box: np.ndarray,
         points: np.ndarray,
         labels: np.ndarray,
-        multimask_output: bool = True
+        multimask_output: bool = True,
+        image_index: Optional[int] = None
     ) -> Tuple[np.ndarray, np.ndarray, float]:
         """
         结合边界框和点标注预测分割掩码
@@ -298,37 +969,30 @@ class MobileSamWrapper:
             points: 点坐标数组，形状为(N,2)
             labels: 点标注类型（1表示前景，0表示背景），形状为(N,)
             multimask_output: 是否输出多个掩码候选
+            image_index: 可选，set_image_batch()中图像的索引，指定时使用该图像的嵌入
             
         返回:
             masks: 预测的掩码数组
             scores: 每个掩码的置信度分数
             best_idx: 最佳掩码的索引
         """
+        self._use_batch_image(image_index)
         if self.image_embeddings is None:
             raise ValueError("请先使用set_image()方法设置图像")
         
-        # 确保输入数据类型正确
-        input_box = box.astype(np.float32)
-        input_points = points.astype(np.float32)
-        input_labels = labels.astype(np.int32)
-        
         # 确保框的格式正确
-        if input_box.shape != (4,):
+        if np.shape(box) != (4,):
             raise ValueError("边界框应为形状(4,)的数组，格式为[x1, y1, x2, y2]")
         
         # 预测掩码
-        masks, scores, logits = self.predictor.predict(
-            point_coords=input_points,
-            point_labels=input_labels,
-            box=input_box[None, :],  # 添加批次维度
-            multimask_output=multimask_output,
-        )
+        masks, scores = self._predict(points, labels, box, multimask_output)
         
         # 找出最佳掩码
         best_idx = np.argmax(scores)
         
         return masks, scores, best_idx
     
+    @torch.inference_mode()
     def generate_all_masks(
         self, 
         image: Optional[np.ndarray] = None,
@@ -355,15 +1019,18 @@ class MobileSamWrapper:
         elif self.current_image is None:
             raise ValueError("请先使用set_image()方法设置图像或提供图像参数")
         
-        # 延迟初始化MaskGenerator
-        if self.mask_generator is None:
+        # 延迟初始化MaskGenerator，参数变化时重新创建
+        config = (points_per_side, pred_iou_thresh, stability_score_thresh, min_mask_region_area)
+        if self.mask_generator is None or self._mask_generator_config != config:
             self.mask_generator = SamAutomaticMaskGenerator(
                 model=self.model,
                 points_per_side=points_per_side,
+                points_per_batch=AMG_POINTS_PER_BATCH.get(self.device, AMG_DEFAULT_POINTS_PER_BATCH),
                 pred_iou_thresh=pred_iou_thresh,
                 stability_score_thresh=stability_score_thresh,
                 min_mask_region_area=min_mask_region_area,
             )
+            self._mask_generator_config = config
         
         # 生成所有掩码
         masks = self.mask_generator.generate(self.current_image)
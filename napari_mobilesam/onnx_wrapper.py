@@ -0,0 +1,637 @@
+import os
+import logging
+import numpy as np
+from typing import Tuple, List, Optional
+from collections import OrderedDict
+import cv2
+
+from .utils import to_rgb_uint8, image_hash, normalize_pad
+
+logger = logging.getLogger(__name__)
+
+# onnxruntime为可选依赖，未安装时回退到PyTorch后端
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+# 设备到ONNX Runtime执行提供程序的映射（按优先级排列）
+DEVICE_PROVIDERS = {
+    "cuda": ["TensorrtExecutionProvider", "CUDAExecutionProvider", "CPUExecutionProvider"],
+    "mps": ["CoreMLExecutionProvider", "CPUExecutionProvider"],
+    "cpu": ["CPUExecutionProvider"],
+}
+
+# 执行提供程序到设备名称的映射，用于界面显示
+PROVIDER_DEVICES = {
+    "TensorrtExecutionProvider": "cuda",
+    "CUDAExecutionProvider": "cuda",
+    "CoreMLExecutionProvider": "mps",
+    "CPUExecutionProvider": "cpu",
+}
+
+# 不同精度对应的编码器文件名，可通过环境变量MOBILESAM_PRECISION选择
+ENCODER_FILENAMES = {
+    "fp32": "mobilesam_encoder.onnx",
+    "fp16": "mobilesam_encoder_fp16.onnx",
+    "int8": "mobilesam_encoder_int8.onnx",
+}
+DECODER_FILENAME = "mobilesam_decoder.onnx"
+
+# TensorRT引擎缓存目录，首次运行时构建引擎，之后直接加载
+TENSORRT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "napari-mobilesam", "tensorrt")
+
+# 运行在CUDA设备上的执行提供程序
+CUDA_PROVIDERS = ("TensorrtExecutionProvider", "CUDAExecutionProvider")
+
+# 支持FP16高效计算的执行提供程序
+FP16_PROVIDERS = ("CUDAExecutionProvider", "CoreMLExecutionProvider")
+
+# 图像嵌入缓存的最大条目数
+EMBED_CACHE_SIZE = 4
+
+# 编码器输入尺寸与归一化参数（与SAM预处理保持一致）
+IMG_SIZE = 1024
+PIXEL_MEAN = np.array([123.675, 116.28, 103.53], dtype=np.float32)
+PIXEL_STD = np.array([58.395, 57.12, 57.375], dtype=np.float32)
+
+
+def default_onnx_paths(precision: str = "fp32") -> Tuple[str, str]:
+    """
+    获取默认的ONNX模型路径
+
+    参数:
+        precision: 编码器精度，可选值: "fp32", "fp16", "int8"
+
+    返回:
+        encoder_path: 图像编码器ONNX模型路径
+        decoder_path: 提示/掩码解码器ONNX模型路径
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    weights_dir = os.path.join(os.path.dirname(current_dir), "mobile_sam_weights")
+    return (
+        os.path.join(weights_dir, ENCODER_FILENAMES[precision]),
+        os.path.join(weights_dir, DECODER_FILENAME),
+    )
+
+
+def preprocess_image(
+    image: np.ndarray,
+    channels_last: bool = True,
+    out: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    缩放、归一化并填充图像为编码器输入
+
+    参数:
+        image: RGB格式的uint8图像数组
+        channels_last: 是否输出NHWC布局，否则输出NCHW布局
+        out: 可选的预分配(1,1024,1024,3) float32缓冲区，归一化结果直接写入其中
+
+    返回:
+        input_image: 形状为(1,1024,1024,3)或(1,3,1024,1024)的float32数组
+        input_size: 缩放后(填充前)的图像尺寸(H,W)
+    """
+    h, w = image.shape[:2]
+    scale = IMG_SIZE / max(h, w)
+    new_h, new_w = int(h * scale + 0.5), int(w * scale + 0.5)
+
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    if out is None:
+        out = np.empty((1, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+
+    # 原地归一化，右下方向填充为正方形
+    normalize_pad(resized, PIXEL_MEAN, PIXEL_STD, out[0])
+
+    if not channels_last:
+        return np.ascontiguousarray(out.transpose(0, 3, 1, 2)), (new_h, new_w)
+    return out, (new_h, new_w)
+
+
+def default_num_threads() -> int:
+    """
+    获取ONNX Runtime算子内线程数
+
+    返回:
+        num_threads: 环境变量MOBILESAM_THREADS的值，未设置时为CPU核心数的一半
+    """
+    env_threads = os.environ.get("MOBILESAM_THREADS")
+    if env_threads:
+        return max(1, int(env_threads))
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def onnx_available(encoder_path: str = None, decoder_path: str = None) -> bool:
+    """
+    检查是否可以使用ONNX Runtime后端
+
+    参数:
+        encoder_path: 图像编码器ONNX模型路径，如未指定则使用默认路径
+        decoder_path: 解码器ONNX模型路径，如未指定则使用默认路径
+
+    返回:
+        available: onnxruntime已安装且模型文件存在时为True
+    """
+    if ort is None:
+        return False
+    default_encoder, default_decoder = default_onnx_paths()
+    encoder_path = encoder_path or default_encoder
+    decoder_path = decoder_path or default_decoder
+    return os.path.exists(encoder_path) and os.path.exists(decoder_path)
+
+
+class MobileSamOnnxWrapper:
+    """基于ONNX Runtime的MobileSAM封装类，接口与MobileSamWrapper一致"""
+
+    def __init__(
+        self,
+        encoder_path: str = None,
+        decoder_path: str = None,
+        force_device: str = None,
+        precision: str = None
+    ):
+        """
+        初始化ONNX Runtime推理会话
+
+        参数:
+            encoder_path: 图像编码器ONNX模型路径，如未指定则使用默认路径
+            decoder_path: 解码器ONNX模型路径，如未指定则使用默认路径
+            force_device: 强制使用的设备，可选值: "cpu", "cuda", "mps"，若为None则自动选择
+            precision: 默认编码器的精度，可选值: "fp32", "fp16", "int8"，若为None则读取环境变量MOBILESAM_PRECISION
+        """
+        if ort is None:
+            raise ImportError("未安装onnxruntime，请运行: pip install onnxruntime")
+
+        # 根据设备选择执行提供程序
+        available = ort.get_available_providers()
+        if force_device in DEVICE_PROVIDERS:
+            providers = [p for p in DEVICE_PROVIDERS[force_device] if p in available]
+        else:
+            if force_device is not None and force_device != "自动":
+                logger.warning(f"不支持的设备类型: {force_device}，将自动选择设备")
+            providers = [p for p in PROVIDER_DEVICES if p in available]
+
+        if encoder_path is None:
+            encoder_path = self._select_encoder_path(precision, providers)
+        decoder_path = decoder_path or default_onnx_paths()[1]
+
+        # TensorRT只用于固定输入尺寸的编码器，未指定fp32时以FP16构建引擎
+        if precision is None:
+            precision = os.environ.get("MOBILESAM_PRECISION", "").lower()
+        self.trt_fp16 = precision != "fp32"
+
+        # 解码器提示点数量可变，使用CUDA执行提供程序避免TensorRT反复构建引擎
+        decoder_providers = [p for p in providers if p != "TensorrtExecutionProvider"]
+
+        self.encoder_session = self._init_session(encoder_path, providers)
+        self.decoder_session = self._init_session(decoder_path, decoder_providers)
+
+        # 以编码器实际使用的执行提供程序作为当前设备
+        self.device = PROVIDER_DEVICES.get(self.encoder_session.get_providers()[0], "cpu")
+        logger.info(f"使用ONNX Runtime {self.device}后端进行推理")
+
+        # 新导出的编码器使用NHWC输入，旧模型仍为NCHW
+        encoder_input = self.encoder_session.get_inputs()[0]
+        self.channels_last = encoder_input.shape[-1] == 3
+
+        # FP16编码器需要半精度输入，同时减半主机到设备的拷贝量
+        if encoder_input.type == "tensor(float16)":
+            self.encoder_input_dtype = np.float16
+        else:
+            self.encoder_input_dtype = np.float32
+
+        # 新导出的解码器只输出低分辨率掩码，由OpenCV放大到原图尺寸
+        self.decoder_input_names = [i.name for i in self.decoder_session.get_inputs()]
+        self.decoder_output_names = [o.name for o in self.decoder_session.get_outputs()]
+
+        # CUDA后端使用IO绑定，FP32图像嵌入保留在显存中直接传给解码器
+        cuda_sessions = all(
+            session.get_providers()[0] in CUDA_PROVIDERS
+            for session in (self.encoder_session, self.decoder_session)
+        )
+        if cuda_sessions and self.encoder_session.get_outputs()[0].type == "tensor(float)":
+            self.binding_device = "cuda"
+        else:
+            self.binding_device = None
+
+        self.image_embeddings = None
+        self.current_image = None
+        self.orig_size = None
+        self.input_size = None
+        self.coord_scale = None
+        self._orig_im_size = None
+
+        # 按图像哈希缓存的图像嵌入，重复设置同一图像时跳过编码器
+        self._embed_cache = OrderedDict()
+
+        # 最近一次set_image_batch的图像嵌入，按输入顺序排列，预测时可按索引选择
+        self._batch_embeddings = []
+
+        # 预分配的编码器输入缓冲区，每次设置图像时复用
+        self._input_buf = None
+
+        # 解码器的空掩码提示输入不随提示变化，创建一次后复用
+        self._mask_input = np.zeros((1, 1, 256, 256), dtype=np.float32)
+        self._has_mask_input = np.zeros(1, dtype=np.float32)
+
+    def _select_encoder_path(self, precision: str = None, providers: List[str] = ()) -> str:
+        """
+        根据精度选择默认编码器模型，对应文件不存在时回退到FP32
+
+        参数:
+            precision: 编码器精度，若为None则读取环境变量MOBILESAM_PRECISION，
+                       未设置时在CUDA/CoreML上优先使用FP16
+            providers: 执行提供程序列表
+
+        返回:
+            encoder_path: 图像编码器ONNX模型路径
+        """
+        if precision is None:
+            precision = os.environ.get("MOBILESAM_PRECISION", "").lower()
+        if not precision:
+            fp16_path = default_onnx_paths("fp16")[0]
+            if providers and providers[0] in FP16_PROVIDERS and os.path.exists(fp16_path):
+                return fp16_path
+            precision = "fp32"
+
+        if precision not in ENCODER_FILENAMES:
+            logger.warning(f"不支持的精度: {precision}，将使用fp32")
+            precision = "fp32"
+
+        encoder_path = default_onnx_paths(precision)[0]
+        if precision != "fp32" and not os.path.exists(encoder_path):
+            logger.warning(f"未找到{precision}编码器模型，将使用fp32")
+            encoder_path = default_onnx_paths("fp32")[0]
+
+        return encoder_path
+
+    def _init_session(self, onnx_path: str, providers: List[str]):
+        """
+        创建ONNX Runtime推理会话
+
+        参数:
+            onnx_path: ONNX模型路径
+            providers: 执行提供程序列表
+
+        返回:
+            session: 推理会话
+        """
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # 限制线程数，避免与napari的Qt线程池争抢CPU
+        sess_options.intra_op_num_threads = default_num_threads()
+        sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # 复用内存分配，避免每次推理重新申请缓冲区
+        sess_options.enable_mem_pattern = True
+        sess_options.enable_cpu_mem_arena = True
+        sess_options.add_session_config_entry("session.dynamic_block_base", "4")
+        provider_options = [self._provider_options(provider) for provider in providers]
+        return ort.InferenceSession(
+            onnx_path, sess_options, providers=providers, provider_options=provider_options
+        )
+
+    def _provider_options(self, provider: str) -> dict:
+        """
+        获取执行提供程序的配置
+
+        参数:
+            provider: 执行提供程序名称
+
+        返回:
+            options: 配置字典，TensorRT启用引擎缓存和FP16
+        """
+        if provider != "TensorrtExecutionProvider":
+            return {}
+        os.makedirs(TENSORRT_CACHE_DIR, exist_ok=True)
+        return {
+            "trt_fp16_enable": self.trt_fp16,
+            "trt_engine_cache_enable": True,
+            "trt_engine_cache_path": TENSORRT_CACHE_DIR,
+        }
+
+    def _preprocess(self, image: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """
+        缩放、归一化并填充图像为编码器输入
+
+        参数:
+            image: RGB格式的uint8图像数组
+
+        返回:
+            input_image: 符合编码器输入布局和精度的数组
+            input_size: 缩放后(填充前)的图像尺寸(H,W)
+        """
+        if self._input_buf is None:
+            self._input_buf = np.empty((1, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+        input_image, input_size = preprocess_image(
+            image, self.channels_last, out=self._input_buf
+        )
+        return input_image.astype(self.encoder_input_dtype, copy=False), input_size
+
+    def _transform_coords(self, coords: np.ndarray) -> np.ndarray:
+        """将原图坐标[x, y]变换到编码器输入坐标系"""
+        return np.multiply(coords, self.coord_scale, dtype=np.float32)
+
+    def _set_sizes(self, orig_size: Tuple[int, int], input_size: Tuple[int, int]) -> None:
+        """记录原图和缩放后尺寸，并预先计算提示坐标的缩放系数"""
+        self.orig_size = orig_size
+        self.input_size = input_size
+        self.coord_scale = np.array(
+            [input_size[1] / orig_size[1], input_size[0] / orig_size[0]], dtype=np.float32
+        )
+        self._orig_im_size = np.array(orig_size, dtype=np.float32)
+
+    def set_image(self, image: np.ndarray) -> None:
+        """
+        设置当前图像并计算图像嵌入
+
+        参数:
+            image: RGB格式的图像数组
+        """
+        try:
+            # 输入检查
+            if image is None:
+                raise ValueError("输入图像不能为None")
+
+            # 命中缓存时直接恢复图像嵌入
+            cache_key = image_hash(image)
+            if cache_key in self._embed_cache:
+                self._embed_cache.move_to_end(cache_key)
+                self.set_image_embedding(self._embed_cache[cache_key])
+                return
+
+            embedding = self._encode(image)
+            self.set_image_embedding(embedding)
+            self._cache_embedding(cache_key, embedding)
+
+        except Exception as e:
+            self.image_embeddings = None
+            raise ValueError(f"设置图像失败: {str(e)}")
+
+    def set_image_batch(self, images: List[np.ndarray]) -> None:
+        """
+        预先计算多张图像的嵌入并存入缓存，不改变当前图像，
+        之后可通过预测方法的image_index参数按输入顺序选择图像
+
+        参数:
+            images: RGB格式的图像数组列表
+        """
+        # 导出的编码器批大小固定为1，逐张编码
+        embeddings = []
+        for image in images:
+            cache_key = image_hash(image)
+            embedding = self._embed_cache.get(cache_key)
+            if embedding is None:
+                embedding = self._encode(image)
+                self._cache_embedding(cache_key, embedding)
+            embeddings.append(embedding)
+        self._batch_embeddings = embeddings
+
+    def _use_batch_image(self, image_index: Optional[int]) -> None:
+        """指定了image_index时切换到set_image_batch()中对应图像的嵌入"""
+        if image_index is None:
+            return
+        if not 0 <= image_index < len(self._batch_embeddings):
+            raise IndexError(f"图像索引超出范围: {image_index}，请先使用set_image_batch()设置图像")
+        self.set_image_embedding(self._batch_embeddings[image_index])
+
+    def _encode(self, image: np.ndarray) -> tuple:
+        """
+        运行图像编码器
+
+        参数:
+            image: 图像数组
+
+        返回:
+            embedding: 与get_image_embedding()格式相同的元组
+        """
+        # 转换为RGB uint8格式
+        image = to_rgb_uint8(image)
+        input_image, input_size = self._preprocess(image)
+
+        # 运行图像编码器，解码器始终使用FP32嵌入
+        if self.binding_device is not None:
+            image_embeddings = self._encode_on_device(input_image)
+        else:
+            image_embeddings = self.encoder_session.run(
+                ["image_embeddings"], {"image": input_image}
+            )[0].astype(np.float32, copy=False)
+
+        return image, image_embeddings, image.shape[:2], input_size
+
+    def _cache_embedding(self, key: int, embedding: tuple) -> None:
+        """缓存图像嵌入，超出容量时淘汰最久未使用的条目"""
+        self._embed_cache[key] = embedding
+        self._embed_cache.move_to_end(key)
+        while len(self._embed_cache) > EMBED_CACHE_SIZE:
+            self._embed_cache.popitem(last=False)
+
+    def _upscale_masks(self, low_res_masks: np.ndarray) -> np.ndarray:
+        """
+        将低分辨率掩码logits放大到原图尺寸并二值化
+
+        参数:
+            low_res_masks: 解码器输出的低分辨率掩码，形状为(K,256,256)
+
+        返回:
+            masks: 原图尺寸的布尔掩码，形状为(K,H,W)
+        """
+        old_h, old_w = self.orig_size
+        # 放大到编码器输入、裁去填充、再缩放到原图，合并为一次仿射变换
+        sx, sy = self.coord_scale * (low_res_masks.shape[-1] / IMG_SIZE)
+        matrix = np.array([[sx, 0, 0.5 * sx - 0.5], [0, sy, 0.5 * sy - 0.5]])
+
+        masks = np.empty((len(low_res_masks), old_h, old_w), dtype=bool)
+        for i, mask in enumerate(low_res_masks):
+            upscaled = cv2.warpAffine(
+                mask, matrix, (old_w, old_h),
+                flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                borderMode=cv2.BORDER_REPLICATE,
+            )
+            np.greater(upscaled, 0.0, out=masks[i])
+        return masks
+
+    def _encode_on_device(self, input_image: np.ndarray):
+        """
+        使用IO绑定运行图像编码器，输出保留在设备上
+
+        参数:
+            input_image: 预处理后的编码器输入
+
+        返回:
+            image_embeddings: 设备上的图像嵌入OrtValue
+        """
+        binding = self.encoder_session.io_binding()
+        binding.bind_ortvalue_input(
+            "image", ort.OrtValue.ortvalue_from_numpy(input_image, self.binding_device, 0)
+        )
+        binding.bind_output("image_embeddings", self.binding_device)
+        self.encoder_session.run_with_iobinding(binding)
+        return binding.get_outputs()[0]
+
+    def get_image_embedding(self) -> tuple:
+        """
+        获取当前图像的嵌入状态，可通过set_image_embedding()恢复
+
+        返回:
+            embedding: (图像, 图像嵌入, 原图尺寸, 输入尺寸)元组
+        """
+        if self.image_embeddings is None:
+            raise ValueError("请先使用set_image()方法设置图像")
+        return self.current_image, self.image_embeddings, self.orig_size, self.input_size
+
+    def set_image_embedding(self, embedding: tuple) -> None:
+        """
+        恢复get_image_embedding()保存的嵌入状态，跳过图像编码器
+
+        参数:
+            embedding: get_image_embedding()返回的元组
+        """
+        self.current_image, self.image_embeddings, orig_size, input_size = embedding
+        self._set_sizes(orig_size, input_size)
+
+    def _predict(
+        self,
+        point_coords: np.ndarray,
+        point_labels: np.ndarray,
+        multimask_output: bool
+    ) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        运行提示/掩码解码器
+
+        参数:
+            point_coords: 原图坐标系下的提示点，形状为(N,2)
+            point_labels: 提示点类型，形状为(N,)
+            multimask_output: 是否输出多个掩码候选
+
+        返回:
+            masks: 预测的掩码数组
+            scores: 每个掩码的置信度分数
+            best_idx: 最佳掩码的索引
+        """
+        if self.image_embeddings is None:
+            raise ValueError("请先使用set_image()方法设置图像")
+
+        decoder_inputs = {
+            "image_embeddings": self.image_embeddings,
+            "point_coords": self._transform_coords(point_coords)[None, :, :],
+            "point_labels": np.asarray(point_labels, dtype=np.float32)[None, :],
+            "mask_input": self._mask_input,
+            "has_mask_input": self._has_mask_input,
+            "orig_im_size": self._orig_im_size,
+        }
+        # 只输出低分辨率掩码的解码器没有orig_im_size输入
+        decoder_inputs = {name: decoder_inputs[name] for name in self.decoder_input_names}
+
+        if self.binding_device is not None:
+            # 图像嵌入已在设备上，只拷贝提示输入和掩码输出
+            binding = self.decoder_session.io_binding()
+            binding.bind_ortvalue_input("image_embeddings", decoder_inputs.pop("image_embeddings"))
+            for name, value in decoder_inputs.items():
+                binding.bind_cpu_input(name, value)
+            for name in self.decoder_output_names:
+                binding.bind_output(name)
+            self.decoder_session.run_with_iobinding(binding)
+            outputs = binding.copy_outputs_to_cpu()
+        else:
+            outputs = self.decoder_session.run(self.decoder_output_names, decoder_inputs)
+        outputs = dict(zip(self.decoder_output_names, outputs))
+
+        # 第0个输出为单掩码，其余为多掩码候选
+        mask_slice = slice(1, None) if multimask_output else slice(0, 1)
+        scores = outputs["iou_predictions"][0, mask_slice]
+        if "masks" in outputs:
+            masks = outputs["masks"][0, mask_slice] > 0.0
+        else:
+            masks = self._upscale_masks(outputs["low_res_masks"][0, mask_slice])
+
+        # 找出最佳掩码
+        best_idx = np.argmax(scores)
+
+        return masks, scores, best_idx
+
+    def predict_from_points(
+        self,
+        points: np.ndarray,
+        labels: np.ndarray,
+        multimask_output: bool = True,
+        image_index: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        根据点标注预测分割掩码
+
+        参数:
+            points: 点坐标数组，形状为(N,2)
+            labels: 点标注类型（1表示前景，0表示背景），形状为(N,)
+            multimask_output: 是否输出多个掩码候选
+            image_index: 可选，set_image_batch()中图像的索引，指定时使用该图像的嵌入
+
+        返回:
+            masks: 预测的掩码数组
+            scores: 每个掩码的置信度分数
+            best_idx: 最佳掩码的索引
+        """
+        self._use_batch_image(image_index)
+
+        # 没有框时需要添加一个填充点
+        coords = np.concatenate([points, np.zeros((1, 2))], axis=0)
+        labels = np.concatenate([labels, np.array([-1])], axis=0)
+        return self._predict(coords, labels, multimask_output)
+
+    def predict_from_box(
+        self,
+        box: np.ndarray,
+        multimask_output: bool = True,
+        image_index: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        根据边界框预测分割掩码
+
+        参数:
+            box: 边界框坐标数组，形状为(4,)，格式为[x1, y1, x2, y2]
+            multimask_output: 是否输出多个掩码候选
+            image_index: 可选，set_image_batch()中图像的索引，指定时使用该图像的嵌入
+
+        返回:
+            masks: 预测的掩码数组
+            scores: 每个掩码的置信度分数
+            best_idx: 最佳掩码的索引
+        """
+        return self.predict_from_box_and_points(
+            box, np.empty((0, 2)), np.empty(0), multimask_output, image_index
+        )
+
+    def predict_from_box_and_points(
+        self,
+        box: np.ndarray,
+        points: np.ndarray,
+        labels: np.ndarray,
+        multimask_output: bool = True,
+        image_index: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        结合边界框和点标注预测分割掩码
+
+        参数:
+            box: 边界框坐标数组，形状为(4,)，格式为[x1, y1, x2, y2]
+            points: 点坐标数组，形状为(N,2)
+            labels: 点标注类型（1表示前景，0表示背景），形状为(N,)
+            multimask_output: 是否输出多个掩码候选
+            image_index: 可选，set_image_batch()中图像的索引，指定时使用该图像的嵌入
+
+        返回:
+            masks: 预测的掩码数组
+            scores: 每个掩码的置信度分数
+            best_idx: 最佳掩码的索引
+        """
+        self._use_batch_image(image_index)
+        input_box = np.asarray(box, dtype=np.float32)
+
+        # 确保框的格式正确
+        if input_box.shape != (4,):
+            raise ValueError("边界框应为形状(4,)的数组，格式为[x1, y1, x2, y2]")
+
+        # 框的两个角点分别以标签2和3表示
+        coords = np.concatenate([points, input_box.reshape(2, 2)], axis=0)
+        labels = np.concatenate([labels, np.array([2, 3])], axis=0)
+        return self._predict(coords, labels, multimask_output)
@@ -1,18 +1,144 @@
 import numpy as np
-from typing import List, Tuple, Dict, Any, Optional
+import cv2
+from typing import List, Tuple, Dict, Any, Optional, Union
+from dataclasses import dataclass
 import os
 import json
 import datetime
 from pathlib import Path
-import uuid
+import secrets
+import hashlib
+import platform
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
+# xxhash为可选依赖，未安装时使用hashlib
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
-def shapes_to_points(shapes: List[Dict], labels: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+# orjson为可选依赖，未安装时使用标准库json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# tifffile为可选依赖（通常随scikit-image安装），用于内存映射读取大型TIFF
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+# blosc为可选依赖，用于压缩打包导出的掩码，未安装时使用zlib
+try:
+    import blosc
+except ImportError:
+    blosc = None
+
+# numba为可选依赖，未安装时使用NumPy实现
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+# 是否为Mac M系列芯片，进程内不变，导入时检测一次
+IS_MAC_ARM64 = platform.system() == "Darwin" and platform.machine() == "arm64"
+
+# 保存多个掩码时并行写文件的最大线程数
+SAVE_WORKERS = 4
+
+# 掩码打包文件(.blp)的文件头标识，其后为4字节头部长度、JSON头部和压缩数据
+MASK_BUNDLE_MAGIC = b"MSBL"
+
+# 超过该大小的TIFF以内存映射方式打开
+TIFF_MEMMAP_MIN_BYTES = 256 * 1024 * 1024
+
+# 形状类型编码
+SHAPE_POINT = 0
+SHAPE_RECTANGLE = 1
+SHAPE_OTHER = 2
+SHAPE_KINDS = {'point': SHAPE_POINT, 'rectangle': SHAPE_RECTANGLE}
+
+# 只读的前景点标签，默认标签直接返回其切片视图
+_POS_LABELS = np.ones(4096, dtype=np.int32)
+_POS_LABELS.flags.writeable = False
+
+
+@dataclass
+class ShapeBatch:
+    """
+    Shapes图层数据的结构数组(SoA)表示，便于向量化处理
+    
+    属性:
+        coords: 顶点坐标数组，形状为(N,max_pts,D)，不足的顶点以NaN填充
+        lengths: 每个形状的顶点数，形状为(N,)
+        kind: 形状类型编码，形状为(N,)，0表示点，1表示矩形，2表示其他
+    """
+    coords: np.ndarray
+    lengths: np.ndarray
+    kind: np.ndarray
+    
+    def __len__(self) -> int:
+        return len(self.kind)
+    
+    @classmethod
+    def from_arrays(cls, data: List[np.ndarray], shape_types: List[str]) -> "ShapeBatch":
+        """
+        根据顶点数组列表和形状类型列表构建
+        
+        参数:
+            data: 每个形状的顶点数组列表
+            shape_types: 每个形状的类型名称列表
+            
+        返回:
+            batch: ShapeBatch对象
+        """
+        n = len(data)
+        lengths = np.fromiter((len(d) for d in data), dtype=np.intp, count=n)
+        max_pts = int(lengths.max()) if n else 0
+        ndim = max((np.shape(d)[1] for d in data), default=2)
+        
+        coords = np.full((n, max_pts, ndim), np.nan)
+        for i, d in enumerate(data):
+            coords[i, :len(d)] = d
+        
+        kind = np.fromiter(
+            (SHAPE_KINDS.get(t, SHAPE_OTHER) for t in shape_types), dtype=np.uint8, count=n
+        )
+        return cls(coords=coords, lengths=lengths, kind=kind)
+    
+    @classmethod
+    def from_dicts(cls, shapes: List[Dict]) -> "ShapeBatch":
+        """根据{'data':..., 'shape_type':...}字典列表构建"""
+        return cls.from_arrays(
+            [s['data'] for s in shapes], [s['shape_type'] for s in shapes]
+        )
+    
+    @classmethod
+    def from_napari(cls, shapes_layer) -> "ShapeBatch":
+        """根据napari的Shapes图层构建"""
+        return cls.from_arrays(shapes_layer.data, shapes_layer.shape_type)
+
+
+def _as_shape_batch(shapes: Union[ShapeBatch, List[Dict]]) -> ShapeBatch:
+    """兼容字典列表形式的shapes数据"""
+    if isinstance(shapes, ShapeBatch):
+        return shapes
+    return ShapeBatch.from_dicts(shapes)
+
+
+def shapes_to_points(
+    shapes: Union[ShapeBatch, List[Dict]],
+    labels: List[int]
+) -> Tuple[np.ndarray, np.ndarray]:
     """
     将napari的Shapes图层中的点转换为MobileSAM所需的格式
     
     参数:
-        shapes: napari中Shapes图层的数据列表
+        shapes: ShapeBatch对象或napari中Shapes图层的数据列表
         labels: 对应每个点的标签列表(1表示前景，0表示背景)
         
     返回:
@@ -22,30 +148,32 @@ def shapes_to_points(shapes: List[Dict], labels: List[int]) -> Tuple[np.ndarray,
     if not shapes:
         return np.empty((0, 2)), np.empty(0)
     
-    # 只保留点类型的形状
-    point_shapes = [s for s in shapes if s['shape_type'] == 'point']
-    if not point_shapes:
-        return np.empty((0, 2)), np.empty(0)
+    batch = _as_shape_batch(shapes)
     
-    # 提取点坐标 - 注意坐标转换
-    points = np.array([s['data'][0] for s in point_shapes])
+    # 只保留点类型的形状，每个点形状只有一个顶点
+    points = batch.coords[batch.kind == SHAPE_POINT, 0]
+    if len(points) == 0:
+        return np.empty((0, 2)), np.empty(0)
     
     # 确保点标签与点形状对应
-    if labels and len(labels) == len(point_shapes):
-        point_labels = np.array(labels)
+    if labels is not None and len(labels) == len(points):
+        point_labels = np.asarray(labels)
     else:
-        # 默认所有点都是前景点
-        point_labels = np.ones(len(point_shapes), dtype=np.int32)
+        # 默认所有点都是前景点，返回只读视图避免每次分配
+        if len(points) <= len(_POS_LABELS):
+            point_labels = _POS_LABELS[:len(points)]
+        else:
+            point_labels = np.ones(len(points), dtype=np.int32)
     
     return points, point_labels
 
 
-def shapes_to_box(shapes: List[Dict]) -> np.ndarray:
+def shapes_to_box(shapes: Union[ShapeBatch, List[Dict]]) -> np.ndarray:
     """
     将napari的Shapes图层中的矩形转换为MobileSAM所需的边界框格式
     
     参数:
-        shapes: napari中Shapes图层的数据列表
+        shapes: ShapeBatch对象或napari中Shapes图层的数据列表
         
     返回:
         box: 边界框坐标数组，形状为(4,)，格式为[x1, y1, x2, y2]
@@ -53,63 +181,421 @@ def shapes_to_box(shapes: List[Dict]) -> np.ndarray:
     if not shapes:
         return np.array([])
     
-    # 只保留矩形类型的形状
-    rect_shapes = [s for s in shapes if s['shape_type'] == 'rectangle']
-    if not rect_shapes:
-        return np.array([])
-    
-    try:
-        # 使用最新添加的矩形（假设是列表中的最后一个矩形）
-        rect = rect_shapes[-1]
-        rect_data = rect['data']
-        
-        # 确保矩形至少有4个顶点
-        if len(rect_data) < 4:
+    # 只保留矩形类型的形状，使用最新添加的矩形（假设是列表中的最后一个矩形）
+    if isinstance(shapes, ShapeBatch):
+        rect_indices = np.flatnonzero(shapes.kind == SHAPE_RECTANGLE)
+        if len(rect_indices) == 0:
             return np.array([])
-        
-        # 矩形顶点坐标
-        x_coords = [p[1] for p in rect_data]
-        y_coords = [p[0] for p in rect_data]
-        
-        # 检查坐标有效性
-        if not x_coords or not y_coords:
+        idx = rect_indices[-1]
+        rect_data = shapes.coords[idx, :shapes.lengths[idx]]
+    else:
+        # 字典列表直接取矩形顶点，无需构建完整的ShapeBatch
+        rects = [s['data'] for s in shapes if s['shape_type'] == 'rectangle']
+        if not rects:
             return np.array([])
+        rect_data = np.asarray(rects[-1])
+    
+    # 确保矩形至少有4个顶点
+    if len(rect_data) < 4:
+        return np.array([])
+    
+    # 两次归约得到 [y_min, x_min, y_max, x_max]，顶点坐标为(y, x)
+    yx = rect_data[:, :2]
+    bounds = np.concatenate((yx.min(axis=0), yx.max(axis=0)))
+    
+    # 检查边界框是否有效（宽高都大于0）
+    if np.any(bounds[2:] <= bounds[:2]):
+        return np.array([])
+    
+    # 转换为 [x1, y1, x2, y2]
+    return bounds[[1, 0, 3, 2]]
+
+
+def to_rgb_uint8(image: np.ndarray) -> np.ndarray:
+    """
+    将输入图像转换为MobileSAM所需的RGB uint8格式，只遍历一次图像数据
+    
+    参数:
+        image: 灰度图或多通道图像数组
         
-        # 计算边界框 [x1, y1, x2, y2]
-        x_min = min(x_coords)
-        y_min = min(y_coords)
-        x_max = max(x_coords)
-        y_max = max(y_coords)
-        
-        # 检查边界框是否有效（宽高都大于0）
-        if x_max <= x_min or y_max <= y_min:
-            return np.array([])
+    返回:
+        image: 形状为(H,W,3)的连续RGB图像，输入已是该格式时直接返回不复制
+    """
+    # 灰度图增加通道维，多通道图像只保留RGB通道，均为视图
+    if image.ndim == 2:
+        image = image[:, :, None]
+    elif image.shape[2] > 3:
+        image = image[:, :, :3]
+    
+    if image.dtype == np.uint8 and image.shape[2] == 3 and image.flags.c_contiguous:
+        return image
+    
+    # 通道广播、数值缩放和类型转换在一次写入中完成
+    out = np.empty(image.shape[:2] + (3,), dtype=np.uint8)
+    if image.dtype != np.uint8 and image.max() <= 1.0:
+        np.multiply(image, 255, out=out, casting='unsafe')
+    else:
+        np.copyto(out, image, casting='unsafe')
+    return out
+
+
+def read_image(path: str) -> np.ndarray:
+    """
+    一次读取文件字节并用OpenCV在内存中解码，无法解码的格式回退到skimage，
+    TIFF由tifffile读取以保留多页和Z栈，大型未压缩TIFF以内存映射方式打开，只在访问时读取数据
+    
+    参数:
+        path: 图片文件路径，支持非ASCII路径
         
-        box = np.array([x_min, y_min, x_max, y_max])
+    返回:
+        image: 图像数组，彩色图像为RGB或RGBA通道顺序，保留原始位深
+    """
+    if os.path.splitext(path)[1].lower() in ('.tif', '.tiff'):
+        if tifffile is not None and os.path.getsize(path) > TIFF_MEMMAP_MIN_BYTES:
+            try:
+                return tifffile.memmap(path, mode='r')
+            except ValueError:
+                # 压缩或分块存储的TIFF无法映射，按常规方式读取
+                pass
+        # OpenCV只解码第一页，多页TIFF和Z栈需要完整读取
+        if tifffile is not None:
+            return tifffile.imread(path)
+        from skimage import io
+        return io.imread(path)
+    
+    data = np.fromfile(path, dtype=np.uint8)
+    image = cv2.imdecode(data, cv2.IMREAD_UNCHANGED) if data.size else None
+    if image is None:
+        from skimage import io
+        return io.imread(path)
+    
+    # OpenCV解码结果为BGR/BGRA顺序
+    if image.ndim == 3 and image.shape[2] == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    elif image.ndim == 3 and image.shape[2] == 4:
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2RGBA)
+    return image
+
+
+def image_hash(image: np.ndarray) -> int:
+    """
+    计算图像数据的快速哈希，用于缓存图像嵌入
+    
+    参数:
+        image: 图像数组
         
-        return box
-    except (IndexError, KeyError, ValueError) as e:
-        # 捕获可能的错误并返回空数组
-        print(f"处理边界框时出错: {str(e)}")
-        return np.array([])
+    返回:
+        key: 64位整数哈希值，包含形状和数据类型信息
+    """
+    data = np.ascontiguousarray(image)
+    header = f"{data.shape}{data.dtype}".encode()
+    if xxhash is not None:
+        hasher = xxhash.xxh3_64(header)
+        hasher.update(data.data)
+        return hasher.intdigest()
+    hasher = hashlib.blake2b(header, digest_size=8)
+    hasher.update(data.data)
+    return int.from_bytes(hasher.digest(), "little")
 
 
-def mask_to_binary(mask: np.ndarray, threshold: float = 0.5) -> np.ndarray:
+def mask_to_binary(
+    mask: np.ndarray,
+    threshold: float = 0.5,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
     """
     将概率掩码或整数掩码转换为二值掩码
     
     参数:
         mask: 概率掩码或整数掩码
         threshold: 二值化阈值
+        out: 可选，预分配的uint8输出数组，形状需与mask一致
         
     返回:
         binary_mask: 二值掩码
     """
-    # 处理整数掩码
+    # 整数掩码以0为阈值
     if mask.dtype in (np.uint8, np.int32, np.int64):
-        return (mask > 0).astype(np.uint8)
-    # 处理浮点掩码
-    return (mask > threshold).astype(np.uint8)
+        threshold = 0
+    
+    # 比较结果经布尔视图直接写入uint8输出，避免中间布尔数组和类型转换拷贝
+    if out is None:
+        out = np.empty(mask.shape, dtype=np.uint8)
+    np.greater(mask, threshold, out=out.view(np.bool_))
+    return out
+
+
+def pack_masks(masks: np.ndarray) -> Tuple[np.ndarray, Tuple[int, ...]]:
+    """
+    二值化掩码并按位打包，每个像素只占1位
+    
+    参数:
+        masks: 概率掩码、整数掩码或布尔掩码，形状为(N,H,W)
+        
+    返回:
+        packed: 按最后一维打包后的uint8数组
+        shape: 原始掩码形状，用于解包
+    """
+    masks = np.asarray(masks)
+    if masks.dtype != np.bool_:
+        masks = mask_to_binary(masks)
+    return np.packbits(masks, axis=-1), masks.shape
+
+
+def unpack_masks(packed: np.ndarray, shape: Tuple[int, ...]) -> np.ndarray:
+    """
+    解包pack_masks打包的掩码
+    
+    参数:
+        packed: 打包后的uint8数组
+        shape: 原始掩码形状
+        
+    返回:
+        masks: 布尔掩码，形状为shape
+    """
+    return np.unpackbits(packed, axis=-1, count=shape[-1]).view(np.bool_)
+
+
+def _paint_label_numpy(
+    mask: np.ndarray,
+    labels: np.ndarray,
+    label_id: int,
+    threshold: float
+) -> None:
+    """NumPy实现：先清除旧标签，再写入新掩码"""
+    np.putmask(labels, labels == label_id, 0)
+    np.putmask(labels, mask > threshold, label_id)
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _paint_label_kernel(mask, labels, label_id, threshold):
+        """逐行并行，单次遍历完成阈值化、旧标签清除和新标签写入"""
+        height, width = labels.shape
+        for y in prange(height):
+            for x in range(width):
+                if mask[y, x] > threshold:
+                    labels[y, x] = label_id
+                elif labels[y, x] == label_id:
+                    labels[y, x] = 0
+
+    # 导入时预编译，避免首次添加标签时的JIT延迟
+    _paint_label_kernel(
+        np.zeros((1, 1), dtype=np.uint8), np.zeros((1, 1), dtype=np.int32), 1, 0.0
+    )
+
+
+def paint_label(
+    mask: np.ndarray,
+    labels: np.ndarray,
+    label_id: int,
+    threshold: float = 0.5
+) -> np.ndarray:
+    """
+    将掩码写入标签数组，同时清除该标签ID的旧区域（原地修改）
+    
+    参数:
+        mask: 概率掩码或二值掩码，形状为(H,W)
+        labels: 标签数组，形状为(H,W)
+        label_id: 要写入的标签ID
+        threshold: 二值化阈值
+        
+    返回:
+        labels: 更新后的标签数组
+    """
+    if njit is not None and mask.ndim == 2 and mask.shape == labels.shape:
+        # 统一参数类型，复用预编译的特化版本
+        _paint_label_kernel(mask, labels, int(label_id), float(threshold))
+    else:
+        _paint_label_numpy(mask, labels, label_id, threshold)
+    return labels
+
+
+# 标注形状的颜色表：[非点形状, 前景点, 背景点] × [填充色, 边缘色]，RGBA
+SHAPE_COLOR_PALETTE = np.array([
+    [[0, 0, 1, 0.3], [0, 0, 1, 1.0]],  # 蓝色半透明/蓝色边缘
+    [[0, 1, 0, 0.5], [0, 1, 0, 1.0]],  # 绿色半透明/绿色边缘
+    [[1, 0, 0, 0.5], [1, 0, 0, 1.0]],  # 红色半透明/红色边缘
+])
+
+
+def _shape_colors_numpy(
+    is_point: np.ndarray,
+    point_types: np.ndarray,
+    face: np.ndarray,
+    edge: np.ndarray
+) -> None:
+    """NumPy实现：先全部填充默认颜色，再按点类型覆盖点形状的颜色"""
+    face[:] = SHAPE_COLOR_PALETTE[0, 0]
+    edge[:] = SHAPE_COLOR_PALETTE[0, 1]
+    point_indices = np.flatnonzero(is_point)
+    num_typed = min(len(point_types), len(point_indices))
+    is_background = np.zeros(len(point_indices), dtype=bool)
+    is_background[:num_typed] = point_types[:num_typed] != 1
+    face[point_indices] = np.where(is_background[:, None], SHAPE_COLOR_PALETTE[2, 0], SHAPE_COLOR_PALETTE[1, 0])
+    edge[point_indices] = np.where(is_background[:, None], SHAPE_COLOR_PALETTE[2, 1], SHAPE_COLOR_PALETTE[1, 1])
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _shape_colors_kernel(is_point, point_types, palette, face, edge):
+        """单次遍历，按形状类型和点类型写入填充色和边缘色"""
+        num_types = point_types.shape[0]
+        k = 0
+        for i in range(is_point.shape[0]):
+            color = 0
+            if is_point[i]:
+                color = 2 if k < num_types and point_types[k] != 1 else 1
+                k += 1
+            for c in range(4):
+                face[i, c] = palette[color, 0, c]
+                edge[i, c] = palette[color, 1, c]
+
+    # 导入时预编译，避免首次添加点时的JIT延迟
+    _shape_colors_kernel(
+        np.zeros(1, dtype=np.bool_), np.zeros(1, dtype=np.int32), SHAPE_COLOR_PALETTE,
+        np.empty((1, 4)), np.empty((1, 4))
+    )
+
+
+def shape_colors(is_point: np.ndarray, point_types: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    根据点类型计算标注形状的填充色和边缘色
+    
+    非点形状使用蓝色，点形状按顺序对应点类型：1为前景点（绿色），其他为背景点（红色），
+    缺少类型的点按前景点处理
+    
+    参数:
+        is_point: 每个形状是否为点，形状为(N,)
+        point_types: 点类型数组，按点形状的顺序排列
+        
+    返回:
+        face: 填充色，形状为(N,4)
+        edge: 边缘色，形状为(N,4)
+    """
+    is_point = np.asarray(is_point, dtype=np.bool_)
+    # 统一参数类型，复用预编译的特化版本
+    point_types = np.asarray(point_types, dtype=np.int32)
+    face = np.empty((len(is_point), 4))
+    edge = np.empty((len(is_point), 4))
+    if njit is not None:
+        _shape_colors_kernel(is_point, point_types, SHAPE_COLOR_PALETTE, face, edge)
+    else:
+        _shape_colors_numpy(is_point, point_types, face, edge)
+    return face, edge
+
+
+def mask_bbox(mask: np.ndarray) -> Optional[Tuple[slice, ...]]:
+    """
+    计算掩码非零区域的包围盒
+    
+    参数:
+        mask: 二值掩码，形状为(H,W)或任意维度
+        
+    返回:
+        bbox: 每个维度的切片，可直接索引掩码；掩码为空时返回None
+    """
+    bbox = []
+    for axis in range(mask.ndim):
+        # 沿其余维度归约，只需扫描一次投影
+        other_axes = tuple(a for a in range(mask.ndim) if a != axis)
+        nonzero = np.flatnonzero(np.any(mask, axis=other_axes))
+        if nonzero.size == 0:
+            return None
+        bbox.append(slice(int(nonzero[0]), int(nonzero[-1]) + 1))
+    return tuple(bbox)
+
+
+def _normalize_pad_numpy(
+    image: np.ndarray,
+    mean: np.ndarray,
+    std: np.ndarray,
+    out: np.ndarray
+) -> None:
+    """NumPy实现：清零填充区域后原地归一化"""
+    h, w = image.shape[:2]
+    out[h:] = 0
+    out[:h, w:] = 0
+    region = out[:h, :w]
+    np.subtract(image, mean, out=region)
+    np.divide(region, std, out=region)
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _normalize_pad_kernel(image, mean, std, out):
+        """逐行并行，单次遍历完成归一化和零填充"""
+        h, w = image.shape[0], image.shape[1]
+        out_h, out_w, channels = out.shape
+        inv_std = 1.0 / std
+        for y in prange(out_h):
+            for x in range(out_w):
+                for c in range(channels):
+                    if y < h and x < w:
+                        out[y, x, c] = (image[y, x, c] - mean[c]) * inv_std[c]
+                    else:
+                        out[y, x, c] = 0.0
+
+    # 导入时预编译，避免首次设置图像时的JIT延迟
+    _normalize_pad_kernel(
+        np.zeros((1, 1, 3), dtype=np.uint8),
+        np.zeros(3, dtype=np.float32),
+        np.ones(3, dtype=np.float32),
+        np.zeros((2, 2, 3), dtype=np.float32),
+    )
+
+
+def normalize_pad(
+    image: np.ndarray,
+    mean: np.ndarray,
+    std: np.ndarray,
+    out: np.ndarray
+) -> np.ndarray:
+    """
+    按通道归一化图像并写入预分配缓冲区的左上角，其余区域填充为0（原地修改）
+    
+    参数:
+        image: RGB格式的uint8图像数组，形状为(H,W,3)
+        mean: 每个通道的均值，形状为(3,)
+        std: 每个通道的标准差，形状为(3,)
+        out: float32输出缓冲区，形状为(H',W',3)且H'>=H, W'>=W
+        
+    返回:
+        out: 更新后的输出缓冲区
+    """
+    if (njit is not None and image.dtype == np.uint8
+            and out.dtype == np.float32 and out.flags.c_contiguous):
+        _normalize_pad_kernel(
+            image, mean.astype(np.float32, copy=False), std.astype(np.float32, copy=False), out
+        )
+    else:
+        _normalize_pad_numpy(image, mean, std, out)
+    return out
+
+
+def write_json(path: str, data: Any) -> None:
+    """
+    将数据以带缩进的UTF-8 JSON一次性写入文件，安装orjson时使用orjson序列化
+    
+    参数:
+        path: 输出文件路径
+        data: 可序列化的数据，可包含NumPy数组和数值
+    """
+    if orjson is not None:
+        payload = orjson.dumps(
+            data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    else:
+        payload = json.dumps(data, indent=2, ensure_ascii=False, default=_json_default).encode("utf-8")
+    with open(path, 'wb') as f:
+        f.write(payload)
+
+
+def _json_default(value: Any) -> Any:
+    """标准库json无法序列化的NumPy类型转换为Python类型"""
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(f"无法序列化类型: {type(value).__name__}")
 
 
 def generate_unique_name(prefix: str = "mask") -> str:
@@ -122,9 +608,7 @@ def generate_unique_name(prefix: str = "mask") -> str:
     返回:
         name: 唯一名称
     """
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    unique_id = str(uuid.uuid4())[:8]
-    return f"{prefix}_{timestamp}_{unique_id}"
+    return f"{prefix}_{secrets.token_hex(4)}"
 
 
 def save_masks(
@@ -150,6 +634,19 @@ def save_masks(
     # 创建输出目录
     os.makedirs(output_dir, exist_ok=True)
     
+    saved_paths, jobs = _mask_save_jobs(masks, scores, output_dir, image_name, base_name)
+    _run_save_jobs(jobs)
+    return saved_paths
+
+
+def _mask_save_jobs(
+    masks: np.ndarray,
+    scores: np.ndarray,
+    output_dir: str,
+    image_name: Optional[str],
+    base_name: Optional[str]
+) -> Tuple[List[str], List[tuple]]:
+    """二值化掩码并生成每个掩码的文件路径和元数据，返回保存路径和写文件任务"""
     # 生成基础名称
     if base_name is None:
         base_name = generate_unique_name()
@@ -158,35 +655,159 @@ def save_masks(
         base_name = f"{os.path.splitext(image_name)[0]}_{base_name}"
     
     saved_paths = []
+    jobs = []
     
-    # 保存每个掩码
-    for i, (mask, score) in enumerate(zip(masks, scores)):
-        # 二值化掩码
-        binary_mask = mask_to_binary(mask)
-        
+    # 一次向量化运算二值化全部掩码，而不是逐个掩码处理
+    binary_masks = mask_to_binary(np.stack(masks) if isinstance(masks, list) else np.asarray(masks))
+    timestamp = datetime.datetime.now().isoformat()
+    # 一次转换为Python浮点数列表，元数据可直接序列化
+    score_values = np.asarray(scores, dtype=np.float64).ravel().tolist()
+    
+    # 准备每个掩码的文件路径和元数据
+    for i, (binary_mask, score) in enumerate(zip(binary_masks, score_values)):
         # 构建文件路径
-        mask_filename = f"{base_name}_{i:03d}.npy"
+        mask_filename = f"{base_name}_{i:03d}.npz"
         mask_path = os.path.join(output_dir, mask_filename)
-        
-        # 保存为numpy数组
-        np.save(mask_path, binary_mask)
         saved_paths.append(mask_path)
         
         # 保存元数据
         metadata = {
-            "score": float(score),
+            "score": score,
             "mask_id": i,
             "base_name": base_name,
-            "timestamp": datetime.datetime.now().isoformat(),
+            "timestamp": timestamp,
         }
         
         metadata_filename = f"{base_name}_{i:03d}_meta.json"
         metadata_path = os.path.join(output_dir, metadata_filename)
         
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        jobs.append((mask_path, binary_mask, metadata_path, metadata))
     
-    return saved_paths
+    return saved_paths, jobs
+
+
+def _run_save_jobs(jobs: List[tuple]) -> None:
+    """执行写文件任务，多个任务时用线程池并行写文件，压缩和文件I/O期间会释放GIL"""
+    if len(jobs) > 1:
+        with ThreadPoolExecutor(max_workers=min(SAVE_WORKERS, len(jobs))) as pool:
+            list(pool.map(lambda job: _save_mask_files(*job), jobs))
+    else:
+        for job in jobs:
+            _save_mask_files(*job)
+
+
+def save_mask_bundle(
+    masks: np.ndarray,
+    scores: np.ndarray,
+    path: str,
+    names: Optional[List[str]] = None
+) -> str:
+    """
+    将全部掩码按位打包压缩后写入单个.blp文件
+    
+    参数:
+        masks: 掩码数组，形状为(N,H,W)
+        scores: 每个掩码的置信度，形状为(N,)
+        path: 输出文件路径
+        names: 每个掩码的名称，可选
+        
+    返回:
+        path: 已保存文件的路径
+    """
+    packed, shape = pack_masks(np.stack(masks) if isinstance(masks, list) else masks)
+    packed = np.ascontiguousarray(packed)
+    
+    # 按位打包后再压缩，blosc直接读取数组内存，不复制
+    if blosc is not None:
+        codec = "blosc-lz4"
+        payload = blosc.compress_ptr(
+            packed.__array_interface__['data'][0], packed.size,
+            typesize=1, clevel=5, cname='lz4'
+        )
+    else:
+        codec = "zlib"
+        payload = zlib.compress(packed, 1)
+    
+    header = {
+        "shape": list(shape),
+        "packed_shape": list(packed.shape),
+        "dtype": "bool",
+        "codec": codec,
+        "scores": [float(score) for score in scores],
+        "names": list(names) if names is not None else [],
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(MASK_BUNDLE_MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(payload)
+    return path
+
+
+def load_mask_bundle(path: str) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+    """
+    读取save_mask_bundle保存的.blp文件
+    
+    参数:
+        path: .blp文件路径
+        
+    返回:
+        masks: 布尔掩码，形状为(N,H,W)
+        scores: 每个掩码的置信度，形状为(N,)
+        header: 文件头部信息
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MASK_BUNDLE_MAGIC)] != MASK_BUNDLE_MAGIC:
+        raise ValueError(f"不是有效的掩码打包文件: {path}")
+    offset = len(MASK_BUNDLE_MAGIC)
+    (header_len,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    header = json.loads(data[offset:offset + header_len].decode("utf-8"))
+    payload = memoryview(data)[offset + header_len:]
+    
+    if header["codec"] == "blosc-lz4":
+        if blosc is None:
+            raise ImportError("读取该文件需要安装blosc: pip install blosc")
+        # 预先分配打包数组，blosc直接解压到其中
+        packed = np.empty(header["packed_shape"], dtype=np.uint8)
+        blosc.decompress_ptr(bytes(payload), packed.__array_interface__['data'][0])
+    else:
+        packed = np.frombuffer(zlib.decompress(payload), dtype=np.uint8).reshape(header["packed_shape"])
+    
+    masks = unpack_masks(packed, tuple(header["shape"]))
+    return masks, np.asarray(header["scores"], dtype=np.float32), header
+
+
+def _save_mask_files(mask_path: str, binary_mask: np.ndarray, metadata_path: str, metadata: Dict[str, Any]) -> None:
+    """保存单个按位打包压缩的掩码文件和元数据文件"""
+    # 每个像素只占1位，再经zlib压缩，体积远小于逐像素uint8的.npy
+    np.savez_compressed(
+        mask_path,
+        mask=np.packbits(binary_mask, axis=-1),
+        shape=np.array(binary_mask.shape, dtype=np.int32),
+    )
+    write_json(metadata_path, metadata)
+
+
+def load_mask(path: str) -> np.ndarray:
+    """
+    读取save_masks保存的掩码文件，兼容旧版本保存的.npy文件
+    
+    参数:
+        path: .npz或.npy掩码文件路径
+        
+    返回:
+        mask: 二值掩码，值为0或1的uint8数组
+    """
+    if path.endswith(".npy"):
+        return np.load(path)
+    with np.load(path) as data:
+        shape = tuple(int(x) for x in data["shape"])
+        return unpack_masks(data["mask"], shape).view(np.uint8)
 
 
 def batch_process_masks(
@@ -208,6 +829,8 @@ def batch_process_masks(
         saved_paths_dict: 图像名称到已保存文件路径的字典
     """
     saved_paths_dict = {}
+    all_jobs = []
+    os.makedirs(output_dir, exist_ok=True)
     
     for i, (masks, scores) in enumerate(zip(masks_list, scores_list)):
         # 获取图像名称
@@ -215,18 +838,16 @@ def batch_process_masks(
         if image_names and i < len(image_names):
             image_name = image_names[i]
         
-        # 保存掩码
+        # 准备掩码的写文件任务，每张图像使用独立的基础名称
         base_name = generate_unique_name("batch")
-        saved_paths = save_masks(
-            masks=masks,
-            scores=scores,
-            output_dir=output_dir,
-            image_name=image_name,
-            base_name=base_name
-        )
+        saved_paths, jobs = _mask_save_jobs(masks, scores, output_dir, image_name, base_name)
+        all_jobs.extend(jobs)
         
         # 添加到字典
         key = image_name if image_name else f"image_{i:03d}"
         saved_paths_dict[key] = saved_paths
     
+    # 所有图像的掩码共用一个线程池写入，图像之间的写文件也可以重叠
+    _run_save_jobs(all_jobs)
+    
     return saved_paths_dict 
\ No newline at end of file
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+MobileSAM TensorRT 引擎构建脚本
+将 PyTorch 图像编码器导出为固定 (1,3,1024,1024) 输入的 ONNX 模型，再用 trtexec 构建 TensorRT 引擎，
+引擎保存在模型权重旁，CUDA 上的 PyTorch 后端会优先加载该引擎
+"""
+
+import os
+import argparse
+import shutil
+import subprocess
+import tempfile
+import torch
+
+from mobile_sam import sam_model_registry
+
+from napari_mobilesam.mobilesam_wrapper import TRT_ENGINE_NAME
+
+
+def export_encoder(sam, output_path, opset):
+    """导出图像编码器，输入为预处理后的NCHW FP32图像"""
+    img_size = sam.image_encoder.img_size
+    dummy_image = torch.randn(1, 3, img_size, img_size, dtype=torch.float)
+
+    torch.onnx.export(
+        sam.image_encoder,
+        dummy_image,
+        output_path,
+        export_params=True,
+        opset_version=opset,
+        do_constant_folding=True,
+        input_names=["image"],
+        output_names=["image_embeddings"],
+    )
+
+
+def build_engine(onnx_path, engine_path, precision, trtexec):
+    """调用trtexec构建引擎，输入输出保持FP32，内部按指定精度计算"""
+    cmd = [trtexec, f"--onnx={onnx_path}", f"--saveEngine={engine_path}"]
+    if precision != "fp32":
+        cmd.append(f"--{precision}")
+    print(" ".join(cmd))
+    subprocess.run(cmd, check=True)
+
+
+def main():
+    """构建 MobileSAM 图像编码器的 TensorRT 引擎"""
+    workspace_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    default_checkpoint = os.path.join(workspace_dir, "mobile_sam_weights", "mobile_sam.pt")
+
+    parser = argparse.ArgumentParser(description="构建 MobileSAM TensorRT 编码器引擎")
+    parser.add_argument("--checkpoint", default=default_checkpoint, help="MobileSAM 模型权重路径")
+    parser.add_argument("--output", default=None,
+                        help=f"引擎输出路径，默认为模型权重旁的 {TRT_ENGINE_NAME}")
+    parser.add_argument("--precision", choices=["bf16", "fp16", "fp32"], default="bf16",
+                        help="引擎计算精度，bf16需要Ampere及以上的GPU")
+    parser.add_argument("--trtexec", default=shutil.which("trtexec") or "trtexec",
+                        help="trtexec 可执行文件路径")
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset 版本")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(args.checkpoint)),
+                                         TRT_ENGINE_NAME)
+
+    print(f"加载模型权重: {args.checkpoint}")
+    sam = sam_model_registry["vit_t"](checkpoint=args.checkpoint)
+    sam.to(device="cpu")
+    sam.eval()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        onnx_path = os.path.join(tmp_dir, "image_encoder.onnx")
+        with torch.no_grad():
+            print("导出图像编码器...")
+            export_encoder(sam, onnx_path, args.opset)
+
+        print(f"构建 TensorRT 引擎 ({args.precision})，需要几分钟...")
+        build_engine(onnx_path, output, args.precision, args.trtexec)
+
+    print(f"已保存: {output}")
+    print("构建完成! 引擎与GPU型号和TensorRT版本绑定，更换环境后需重新构建")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+"""
+MobileSAM 编码器 FP16 转换脚本
+将 FP32 图像编码器转换为 FP16 模型，在 CUDA 或 CoreML (Apple Silicon) 上插件会优先加载该模型
+"""
+
+import argparse
+import onnx
+from onnxconverter_common import float16
+
+from napari_mobilesam.onnx_wrapper import default_onnx_paths
+
+
+def main():
+    """转换 MobileSAM 图像编码器为 FP16"""
+    parser = argparse.ArgumentParser(description="MobileSAM 编码器 FP16 转换")
+    parser.add_argument("--input", default=default_onnx_paths("fp32")[0], help="FP32 编码器路径")
+    parser.add_argument("--output", default=default_onnx_paths("fp16")[0], help="FP16 编码器输出路径")
+    args = parser.parse_args()
+
+    print(f"加载编码器: {args.input}")
+    model = onnx.load(args.input)
+
+    # 输入输出同样转换为FP16，推理时传入半精度图像
+    model_fp16 = float16.convert_float_to_float16(model, keep_io_types=False)
+
+    onnx.save(model_fp16, args.output)
+    print(f"已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
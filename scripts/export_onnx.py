@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+MobileSAM ONNX 导出脚本
+将 MobileSAM 的图像编码器和提示/掩码解码器导出为 ONNX 模型，
+导出后插件会自动使用 ONNX Runtime 后端进行推理
+"""
+
+import os
+import argparse
+import torch
+
+from mobile_sam import sam_model_registry
+from mobile_sam.utils.onnx import SamOnnxModel
+
+from napari_mobilesam.onnx_wrapper import default_onnx_paths
+
+
+class ChannelsLastEncoder(torch.nn.Module):
+    """以NHWC布局接收输入的图像编码器，避免推理时的HWC到CHW转置"""
+
+    def __init__(self, image_encoder):
+        super().__init__()
+        self.image_encoder = image_encoder
+
+    def forward(self, image):
+        # 单个Transpose节点，ORT图优化时可与首层卷积融合
+        return self.image_encoder(image.permute(0, 3, 1, 2))
+
+
+def export_encoder(sam, output_path, opset):
+    """导出图像编码器，输入为预处理后的(1,1024,1024,3)图像"""
+    img_size = sam.image_encoder.img_size
+    dummy_image = torch.randn(1, img_size, img_size, 3, dtype=torch.float)
+
+    torch.onnx.export(
+        ChannelsLastEncoder(sam.image_encoder),
+        dummy_image,
+        output_path,
+        export_params=True,
+        opset_version=opset,
+        do_constant_folding=True,
+        input_names=["image"],
+        output_names=["image_embeddings"],
+    )
+
+
+class LowResSamOnnxModel(SamOnnxModel):
+    """只输出低分辨率掩码的解码器，放大到原图尺寸由插件端的OpenCV完成"""
+
+    def forward(self, image_embeddings, point_coords, point_labels, mask_input, has_mask_input):
+        sparse_embedding = self._embed_points(point_coords, point_labels)
+        dense_embedding = self._embed_masks(mask_input, has_mask_input)
+
+        masks, scores = self.model.mask_decoder.predict_masks(
+            image_embeddings=image_embeddings,
+            image_pe=self.model.prompt_encoder.get_dense_pe(),
+            sparse_prompt_embeddings=sparse_embedding,
+            dense_prompt_embeddings=dense_embedding,
+        )
+        return scores, masks
+
+
+def export_decoder(sam, output_path, opset):
+    """导出提示/掩码解码器，保留全部4个低分辨率掩码输出以支持多掩码候选"""
+    onnx_model = LowResSamOnnxModel(sam, return_single_mask=False)
+
+    embed_dim = sam.prompt_encoder.embed_dim
+    embed_size = sam.prompt_encoder.image_embedding_size
+    mask_input_size = [4 * x for x in embed_size]
+    dummy_inputs = {
+        "image_embeddings": torch.randn(1, embed_dim, *embed_size, dtype=torch.float),
+        "point_coords": torch.randint(low=0, high=1024, size=(1, 5, 2), dtype=torch.float),
+        "point_labels": torch.randint(low=0, high=4, size=(1, 5), dtype=torch.float),
+        "mask_input": torch.randn(1, 1, *mask_input_size, dtype=torch.float),
+        "has_mask_input": torch.tensor([1], dtype=torch.float),
+    }
+    dynamic_axes = {
+        "point_coords": {1: "num_points"},
+        "point_labels": {1: "num_points"},
+    }
+
+    torch.onnx.export(
+        onnx_model,
+        tuple(dummy_inputs.values()),
+        output_path,
+        export_params=True,
+        opset_version=opset,
+        do_constant_folding=True,
+        input_names=list(dummy_inputs.keys()),
+        output_names=["iou_predictions", "low_res_masks"],
+        dynamic_axes=dynamic_axes,
+    )
+
+
+def main():
+    """导出 MobileSAM 编码器和解码器"""
+    default_encoder, default_decoder = default_onnx_paths()
+    weights_dir = os.path.dirname(default_encoder)
+
+    parser = argparse.ArgumentParser(description="导出 MobileSAM ONNX 模型")
+    parser.add_argument("--checkpoint", default=os.path.join(weights_dir, "mobile_sam.pt"),
+                        help="MobileSAM 模型权重路径")
+    parser.add_argument("--encoder", default=default_encoder, help="编码器输出路径")
+    parser.add_argument("--decoder", default=default_decoder, help="解码器输出路径")
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset 版本")
+    args = parser.parse_args()
+
+    print(f"加载模型权重: {args.checkpoint}")
+    sam = sam_model_registry["vit_t"](checkpoint=args.checkpoint)
+    sam.to(device="cpu")
+    sam.eval()
+
+    with torch.no_grad():
+        print("导出图像编码器...")
+        export_encoder(sam, args.encoder, args.opset)
+        print(f"已保存: {args.encoder}")
+
+        print("导出提示/掩码解码器...")
+        export_decoder(sam, args.decoder, args.opset)
+        print(f"已保存: {args.decoder}")
+
+    print("导出完成! 重新加载插件模型即可使用 ONNX Runtime 后端")
+
+
+if __name__ == "__main__":
+    main()
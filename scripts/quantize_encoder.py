@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+MobileSAM 编码器 INT8 量化脚本
+使用 ONNX Runtime 静态量化将 FP32 图像编码器转换为 INT8 模型，
+设置环境变量 MOBILESAM_PRECISION=int8 后插件将加载量化后的编码器
+"""
+
+import argparse
+import numpy as np
+import onnx
+from skimage import data
+from onnxruntime.quantization import (
+    CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static
+)
+
+from napari_mobilesam.onnx_wrapper import default_onnx_paths, preprocess_image
+from napari_mobilesam.utils import to_rgb_uint8
+
+
+def calibration_images():
+    """从 skimage.data 生成校准图像，并对 astronaut 做平铺和抖动以增加样本多样性"""
+    images = [data.astronaut(), data.coffee(), data.chelsea(), data.rocket(), data.camera()]
+
+    rng = np.random.default_rng(0)
+    astronaut = data.astronaut()
+    # 平铺后的大图
+    images.append(np.tile(astronaut, (2, 2, 1)))
+    # 随机裁剪并加入亮度抖动
+    for _ in range(4):
+        y, x = rng.integers(0, 256, size=2)
+        crop = astronaut[y:y + 256, x:x + 256].astype(np.float32)
+        crop = crop * rng.uniform(0.7, 1.3) + rng.normal(0, 8, crop.shape)
+        images.append(np.clip(crop, 0, 255).astype(np.uint8))
+
+    return [to_rgb_uint8(image) for image in images]
+
+
+class EncoderCalibrationReader(CalibrationDataReader):
+    """按编码器输入格式提供校准数据"""
+
+    def __init__(self, images, channels_last=True):
+        self.inputs = iter(
+            [{"image": preprocess_image(image, channels_last)[0]} for image in images]
+        )
+
+    def get_next(self):
+        return next(self.inputs, None)
+
+
+def main():
+    """量化 MobileSAM 图像编码器"""
+    parser = argparse.ArgumentParser(description="MobileSAM 编码器 INT8 静态量化")
+    parser.add_argument("--input", default=default_onnx_paths("fp32")[0], help="FP32 编码器路径")
+    parser.add_argument("--output", default=default_onnx_paths("int8")[0], help="INT8 编码器输出路径")
+    args = parser.parse_args()
+
+    # 根据编码器输入形状判断NHWC或NCHW布局
+    input_dims = onnx.load(args.input).graph.input[0].type.tensor_type.shape.dim
+    channels_last = input_dims[-1].dim_value == 3
+
+    print("准备校准数据...")
+    reader = EncoderCalibrationReader(calibration_images(), channels_last)
+
+    print(f"量化编码器: {args.input}")
+    quantize_static(
+        args.input,
+        args.output,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+        calibrate_method=CalibrationMethod.Percentile,
+    )
+
+    print(f"已保存: {args.output}")
+    print("设置环境变量 MOBILESAM_PRECISION=int8 后重新加载模型即可使用")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,16 @@ setup(
         "scikit-image",
         "qtpy",
     ],
+    extras_require={
+        "onnx": ["onnxruntime"],
+        "numba": ["numba"],
+        "xxhash": ["xxhash"],
+        "zarr": ["zarr"],
+        "orjson": ["orjson"],
+        "tifffile": ["tifffile"],
+        "blosc": ["blosc"],
+        "tensorrt": ["tensorrt"],
+    },
     entry_points={
         "napari.manifest": [
             "napari-mobilesam = napari_mobilesam:napari.yaml",